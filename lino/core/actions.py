@@ -36,6 +36,7 @@ from .utils import obj2unicode
 from .utils import resolve_model
 from .utils import navinfo
 from .utils import Parametrizable
+from .ddh import prefetch_delete_vetos, clear_delete_vetos
 from .requests import InstanceAction
 
 def check_for_chooser(holder, field):
@@ -1216,12 +1217,17 @@ class DeleteSelected(MultipleRowAction):
 
     def run_from_ui(self, ar, **kw):
         objects = []
-        for obj in ar.selected_rows:
-            objects.append(str(obj))
-            msg = ar.actor.disable_delete(obj, ar)
-            if msg is not None:
-                ar.error(None, msg, alert=True)
-                return
+        if len(ar.selected_rows) > 1:
+            prefetch_delete_vetos(ar.selected_rows)
+        try:
+            for obj in ar.selected_rows:
+                objects.append(str(obj))
+                msg = ar.actor.disable_delete(obj, ar)
+                if msg is not None:
+                    ar.error(None, msg, alert=True)
+                    return
+        finally:
+            clear_delete_vetos(ar.selected_rows)
         
         def ok(ar2):
             super(DeleteSelected, self).run_from_ui(ar, **kw)
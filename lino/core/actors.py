@@ -150,6 +150,8 @@ class ActorMetaClass(type):
         cls._constants = {}
         cls._actions_dict = AttrDict()
         cls._actions_list = []  # 20121129
+        cls._button_actions = {}
+        cls._disabled_actions_cache = {}
         # cls._pending_field_updates = []
 
         cls.collect_virtual_fields()
@@ -1055,6 +1057,11 @@ class Actor(with_metaclass(ActorMetaClass, type('NewBase', (actions.Parametrizab
         cls._actions_list.sort(
             key=lambda a: (a.action.sort_index, a.action.action_name))
         # cls._actions_list = tuple(cls._actions_list)
+
+        # precompute the button actions for every window type
+        for ba in cls._actions_list:
+            if ba.action.opens_a_window:
+                cls.get_button_actions(ba.action)
         
         # build a dict which maps state.name to a set of action names
         # to be disabled on objects having that state:
@@ -1542,8 +1549,14 @@ class Actor(with_metaclass(ActorMetaClass, type('NewBase', (actions.Parametrizab
             # return []
             raise Exception("20180518 {} is not a windows action".format(
                 parent.__class__))
-        return [ba for ba in self._actions_list
-                if ba.action.is_callable_from(parent)]
+        # is_callable_from() depends only on the window type of the
+        # parent.  The returned list is shared, don't modify it.
+        bas = self._button_actions.get(parent.window_type)
+        if bas is None:
+            bas = [ba for ba in self._actions_list
+                   if ba.action.is_callable_from(parent)]
+            self._button_actions[parent.window_type] = bas
+        return bas
         
     @classmethod
     def get_actions(self):
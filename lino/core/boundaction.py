@@ -65,6 +65,8 @@ class BoundAction(object):
                     "for %r (required=%s) is active (settings=%s)." % (
                         self, required, os.environ['DJANGO_SETTINGS_MODULE']))
 
+        self.debug_permissions = debug_permissions
+        self._state_permissions = {}
         self.allow_view = curry(make_view_permission_handler(
             self, action.readonly, debug_permissions, required), action)
         self._allow = curry(make_permission_handler(
@@ -151,15 +153,33 @@ class BoundAction(object):
 
         """
         u = ar.get_user()
-        if not self.action.get_view_permission(u.user_type):
-            return False
-        if not self._allow(u, obj, state):
+        if self.debug_permissions:
+            if not self.action.get_view_permission(u.user_type):
+                return False
+            if not self._allow(u, obj, state):
+                return False
+        elif not self.get_state_permission(u, state):
             return False
         if not self.action.get_action_permission(ar, obj, state):
             return False
         return True
         # return self._allow(ar.get_user(), obj, state)
 
+    def get_state_permission(self, user, state):
+        """Return whether the requirements of this bound action which depend
+        only on the user type and the workflow state are satisfied.
+
+        The result is cached per `(user_type, state)`.
+
+        """
+        k = (user.user_type, state)
+        v = self._state_permissions.get(k, None)
+        if v is None:
+            v = self.action.get_view_permission(user.user_type) and \
+                self._allow(user, None, state)
+            self._state_permissions[k] = v
+        return v
+
     def get_view_permission(self, user_type):
         """
         Return True if this bound action is visible for users of this
@@ -0,0 +1,297 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2009-2018 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Defines the classes used for asking a question to the user during
+an AJAX action ("dialog callbacks") and the stores which keep pending
+callbacks until the answer arrives.
+
+The store is selected by :attr:`lino.core.site.Site.callbacks_backend`.
+The default :class:`LocalCallbackStore` keeps the pending callbacks in
+the memory of the process.  This works only when the answer is handled
+by the same process as the question.
+
+A shared store like :class:`CacheCallbackStore` keeps only the
+serializable *state* of a callback: how to reproduce the original
+action request, the message and the answers given so far.  When the
+answer arrives (possibly on another process or node), the kernel
+runs the original action again, and :meth:`Kernel.set_callback
+<lino.core.kernel.Kernel.set_callback>` picks the given answer
+instead of asking the same question again.  This requires the code
+which runs before the question to have no side effects, which is
+usually the case.  An action which does have side effects before
+asking (e.g. because it asks several questions and saves something
+after the first answer) must skip them when the :attr:`is_replay
+<lino.core.requests.BaseRequest.is_replay>` of its request is `True`,
+or the site must use a local store.
+
+Every callback is answered at most once, even when the same answer
+reaches several processes at the same time.
+
+"""
+
+from __future__ import unicode_literals
+from builtins import object
+
+import hashlib
+import time
+import uuid
+
+from django.utils.encoding import force_text
+from django.utils.translation import ugettext_lazy as _
+
+from etgen.html import iselement, tostring
+
+
+class CallbackChoice(object):
+    #~ def __init__(self,name,label,func):
+
+    def __init__(self, name, func, label):
+        self.name = name
+        #~ self.index = index
+        self.func = func
+        self.label = label
+
+
+class Callback(object):
+    """A callback is a question that rose during an AJAX action.
+    The original action is pending until we get a request
+    that answers the question.
+
+    """
+    title = _('Confirmation')
+
+    def __init__(self, ar, message):
+        self.message = message
+        self.choices = []
+        self.choices_dict = {}
+        self.ar = ar
+
+    def __repr__(self):
+        return "Callback(%r)" % self.message
+
+    def set_title(self, title):
+        self.title = title
+
+    def add_choice(self, name, func, label):
+        """
+        Add a possible answer to this callback.
+        - name: "yes", "no", "ok" or "cancel"
+        - func: a callable to be executed when user selects this choice
+        - the label of the button
+        """
+        assert not name in self.choices_dict
+        allowed_names = ("yes", "no", "ok", "cancel")
+        if not name in allowed_names:
+            raise Exception("Sorry, name must be one of %s" % allowed_names)
+        cbc = CallbackChoice(name, func, label)
+        self.choices.append(cbc)
+        self.choices_dict[name] = cbc
+        return cbc
+
+    def get_signature(self):
+        """Return a string which identifies this question within its
+        action request.  The same question asked again when the action
+        is being replayed has the same signature.
+
+        """
+        msg = self.message
+        if iselement(msg):
+            msg = tostring(msg)
+        s = force_text(msg) + '|' + ','.join([c.name for c in self.choices])
+        return hashlib.sha1(s.encode('utf-8')).hexdigest()
+
+    def get_state(self):
+        """Return a serializable `dict` which describes how to replay the
+        action request which asked this question, or `None` if this
+        is not possible (e.g. when the action was not run from a web
+        request).
+
+        """
+        ar = self.ar
+        request = ar.request
+        if request is None or ar.actor is None:
+            return None
+        if request.method == 'GET':
+            rqdata = request.GET.urlencode()
+        elif request.method == 'POST':
+            rqdata = request.POST.urlencode()
+        else:
+            rqdata = force_text(request.body)
+        answers = dict(getattr(ar, 'xcallback_answers', {}))
+        return dict(
+            actor=ar.actor.actor_id,
+            action_name=ar.bound_action.action.action_name,
+            method=request.method,
+            rqdata=rqdata,
+            selected_pks=[
+                obj.pk for obj in ar.selected_rows
+                if getattr(obj, 'pk', None) is not None],
+            user_id=getattr(request.user, 'pk', None),
+            signature=self.get_signature(),
+            answers=answers)
+
+
+class CallbackStore(object):
+    """Base class for the stores of pending callbacks.
+
+    .. attribute:: is_shared
+
+        Whether this store is shared between processes.  If this is
+        `True`, the store contains the :meth:`state
+        <Callback.get_state>` of a callback, otherwise the
+        :class:`Callback` instance itself.
+
+    .. attribute:: ttl
+
+        The number of seconds after which an unanswered callback
+        expires.
+
+    """
+    is_shared = False
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self.stored = 0
+        self.answered = 0
+        self.expired = 0
+        self.unknown = 0
+
+    def new_key(self):
+        return uuid.uuid4().hex
+
+    def put(self, cb):
+        """Store the given callback and return its key."""
+        raise NotImplementedError()
+
+    def pop(self, key):
+        """Remove the callback with the given key and return it (or its
+        state if this store :attr:`is_shared`).  Return `None` if there
+        is no such callback.
+
+        """
+        raise NotImplementedError()
+
+    def get_pending_count(self):
+        """Return the number of pending callbacks or `None` if this store
+        cannot tell.
+
+        """
+        return None
+
+    def get_stats(self):
+        """Return a `dict` with the metrics of this store.  Except for
+        `pending`, these are counted per process.
+
+        """
+        return dict(
+            pending=self.get_pending_count(),
+            stored=self.stored,
+            answered=self.answered,
+            expired=self.expired,
+            unknown=self.unknown)
+
+
+class LocalCallbackStore(CallbackStore):
+    """Keep pending callbacks in a `dict` in the memory of this
+    process.  Expired callbacks are purged when a callback is being
+    stored or retrieved.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(LocalCallbackStore, self).__init__(*args, **kwargs)
+        self.pending = {}
+
+    def purge(self):
+        now = time.time()
+        for k, (expires, cb) in list(self.pending.items()):
+            if expires < now:
+                del self.pending[k]
+                self.expired += 1
+
+    def put(self, cb):
+        self.purge()
+        k = self.new_key()
+        self.pending[k] = (time.time() + self.ttl, cb)
+        self.stored += 1
+        return k
+
+    def pop(self, key):
+        self.purge()
+        v = self.pending.pop(key, None)
+        if v is None:
+            self.unknown += 1
+            return None
+        self.answered += 1
+        return v[1]
+
+    def get_pending_count(self):
+        return len(self.pending)
+
+
+class CacheCallbackStore(CallbackStore):
+    """Keep the state of pending callbacks in a Django cache, so that
+    they are shared between all processes using this cache.
+
+    Use a `DatabaseCache
+    <https://docs.djangoproject.com/en/2.2/topics/cache/#database-caching>`__
+    if you want them stored in the database.
+
+    """
+    is_shared = True
+    key_prefix = 'lino.callbacks.'
+
+    def __init__(self, ttl=3600, alias='default'):
+        super(CacheCallbackStore, self).__init__(ttl)
+        from django.core.cache import caches
+        self.cache = caches[alias]
+
+    def put(self, cb):
+        state = cb.get_state()
+        k = self.new_key()
+        if state is None:
+            # A request without web request (e.g. in a doctest) cannot
+            # be answered anyway.
+            return k
+        state.update(expires=time.time() + self.ttl)
+        # Give the cache a bit more time than the ttl so that we can
+        # count expired callbacks.
+        self.cache.set(self.key_prefix + k, state, self.ttl + 600)
+        self.stored += 1
+        return k
+
+    def pop(self, key):
+        k = self.key_prefix + key
+        # Claim the callback using an atomic add() because the same
+        # answer may arrive at several processes at the same time
+        # (e.g. a double click).  Only the first claim succeeds.
+        if not self.cache.add(k + '.claimed', True, self.ttl + 600):
+            self.unknown += 1
+            return None
+        state = self.cache.get(k)
+        if state is None:
+            self.unknown += 1
+            return None
+        self.cache.delete(k)
+        if state['expires'] < time.time():
+            self.expired += 1
+            return None
+        self.answered += 1
+        return state
+
+
+def make_callback_store(site):
+    """Instantiate the callback store specified by
+    :attr:`callbacks_backend <lino.core.site.Site.callbacks_backend>`.
+
+    """
+    spec = site.callbacks_backend
+    ttl = site.callbacks_ttl
+    if spec is None or spec == 'local':
+        return LocalCallbackStore(ttl)
+    if spec == 'cache':
+        return CacheCallbackStore(ttl)
+    if spec.startswith('cache:'):
+        return CacheCallbackStore(ttl, spec[6:])
+    raise Exception("Invalid callbacks_backend {!r}".format(spec))
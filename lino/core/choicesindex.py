@@ -0,0 +1,193 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Defines the indexes used for answering the requests of combo boxes
+whose choices are not a database query (fields with :attr:`choices`,
+choicelists and choosers declared with ``index_choices=True``).
+
+A :class:`ChoiceIndex` holds the choices of a field for a given
+context, converted into the dicts sent to the client, and an index of
+all character n-grams of length 1 to 3 of their lowercased texts.  A
+quick search text of length *n* is looked up by intersecting the
+lists of its n-grams of length ``min(n, 3)``, which gives the same
+result as a substring search over all choices, but without looking at
+every choice.
+
+The indexes are kept in a :class:`ChoiceIndexCache`, a small LRU
+cache whose entries expire after some time because a chooser may
+return choices computed from the database.
+
+"""
+
+from __future__ import unicode_literals
+from builtins import object
+
+import threading
+import time
+from collections import OrderedDict
+
+from lino.core import constants
+
+GRAM_LENGTH = 3
+
+
+def iter_grams(text, n):
+    for i in range(len(text) - n + 1):
+        yield text[i:i + n]
+
+
+class ChoiceIndex(object):
+    """An index over a list of choices.
+
+    `rows` is a list of dicts with at least a
+    :data:`CHOICES_TEXT_FIELD <lino.core.constants.CHOICES_TEXT_FIELD>`
+    key.
+
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.texts = [
+            row[constants.CHOICES_TEXT_FIELD].lower() for row in rows]
+        # maps every n-gram (for n from 1 to GRAM_LENGTH) to the
+        # sorted list of the indexes of the texts containing it
+        self.grams = dict()
+        for i, text in enumerate(self.texts):
+            seen = set()
+            for n in range(1, GRAM_LENGTH + 1):
+                seen.update(iter_grams(text, n))
+            for g in seen:
+                self.grams.setdefault(g, []).append(i)
+
+    def lookup(self, search_text):
+        """Return the sorted list of the indexes of the choices whose text
+        contains the given search text.
+
+        This gives the same result as a case-insensitive substring
+        filter over all choices:
+
+        >>> texts = ["Apple", "pineapple", "Grape", "apricot", "Papaya", ""]
+        >>> index = ChoiceIndex(
+        ...     [{constants.CHOICES_TEXT_FIELD: t} for t in texts])
+        >>> index.lookup("ap")
+        [0, 1, 2, 3, 4]
+        >>> index.lookup("APPL")
+        [0, 1]
+        >>> index.lookup("xyz")
+        []
+        >>> def substring_filter(s):
+        ...     return [i for i, t in enumerate(texts)
+        ...             if s.lower() in t.lower()]
+        >>> all([index.lookup(s) == substring_filter(s)
+        ...      for s in ["a", "pa", "ape", "apple", "pineapple",
+        ...                "ppa", "aa", "e"]])
+        True
+
+        """
+        txt = search_text.lower()
+        n = min(len(txt), GRAM_LENGTH)
+        postings = []
+        for g in set(iter_grams(txt, n)):
+            p = self.grams.get(g, None)
+            if p is None:
+                return []
+            postings.append(p)
+        postings.sort(key=len)
+        candidates = postings[0]
+        if len(postings) > 1:
+            others = [set(p) for p in postings[1:]]
+            candidates = [i for i in candidates
+                          if all([i in s for s in others])]
+        if len(txt) > GRAM_LENGTH:
+            # the n-grams may occur at other places
+            texts = self.texts
+            candidates = [i for i in candidates if txt in texts[i]]
+        return candidates
+
+    def search(self, search_text=None, offset=None, limit=None):
+        """Return a tuple `(count, rows)` where `count` is the number of
+        choices matching the given search text and `rows` the
+        requested page of them.
+
+        """
+        if search_text:
+            found = self.lookup(search_text)
+            count = len(found)
+            if offset:
+                found = found[offset:]
+            if limit:
+                found = found[:limit]
+            return count, [self.rows[i] for i in found]
+        count = len(self.rows)
+        rows = self.rows
+        if offset:
+            rows = rows[offset:]
+        if limit:
+            rows = rows[:limit]
+        return count, list(rows)
+
+
+class ChoiceIndexCache(object):
+    """A thread-safe LRU cache of :class:`ChoiceIndex` instances.
+
+    .. attribute:: max_size
+
+        The maximum number of indexes to keep.
+
+    .. attribute:: ttl
+
+        The number of seconds after which an index is rebuilt.
+
+    """
+
+    def __init__(self, max_size=200, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.indexes = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the index for the given key, or `None` if there is no
+        valid index for it.
+
+        """
+        now = time.time()
+        with self.lock:
+            v = self.indexes.pop(key, None)
+            if v is not None and v[0] > now:
+                self.indexes[key] = v
+                self.hits += 1
+                return v[1]
+            self.misses += 1
+        return None
+
+    def put(self, key, rows):
+        """Build an index for the given list of rows, store it under the
+        given key and return it.
+
+        """
+        index = ChoiceIndex(rows)
+        with self.lock:
+            self.indexes[key] = (time.time() + self.ttl, index)
+            while len(self.indexes) > self.max_size:
+                self.indexes.popitem(last=False)
+        return index
+
+    def clear(self):
+        with self.lock:
+            self.indexes.clear()
+
+    def get_stats(self):
+        return dict(size=len(self.indexes), hits=self.hits,
+                    misses=self.misses)
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == "__main__":
+    _test()
@@ -30,6 +30,7 @@ from lino.core import actors
 
 from lino.core.choicelists import ChoiceListField
 from .utils import models_by_base
+from .utils import is_overridden
 # from .fields import get_data_elem_from_model
 
 
@@ -62,6 +63,13 @@ def add_gridfilters(qs, gridfilters):
     :param gridfilters: a list of dictionaries, each having 3 keys
                         `field`, `type` and `value`.
 
+    A string filter on a foreign key uses the :meth:`quick_search_filter
+    <lino.core.model.Model.quick_search_filter>` of the related model,
+    and thus its search index if it has one (see
+    :mod:`lino.modlib.search`).  A string filter on a character field
+    always uses a case-insensitive `LIKE` on that field because the
+    search index doesn't tell in which field a word occurs.
+
     """
     if not isinstance(qs, QuerySet):
         raise NotImplementedError('TODO: filter also simple lists')
@@ -167,6 +175,40 @@ class Table(AbstractTable):
 
     debug_sql = False
 
+    auto_select_related = True
+    """Whether :meth:`get_request_queryset` should automatically add
+    `select_related()` and `prefetch_related()` for the relations
+    needed to render the columns of this table.  See
+    :meth:`lino.core.store.Store.get_related_lookups`.
+
+    """
+
+    only_list_fields = False
+    """Whether :meth:`get_request_queryset` should load only the database
+    fields needed to render the columns of this table.
+
+    Use this only when you know that no virtual field, custom
+    permission handler or :meth:`__str__` method of your model needs
+    some other field, otherwise Lino would need an additional
+    query per row for loading the deferred fields.
+
+    """
+
+    debug_queries = False
+    """Set this to True to log the number of database queries used for
+    rendering each page of this table, and to collect them in
+    :attr:`query_stats`.
+
+    """
+
+    query_stats = None
+    """A `dict` with the number of `pages`, `rows` and `queries` rendered
+    by this table since server startup and the maximum number of queries
+    used for a single page (`max`).  Collected only when
+    :attr:`debug_queries` is True.
+
+    """
+
     show_detail_navigator = True
 
     screenshot_profiles = ['admin']
@@ -504,13 +546,50 @@ class Table(AbstractTable):
             parent = ar.bound_action.action
             if not parent.opens_a_window:
                 return s
-            for ba in cls.get_button_actions(parent):
-                a = ba.action
-                if a.action_name and a.show_in_bbar:
-                    if not cls.get_row_permission(obj, ar, state, ba):
-                        s.add(a.action_name)
+            k = (ar.get_user().user_type, state, parent.window_type)
+            v = cls._disabled_actions_cache.get(k, None)
+            if v is None:
+                v = cls.make_disabled_actions(obj, ar, state, parent)
+                cls._disabled_actions_cache[k] = v
+            disabled, dynamic = v
+            s |= disabled
+            for ba in dynamic:
+                if not cls.get_row_permission(obj, ar, state, ba):
+                    s.add(ba.action.action_name)
         return s
 
+    @classmethod
+    def make_disabled_actions(cls, obj, ar, state, parent):
+        """Return a tuple `(disabled, dynamic)` where `disabled` is the set
+        of names of button actions which are disabled for every row in
+        the given workflow `state` and for the user type of `ar`, and
+        `dynamic` is a list of the bound actions whose permission
+        depends on the row itself and must be checked for every row.
+
+        An action is *dynamic* when its :meth:`get_action_permission
+        <lino.core.actions.Action.get_action_permission>` is
+        overridden or when the table or its model override
+        :meth:`get_row_permission`.  The permission of the other
+        actions depends only on the user type and the state, so
+        :meth:`make_disabled_fields` caches this result per `(user
+        type, state, window type)`.
+
+        """
+        rowperm = is_overridden(cls, Table, 'get_row_permission') or \
+            is_overridden(obj.__class__, Model, 'get_row_permission')
+        disabled = set()
+        dynamic = []
+        for ba in cls.get_button_actions(parent):
+            a = ba.action
+            if a.action_name and a.show_in_bbar:
+                if rowperm or is_overridden(
+                        a.__class__, actions.Action,
+                        'get_action_permission'):
+                    dynamic.append(ba)
+                elif not cls.get_row_permission(obj, ar, state, ba):
+                    disabled.add(a.action_name)
+        return (frozenset(disabled), tuple(dynamic))
+
     @classmethod
     def get_row_permission(cls, obj, ar, state, ba):
         """Returns True if the given action is allowed for the given instance
@@ -624,6 +703,7 @@ class Table(AbstractTable):
             if order_by:
                 # logger.info("20120122 order_by %s",order_by)
                 qs = qs.order_by(*order_by)
+            qs = self.add_related_lookups(ar, qs)
             if self.debug_sql:
                 logger.info("%s %s", self.debug_sql, qs.query)
             return qs
@@ -646,6 +726,49 @@ class Table(AbstractTable):
         qs = self.get_queryset(ar)
         return apply(qs)
 
+    @classmethod
+    def add_related_lookups(self, ar, qs):
+        """Add `select_related()`, `prefetch_related()` and (if
+        :attr:`only_list_fields` is True) `only()` to the given
+        queryset, as needed for rendering the columns of this table
+        without one query per row and related object.
+
+        """
+        if not self.auto_select_related:
+            return qs
+        if not isinstance(qs, QuerySet) or qs._fields is not None:
+            return qs  # e.g. a list or a values() queryset
+        ah = getattr(ar, 'ah', None)
+        store = getattr(ah, 'store', None)
+        if store is None:
+            return qs
+        select, prefetch, only = store.get_related_lookups()
+        if select and qs.query.select_related is not True:
+            qs = qs.select_related(*select)
+        if prefetch:
+            qs = qs.prefetch_related(*prefetch)
+        if self.only_list_fields and only and \
+                not qs.query.deferred_loading[0]:
+            qs = qs.only(*only)
+        return qs
+
+    @classmethod
+    def count_page_queries(self, ar, rows, queries):
+        """Update :attr:`query_stats` after rendering a page of `rows` rows
+        which needed `queries` database queries.
+
+        """
+        st = self.__dict__.get('query_stats', None)
+        if st is None:
+            st = dict(pages=0, rows=0, queries=0, max=0)
+            self.query_stats = st
+        st['pages'] += 1
+        st['rows'] += rows
+        st['queries'] += queries
+        st['max'] = max(st['max'], queries)
+        logger.info("%s : %d queries for %d rows (%s)",
+                    self, queries, rows, st)
+
     @classmethod
     def get_queryset(self, ar, **filter):
         """Return the Django Queryset processed by this table.
@@ -15,9 +15,12 @@ logger = logging.getLogger(__name__)
 
 from django.conf import settings
 from django.db import models
+from django.db.models import Count, Exists, OuterRef
 
 from .utils import full_model_name as fmn
 
+GFK_TARGETS = (models.AutoField, models.IntegerField)
+
 
 class DisableDeleteHandler(object):
     """A helper object used to find out whether a known object can be
@@ -60,40 +63,151 @@ class DisableDeleteHandler(object):
         s = ','.join([m.__name__ + '.' + fk.name for m, fk in self.fklist])
         return "<DisableDeleteHandler(%s, %s)>" % (self.model, s)
 
-    def disable_delete_on_object(self, obj, ignore_models=set()):
-        """Return a veto message which explains why this object cannot be
-        deleted.  Return `None` if there is no veto.
+    def get_veto_relations(self, cls, ignore_models=set()):
+        """Yield a tuple `(model, queryset, lookup, target)` for every
+        relation which can prevent an object of the given class `cls`
+        from being deleted.
 
-        If `ignore_model` (a set of model class objects) is specified,
-        do not check for vetos on ForeignKey fields defined on one of
-        these models.
+        `cls` is either :attr:`model` or a MTI child of it.  An
+        object `obj` of `cls` is blocked by this relation if
+        ``queryset.filter(**{lookup: getattr(obj, target)})`` is not
+        empty.
 
         """
-        #logger.info("20101104 called %s.disable_delete(%s)", obj, self)
-        # print "20150831 disable_delete", obj, self
         for m, fk in self.fklist:
             if m in ignore_models:
-                # print "20150831 skipping", m, fk
                 continue
-            # if m.__name__.endswith("Partner") and fk.name == 'partner':
-            # print 20150831, m, fk
             if fk.name in m.allow_cascaded_delete:
                 continue
             if fk.null and fk.remote_field.on_delete == models.SET_NULL:
                 continue
-            n = m.objects.filter(**{fk.name: obj}).count()
-            if n:
-                return obj.delete_veto_message(m, n)
+            yield m, m.objects.all(), fk.attname, fk.target_field.attname
+
         kernel = settings.SITE.kernel
-        # print "20141208 generic related objects for %s:" % obj
-        for gfk, fk_field, qs in kernel.get_generic_related(obj):
-            if gfk.name in qs.model.allow_cascaded_delete:
+        if len(kernel.GFK_LIST) == 0:
+            return  # e.g. if contenttypes is not installed
+        if not isinstance(cls._meta.pk, GFK_TARGETS):
+            return
+        from django.contrib.contenttypes.models import ContentType
+        obj_ct = ContentType.objects.get_for_model(cls)
+        for gfk in kernel.GFK_LIST:
+            m = gfk.model
+            if gfk.name in m.allow_cascaded_delete:
                 continue
+            fk_field = m._meta.get_field(gfk.fk_field)
             if fk_field.null:  # a nullable GFK is no reason to veto
                 continue
-            n = qs.count()
-            # print "20141208 - %s %s %s" % (
-            #     gfk.model, gfk.name, qs.query)
-            if n:
-                return obj.delete_veto_message(qs.model, n)
-        return None
+            qs = m._base_manager.filter(**{gfk.ct_field: obj_ct})
+            yield m, qs, gfk.fk_field, cls._meta.pk.attname
+
+    def disable_delete_on_object(self, obj, ignore_models=set()):
+        """Return a veto message which explains why this object cannot be
+        deleted.  Return `None` if there is no veto.
+
+        If `ignore_model` (a set of model class objects) is specified,
+        do not check for vetos on ForeignKey fields defined on one of
+        these models.
+
+        This asks the database in a single query whether any of the
+        :meth:`veto relations <get_veto_relations>` has a row
+        referring to `obj` (see :meth:`get_delete_vetos`).  Only when
+        there is a veto, we run a second query which counts the rows
+        of the first blocking relation (the one which is mentioned in
+        the message).
+
+        A veto message cached by :func:`prefetch_delete_vetos` is used
+        only once.
+
+        """
+        if not ignore_models:
+            cache = obj.__dict__.get('_lino_ddh_vetos', None)
+            if cache is not None and self.model in cache:
+                msg = cache.pop(self.model)
+                if len(cache) == 0:
+                    del obj.__dict__['_lino_ddh_vetos']
+                return msg
+        if obj.pk is None:
+            return None
+        return self.get_delete_vetos([obj], ignore_models)[obj.pk]
+
+    def get_delete_vetos(self, objects, ignore_models=set()):
+        """Return a `dict` which maps the primary key of each of the given
+        objects to its veto message (or `None` if it can be deleted).
+
+        All objects must be instances of the same class, which is
+        either :attr:`model` or a MTI child of it, and come from the
+        same database.
+
+        This is the batched form of :meth:`disable_delete_on_object`
+        for checking e.g. all selected rows at once.  It uses a
+        single query which annotates the objects with an `EXISTS`
+        subquery per veto relation, plus one query per relation which
+        is the first blocking one for at least one object.
+
+        """
+        objects = [obj for obj in objects if obj.pk is not None]
+        vetos = dict([(obj.pk, None) for obj in objects])
+        if len(objects) == 0:
+            return vetos
+        cls = objects[0].__class__
+        relations = list(self.get_veto_relations(cls, ignore_models))
+        if len(relations) == 0:
+            return vetos
+        db = objects[0]._state.db
+        qs = self.model._base_manager.using(db).filter(
+            pk__in=list(vetos.keys()))
+        names = []
+        for i, (m, rqs, lookup, target) in enumerate(relations):
+            name = '_veto_%d' % i
+            qs = qs.annotate(**{name: Exists(rqs.filter(
+                **{lookup: OuterRef(target)}))})
+            names.append(name)
+
+        blocked = dict()  # relation index -> list of objects
+        first_vetos = dict([
+            (row[0], row[1:])
+            for row in qs.order_by().values_list('pk', *names)])
+        for obj in objects:
+            for i, v in enumerate(first_vetos.get(obj.pk, ())):
+                if v:
+                    blocked.setdefault(i, []).append(obj)
+                    break
+
+        for i, objs in blocked.items():
+            m, rqs, lookup, target = relations[i]
+            counts = dict(
+                rqs.using(db).filter(**{lookup + '__in': [
+                    getattr(obj, target) for obj in objs]}).order_by(
+                    ).values_list(lookup).annotate(n=Count('pk')))
+            for obj in objs:
+                vetos[obj.pk] = obj.delete_veto_message(
+                    m, counts.get(getattr(obj, target), 0))
+        return vetos
+
+
+def prefetch_delete_vetos(objects):
+    """Compute the veto messages of the given database objects in a few
+    queries and cache them on each object, so that the next call to
+    :meth:`DisableDeleteHandler.disable_delete_on_object` doesn't need
+    to ask the database again.  The cached messages are removed when
+    they have been used, or by :func:`clear_delete_vetos`.
+
+    """
+    groups = dict()
+    for obj in objects:
+        groups.setdefault(obj.__class__, []).append(obj)
+    for cls, objs in groups.items():
+        vetos = cls._lino_ddh.get_delete_vetos(objs)
+        for obj in objs:
+            if obj.pk in vetos:
+                cache = obj.__dict__.setdefault('_lino_ddh_vetos', {})
+                cache[cls] = vetos[obj.pk]
+
+
+def clear_delete_vetos(objects):
+    """Remove the veto messages cached by :func:`prefetch_delete_vetos`
+    from the given objects.
+
+    """
+    for obj in objects:
+        obj.__dict__.pop('_lino_ddh_vetos', None)
@@ -34,6 +34,7 @@ import sys
 import time
 # import copy
 import codecs
+import copy
 import atexit
 import threading
 from importlib import import_module
@@ -45,6 +46,7 @@ from django.conf import settings
 from django.core import exceptions
 from django.utils.encoding import force_text
 from django.core.exceptions import PermissionDenied
+from django.http import QueryDict
 from django.db.utils import DatabaseError
 
 from django.db import models
@@ -76,7 +78,8 @@ from lino.core.signals import (pre_ui_build, post_ui_build,
                                pre_analyze, post_analyze)
 
 from .plugin import Plugin
-from .ddh import DisableDeleteHandler
+from .ddh import DisableDeleteHandler, GFK_TARGETS
+from .callbacks import Callback, CallbackChoice, make_callback_store
 from .utils import resolve_model
 from .utils import is_devserver, UnresolvedModel
 from .utils import full_model_name as fmn
@@ -99,60 +102,6 @@ CLONEABLE_ATTRS = frozenset("""ah request user subst_user
 bound_action create_kw known_values param_values
 action_param_values""".split())
 
-GFK_TARGETS = (models.AutoField, models.IntegerField)
-
-
-class CallbackChoice(object):
-    #~ def __init__(self,name,label,func):
-
-    def __init__(self, name, func, label):
-        self.name = name
-        #~ self.index = index
-        self.func = func
-        self.label = label
-
-
-class Callback(object):
-    """A callback is a question that rose during an AJAX action.
-    The original action is pending until we get a request
-    that answers the question.
-
-    TODO: move all callback-related code out of
-    :mod:`lino.core.kernel` into to a separate module and install it
-    as a "kernel plugin" in a similar way as :mod:`lino.core.web` and
-    :mod:`lino.utils.config`.
-
-    """
-    title = _('Confirmation')
-
-    def __init__(self, ar, message):
-        self.message = message
-        self.choices = []
-        self.choices_dict = {}
-        self.ar = ar
-
-    def __repr__(self):
-        return "Callback(%r)" % self.message
-
-    def set_title(self, title):
-        self.title = title
-
-    def add_choice(self, name, func, label):
-        """
-        Add a possible answer to this callback.
-        - name: "yes", "no", "ok" or "cancel"
-        - func: a callable to be executed when user selects this choice
-        - the label of the button
-        """
-        assert not name in self.choices_dict
-        allowed_names = ("yes", "no", "ok", "cancel")
-        if not name in allowed_names:
-            raise Exception("Sorry, name must be one of %s" % allowed_names)
-        cbc = CallbackChoice(name, func, label)
-        self.choices.append(cbc)
-        self.choices_dict[name] = cbc
-        return cbc
-
 
 class Kernel(object):
     """
@@ -202,7 +151,7 @@ class Kernel(object):
         #             logger.warning("Failed to import %s : %s", x, e)
         #             # raise Exception("Failed to import %s : %s" % (x, e))
 
-        self.pending_threads = {}
+        self.callback_store = make_callback_store(site)
         self.site = site
         self.GFK_LIST = []
         # self.widgets = WidgetFactory()
@@ -817,15 +766,18 @@ class Kernel(object):
         # 20140304 Also set a renderer so that callbacks can use it
         # (feature needed by beid.FindByBeIdAction).
 
-        thread_id = thread_id
-        cb = self.pending_threads.pop(thread_id, None)
+        store = self.callback_store
+        cb = store.pop(thread_id)
         if cb is None:
             ar = ActorRequest(request, renderer=self.default_renderer)
             logger.debug("No callback %r in %r" % (
-                thread_id, list(self.pending_threads.keys())))
+                thread_id, store.get_stats()))
             ar.error("Unknown callback %r" % thread_id)
             return ar.renderer.render_action_response(ar)
 
+        if store.is_shared:
+            return self.replay_callback(request, thread_id, cb, button_id)
+
         # e.g. SubmitInsertClient must set `data_record` in the
         # callback request ("ar2"), not the original request ("ar"),
         # i.e. the methods to create an instance and to fill
@@ -852,6 +804,47 @@ class Kernel(object):
         ar.error("Invalid button %r for callback %r" % (button_id, thread_id))
         return ar.renderer.render_action_response(ar)
 
+    def replay_callback(self, request, thread_id, state, button_id):
+        """Continue a dialog thread whose :meth:`state
+        <lino.core.callbacks.Callback.get_state>` comes from a shared
+        callback store.
+
+        This runs the original action again, on a request which has
+        the same data as the original request, and with the given
+        answer registered so that :meth:`set_callback` doesn't ask the
+        same question again.  The code which runs before the question
+        runs a second time, on a request whose :attr:`is_replay
+        <lino.core.requests.BaseRequest.is_replay>` is `True`.
+
+        """
+        from lino.core.views import requested_actor
+        if state['user_id'] != getattr(request.user, 'pk', None):
+            raise PermissionDenied(
+                "Callback {} belongs to another user".format(thread_id))
+        rpt = requested_actor(*state['actor'].split('.'))
+        ba = rpt.get_action_by_name(state['action_name'])
+        rq = copy.copy(request)
+        rq.method = state['method']
+        rqdata = QueryDict(state['rqdata'])
+        if rq.method == 'GET':
+            rq.GET = rqdata
+        elif rq.method == 'POST':
+            rq.POST = rqdata
+        else:
+            rq._body = state['rqdata'].encode('utf-8')
+        ar = rpt.request(request=rq, action=ba, rqdata=rqdata)
+        if state['selected_pks']:
+            ar.set_selected_pks(*state['selected_pks'])
+        ar.renderer = self.default_renderer
+        answers = dict(state['answers'])
+        answers[state['signature']] = button_id
+        ar.xcallback_answers = answers
+        ar.is_replay = True
+        if self.site.log_each_action_request:
+            logger.info("replay_callback {0} {1}".format(
+                thread_id, button_id))
+        return self.run_action(ar)
+
     def add_callback(self, ar, *msgs):
         """
         Returns an *action callback* which will initiate a dialog thread by
@@ -876,12 +869,31 @@ class Kernel(object):
         return Callback(ar, msg)
 
     def set_callback(self, ar, cb):
+        """Store the given callback and ask the question to the user.
+
+        If the request is a replay of a dialog thread (see
+        :meth:`replay_callback`) and the question has been answered
+        before, run the chosen answer instead of asking.
+
         """
-        """
-        k = "{0:x}".format(hash(cb))
-        self.pending_threads[k] = cb
+        answers = getattr(ar, 'xcallback_answers', None)
+        if answers:
+            button_id = answers.get(cb.get_signature(), None)
+            if button_id is not None:
+                c = cb.choices_dict.get(button_id, None)
+                if c is None:
+                    ar.error("Invalid button %r for callback %r" % (
+                        button_id, cb))
+                    return
+                try:
+                    c.func(ar)
+                except Warning as e:
+                    ar.error(e, alert=True)
+                return
+
+        k = self.callback_store.put(cb)
         # logger.info("20160526 Stored %r in %r" % (
-        #     h, self.pending_threads))
+        #     k, self.callback_store))
 
         buttons = dict()
         for c in cb.choices:
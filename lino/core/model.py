@@ -214,6 +214,15 @@ class Model(models.Model, fields.TableRow):
 
     """
 
+    use_search_index = False
+    """Whether the quick search on this model should use the search
+    index of :mod:`lino.modlib.search`.  This has no effect when that
+    plugin is not installed.
+
+    """
+
+    _search_index = None
+
     active_fields = frozenset()
     """If specified, this is the default value for
     :attr:`active_fields<lino.core.tables.AbstractTable.active_fields>`
@@ -590,6 +599,7 @@ class Model(models.Model, fields.TableRow):
         # logger.info(
         #     "20160610 quick_search_filter(%s, %r, %r)",
         #     model, search_text, prefix)
+        index = getattr(model, '_search_index', None)
         flt = models.Q()
         for w in search_text.split():
             q = models.Q()
@@ -602,9 +612,15 @@ class Model(models.Model, fields.TableRow):
                     kw = {prefix + fn.name: int(w)}
                     q = q | models.Q(**kw)
             if char_search:
-                for fn in model.quick_search_fields:
-                    kw = {prefix + fn.name + "__icontains": w}
-                    q = q | models.Q(**kw)
+                iq = None
+                if index is not None:
+                    iq = index.get_filter(model, w, prefix)
+                if iq is not None:
+                    q = q | iq
+                else:
+                    for fn in model.quick_search_fields:
+                        kw = {prefix + fn.name + "__icontains": w}
+                        q = q | models.Q(**kw)
             flt &= q
         return flt
 
@@ -1156,6 +1172,7 @@ LINO_MODEL_ATTRIBS = (
     'obj2href',
     'quick_search_fields',
     'quick_search_fields_digit',
+    'use_search_index',
     'change_watcher_spec',
     'on_analyze',
     'disable_delete',
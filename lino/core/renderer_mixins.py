@@ -22,12 +22,67 @@ from django.utils import translation
 
 
 import os
+import io
+import glob
+import codecs
+import gzip
 import time
+import shutil
+import hashlib
+import multiprocessing
+
+from django.db import connections
 
 from lino.core import kernel
 from lino.modlib.users.utils import get_user_profile, with_user_profile
 from lino.modlib.users.choicelists import UserTypes
 
+
+# The renderer whose build_site_cache() started the worker pool.  The
+# workers are forked and inherit it.
+_renderer = None
+
+
+def _build_js_job(job):
+    # Runs in a worker process of the pool started by build_site_cache().
+    lang, user_type_value, force = job
+    user_type = UserTypes.get_by_value(user_type_value)
+    with translation.override(lang):
+        return with_user_profile(user_type, _renderer.build_js_cache, force)
+
+
+def _replace(src, dst):
+    try:
+        os.replace(src, dst)
+    except AttributeError:  # Python 2
+        if os.path.lexists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def _write_atomic(fn, data):
+    tmp = "{}.{}.tmp".format(fn, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    _replace(tmp, fn)
+
+
+def _link(target, fn):
+    """Make `fn` a symbolic link to `target` (a file in the same
+    directory), or a copy of it where symbolic links are not
+    available.
+
+    """
+    tmp = "{}.{}.tmp".format(fn, os.getpid())
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    try:
+        os.symlink(os.path.basename(target), tmp)
+    except (AttributeError, NotImplementedError, OSError):
+        shutil.copyfile(target, tmp)
+    _replace(tmp, fn)
+
+
 class JsCacheRenderer():
     """
     Mixin for:
@@ -193,12 +248,31 @@ class JsCacheRenderer():
             os.path.join(settings.MEDIA_ROOT, 'webdav'))
 
         if force or settings.SITE.build_js_cache_on_startup:
-            count = 0
-            for lng in settings.SITE.languages:
-                with translation.override(lng.django_code):
-                    for user_type in UserTypes.objects():
+            jobs = [(lng.django_code, user_type.value, force)
+                    for lng in settings.SITE.languages
+                    for user_type in UserTypes.objects()]
+            processes = min(
+                settings.SITE.build_js_cache_processes or 1, len(jobs))
+            if processes > 1:
+                global _renderer
+                _renderer = self
+                # the worker processes must not share our connection
+                connections.close_all()
+                pool = multiprocessing.Pool(processes)
+                try:
+                    count = sum(pool.imap_unordered(_build_js_job, jobs))
+                finally:
+                    pool.close()
+                    pool.join()
+                    _renderer = None
+            else:
+                count = 0
+                for lng, user_type, force in jobs:
+                    with translation.override(lng):
                         count += with_user_profile(
-                            user_type, self.build_js_cache, force)
+                            UserTypes.get_by_value(user_type),
+                            self.build_js_cache, force)
+            self.remove_unused_js_files()
             logger.info("%d lino*.js files have been built in %s seconds.",
                         count, time.time() - started)
 
@@ -207,6 +281,11 @@ class JsCacheRenderer():
         current language.  If the file exists and is up to date, don't
         generate it unless `force` is `True`.
 
+        Many user types get exactly the same Javascript.  So the
+        generated content is stored in a file named after its hash
+        (see :meth:`store_js_file`), and the :xfile:`lino*.js` file is
+        just a symbolic link to it.
+
         This is called
 
         - on each request if :attr:`build_js_cache_on_startup
@@ -217,9 +296,100 @@ class JsCacheRenderer():
           run.
 
         """
-        fn = os.path.join(*self.lino_js_parts())
+        fn = os.path.join(settings.MEDIA_ROOT, *self.lino_js_parts())
+        return self.build_js_file(fn, self.write_lino_js, force)
+
+    def build_js_file(self, fn, write, force=False):
+        """Build the Javascript file `fn` by calling `write` on a file
+        object, and store it using :meth:`store_js_file`.  If the file
+        exists and is up to date, don't generate it unless `force` is
+        `True`.  Return 1 if the file has been built, otherwise 0.
+
+        """
+        site = settings.SITE
+        if not force and not site.kernel._must_build \
+           and os.path.lexists(fn):
+            # We test the time of the link, not the time of its target
+            # because the target may have been reused from an earlier
+            # build.
+            mtime = os.lstat(fn).st_mtime
+            if mtime > site.kernel.code_mtime:
+                logger.debug("%s (%s) is up to date.", fn, time.ctime(mtime))
+                return 0
+
+        if site.is_demo_site:
+            logger.debug("Building %s ...", fn)
+        else:
+            logger.info("Building %s ...", fn)
+
+        # a utf-8 writer like the one returned by codecs.open() so
+        # that writers may continue to write byte strings under
+        # Python 2
+        f = codecs.getwriter('utf-8')(io.BytesIO())
+        try:
+            write(f)
+        except Exception:
+            if site.keep_erroneous_cache_files:
+                site.makedirs_if_missing(os.path.dirname(fn))
+                _write_atomic(fn, f.getvalue())
+            raise
+        self.store_js_file(fn, f.getvalue())
+        return 1
+
+    def store_js_file(self, fn, content):
+        """Store the given content (bytes) for the :xfile:`lino*.js`
+        file `fn`.
 
-        def write(f):
-            self.write_lino_js(f)
+        The content is written to a file :file:`lino.HASH.js` in the
+        same directory, where HASH is computed from the content, and
+        `fn` becomes a link to it.  A gzip compressed variant
+        :file:`lino.HASH.js.gz` is written as well, linked from
+        :file:`fn.gz`, so that a web server can serve it without
+        compressing it for every request (e.g. `gzip_static
+        <https://nginx.org/en/docs/http/ngx_http_gzip_static_module.html>`__
+        in nginx).
 
-        return settings.SITE.kernel.make_cache_file(fn, write, force)
+        A file with a given hash is written only once.  So the
+        modification time of unchanged content (and hence the ETag
+        that web servers compute from it) remains the same across
+        rebuilds, and browsers can continue to use their cached copy.
+
+        """
+        dirname = os.path.dirname(fn)
+        settings.SITE.makedirs_if_missing(dirname)
+        digest = hashlib.sha1(content).hexdigest()[:16]
+        target = os.path.join(dirname, "lino.{}.js".format(digest))
+        if not os.path.exists(target + '.gz'):
+            buf = io.BytesIO()
+            # mtime=0 makes the compressed file depend only on the
+            # content
+            with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as gz:
+                gz.write(content)
+            _write_atomic(target, content)
+            _write_atomic(target + '.gz', buf.getvalue())
+        _link(target, fn)
+        _link(target + '.gz', fn + '.gz')
+
+    def remove_unused_js_files(self):
+        """Remove the :file:`lino.HASH.js` files (and their compressed
+        variants) to which no file in the cache directory links
+        anymore.
+
+        """
+        dirname = os.path.join(settings.MEDIA_ROOT, 'cache', 'js')
+        if not os.path.isdir(dirname):
+            return
+        used = set()
+        for name in os.listdir(dirname):
+            fn = os.path.join(dirname, name)
+            if os.path.islink(fn):
+                used.add(os.path.realpath(fn))
+        if not used:
+            # symbolic links are not available, so we cannot tell
+            # which hashed files are still used
+            return
+        for fn in glob.glob(os.path.join(dirname, 'lino.*.js')):
+            if os.path.realpath(fn) not in used:
+                os.remove(fn)
+                if os.path.exists(fn + '.gz'):
+                    os.remove(fn + '.gz')
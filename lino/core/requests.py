@@ -194,6 +194,14 @@ class BaseRequest(object):
     content_type = 'application/json'
     requesting_panel = None
 
+    is_replay = False
+    """
+    Whether this request replays an action in order to continue a
+    dialog callback from a shared callback store (see
+    :mod:`lino.core.callbacks`).  Actions which have side effects
+    before asking a question must skip them when this is `True`.
+    """
+
     def __init__(self, request=None, parent=None,
                  is_on_main_actor=True, **kw):
         self.request = request
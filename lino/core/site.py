@@ -26,6 +26,8 @@ import datetime
 import warnings
 import collections
 import locale
+import time
+import uuid
 from importlib import import_module
 from six.moves.urllib.parse import urlencode
 
@@ -675,6 +677,17 @@ class Site(object):
 
     """
 
+    build_js_cache_processes = 1
+    """The number of worker processes to use for building the
+    :xfile:`lino*.js` files of all user types and languages (see
+    :attr:`build_js_cache_on_startup`).
+
+    The workers are forked from the process which builds the site
+    cache.  The default value 1 builds the files one after the other
+    in the current process.
+
+    """
+
     keep_erroneous_cache_files = False
     """When some exception occurs during
     :meth:`lino.core.kernel.Kernel.make_cache_file`, Lino usually
@@ -750,6 +763,32 @@ class Site(object):
 
     """
 
+    site_config_check_interval = 5
+    """
+    The number of seconds during which a process uses its cached copy
+    of the :attr:`site_config` without checking whether another
+    process has modified it.
+
+    Every save of the :class:`SiteConfig
+    <lino.modlib.system.models.SiteConfig>` writes a new version
+    token to the default Django cache.  Every process checks this
+    token at most once per interval and reloads its copy when the
+    token has changed.
+
+    This is used only when the default cache is shared between the
+    processes (e.g. memcached or a database cache).  It is ignored
+    when the default cache is a local-memory or dummy cache (Django's
+    default), because other processes wouldn't see the token.  Set
+    this to `None` to never check.
+    """
+
+    site_config_version_timeout = 7 * 24 * 3600
+    """
+    The timeout (in seconds) of the version token used by
+    :attr:`site_config_check_interval`.  When the token has expired,
+    every process reloads its copy of the :attr:`site_config` once.
+    """
+
     # default_build_method = "appypdf"
     # default_build_method = "appyodt"
     # default_build_method = "wkhtmltopdf"
@@ -1118,6 +1157,34 @@ class Site(object):
     <lino.core.kernel.Kernel.run_callback>` methods.
     """
 
+    callbacks_backend = None
+    """
+    Where to store pending dialog callbacks (see
+    :mod:`lino.core.callbacks`).
+
+    The default value `None` (or ``'local'``) stores them in the
+    memory of the process.  ``'cache'`` stores them in the default
+    Django cache and ``'cache:name'`` in the cache with the given
+    alias.  Use a shared cache when your site runs on several worker
+    processes.
+    """
+
+    callbacks_ttl = 3600
+    """
+    The number of seconds after which an unanswered dialog callback
+    expires.
+    """
+
+    cache_quicklinks = False
+    """
+    Whether :meth:`get_quicklinks` may build the quick links only once
+    per user type and language.
+
+    Set this to `True` if the :meth:`setup_quicklinks` methods of
+    your application depend only on the user type of the user and not
+    on the user himself.
+    """
+
     verbose_client_info_message = False
     """
     Set this to True if actions should send debug messages to the client.
@@ -1272,6 +1339,9 @@ class Site(object):
 
     # for internal use:
     _site_config = None
+    _site_config_version = None
+    _site_config_checked = 0
+    _site_config_check_enabled = None
     _logger = None
     _starting_up = False
 
@@ -1332,6 +1402,7 @@ class Site(object):
 
         self._welcome_handlers = []
         self._help_texts = dict()
+        self.clear_menu_cache()
         self.plugins = AttrDict()
         self.models = AttrDict()
         self.modules = self.models  # backwards compat
@@ -2252,6 +2323,7 @@ class Site(object):
             except locale.Error as e:
                 self.logger.warning("%s : %s", self.site_locale, e)
         self.clear_site_config()
+        self.clear_menu_cache()
 
     def do_site_startup(self):
         """
@@ -3308,6 +3380,9 @@ site. :manage:`diag` is a command-line shortcut to this.
         if not self._startup_done:
             return None
 
+        if self._site_config is not None:
+            self.check_site_config_version()
+
         if self._site_config is None:
             #~ raise Exception(20130301)
             #~ print '20130320 create _site_config'
@@ -3315,6 +3390,10 @@ site. :manage:`diag` is a command-line shortcut to this.
             from lino.core.utils import obj2str
             SiteConfig = self.models.system.SiteConfig
             #~ from django.db.utils import DatabaseError
+            # read the version before the row so that we don't miss a
+            # modification which happens in between.
+            self._site_config_version = self.get_site_config_version()
+            self._site_config_checked = time.time()
             try:
                 self._site_config = SiteConfig.real_objects.get(
                     id=self.config_id)
@@ -3347,13 +3426,116 @@ site. :manage:`diag` is a command-line shortcut to this.
 
         This is needed e.g. when the test runner has created a new
         test database.
+
+        This also clears the cached menus (see
+        :meth:`clear_menu_cache`) because an application may build
+        them depending on the SiteConfig.
         """
         from lino.core.utils import obj2str
         # print("20180502 clear_site_config {}".format(
         #     obj2str(self._site_config, True)))
         self._site_config = None
+        self.clear_menu_cache()
+
+    def invalidate_site_config(self):
+        """
+        Clear the cached SiteConfig instance in all processes.
+
+        This writes a new version token checked by
+        :meth:`check_site_config_version`.  It is called when the
+        SiteConfig has been saved.
+        """
+        if self.is_site_config_check_enabled():
+            from django.core.cache import cache
+            cache.set(self.get_site_config_version_key(),
+                      uuid.uuid4().hex, self.site_config_version_timeout)
+        self.clear_site_config()
+
+    def is_site_config_check_enabled(self):
+        """
+        Whether the processes of this site check for modifications of
+        the SiteConfig by other processes.  See
+        :attr:`site_config_check_interval`.
+        """
+        if self.site_config_check_interval is None:
+            return False
+        if self._site_config_check_enabled is None:
+            from django.conf import settings
+            backend = settings.CACHES['default']['BACKEND']
+            self._site_config_check_enabled = backend not in (
+                'django.core.cache.backends.locmem.LocMemCache',
+                'django.core.cache.backends.dummy.DummyCache')
+        return self._site_config_check_enabled
+
+    def get_site_config_version_key(self):
+        return 'lino.site_config_version.{}'.format(self.config_id)
+
+    def get_site_config_version(self):
+        """
+        Return the current version token of the SiteConfig, or `None`
+        if :meth:`is_site_config_check_enabled` is `False`.
+        """
+        if not self.is_site_config_check_enabled():
+            return None
+        from django.core.cache import cache
+        key = self.get_site_config_version_key()
+        v = cache.get(key)
+        if v is None:
+            # A new token makes every process reload its copy, which
+            # is what we want because we don't know what happened
+            # while there was no token.
+            cache.add(key, uuid.uuid4().hex,
+                      self.site_config_version_timeout)
+            v = cache.get(key)
+        return v
+
+    def check_site_config_version(self):
+        """
+        Clear the cached SiteConfig instance if another process has
+        modified it.  Does nothing if the last check was less than
+        :attr:`site_config_check_interval` seconds ago.
+        """
+        if not self.is_site_config_check_enabled():
+            return
+        now = time.time()
+        if now - self._site_config_checked < self.site_config_check_interval:
+            return
+        self._site_config_checked = now
+        if self.get_site_config_version() != self._site_config_version:
+            self.clear_site_config()
+
+    def clear_menu_cache(self):
+        """
+        Forget the cached main menus and quick links.
+
+        Lino builds the main menu only once per user type and language
+        (see :meth:`get_site_menu`).  This is called during
+        :meth:`startup` and when the SiteConfig changes (see
+        :meth:`clear_site_config`).  You need to call it yourself only
+        if your application modifies its menu structure at runtime
+        for other reasons.
+        """
+        self._menu_cache = dict()
+        self._menu_html_cache = dict()
+        self._quicklinks_cache = dict()
 
     def get_quicklinks(self, user):
+        """
+        Return the toolbar with the *quick links* for the given user.
+
+        If :attr:`cache_quicklinks` is `True`, this toolbar is built
+        only once per user type and language.
+        """
+        if not self.cache_quicklinks:
+            return self.build_quicklinks(user)
+        k = (user.user_type, get_language())
+        m = self._quicklinks_cache.get(k, None)
+        if m is None:
+            m = self.build_quicklinks(user)
+            self._quicklinks_cache[k] = m
+        return m
+
+    def build_quicklinks(self, user):
         from lino.core import menus
         m = menus.Toolbar(user.user_type, 'quicklinks')
         self.setup_quicklinks(user, m)
@@ -3370,6 +3552,45 @@ site. :manage:`diag` is a command-line shortcut to this.
     def get_site_menu(self, user_type):
         """
         Return this site's main menu for the given UserType.
+
+        The menu is built by :meth:`build_site_menu` only once per
+        user type and language and then cached until the next
+        :meth:`startup` or until the SiteConfig changes (see
+        :meth:`clear_menu_cache`).  The returned toolbar is shared
+        between all requests and is read-only: callers must not
+        modify it.  Use :meth:`build_site_menu` if you need a menu to
+        which you want to add items.
+        """
+        k = (user_type, get_language())
+        main = self._menu_cache.get(k, None)
+        if main is None:
+            main = self.build_site_menu(user_type)
+            self._menu_cache[k] = main
+        return main
+
+    def get_site_menu_html(self, ar, renderer=None):
+        """
+        Return the main menu for the user of the given action request,
+        rendered as an HTML string by the given renderer (default is
+        the renderer of the action request).
+
+        The result is cached per renderer, user type and language.
+        """
+        if renderer is None:
+            renderer = ar.renderer
+        user_type = ar.get_user().user_type
+        k = (renderer.__class__, user_type, get_language())
+        html = self._menu_html_cache.get(k, None)
+        if html is None:
+            from etgen.html import tostring
+            menu = self.get_site_menu(user_type)
+            html = tostring(renderer.show_menu(ar, menu))
+            self._menu_html_cache[k] = html
+        return html
+
+    def build_site_menu(self, user_type):
+        """
+        Build and return a new main menu for the given UserType.
         Must be a :class:`lino.core.menus.Toolbar` instance.
         Applications usually should not need to override this.
         """
@@ -38,6 +38,7 @@ import datetime
 
 from django.conf import settings
 from django.db import models
+from django.db.models import prefetch_related_objects
 from django.core import exceptions
 from django.utils.translation import ugettext_lazy as _
 from django.utils.encoding import force_text
@@ -908,6 +909,141 @@ def create_atomizer(holder, fld, name):
         return ComboStoreField(fld, name, **kw)
 
 
+def _func(m):
+    return getattr(m, '__func__', m)
+
+
+def is_plain_field(sf):
+    """Whether the value of the given store field is just the value of
+    its database field.
+
+    """
+    if getattr(sf.field, 'attname', None) is None:
+        return False
+    return _func(sf.full_value_from_object) is _func(
+        StoreField.full_value_from_object) and _func(
+            sf.value2list) is _func(StoreField.value2list) and _func(
+                sf.value2dict) is _func(StoreField.value2dict) and _func(
+                    sf.field.__class__.value_from_object) is _func(
+                        models.Field.value_from_object)
+
+
+def is_plain_fk(sf):
+    """Whether the given store field is a :class:`ForeignKeyStoreField`
+    which doesn't customize how its value and text are computed.
+
+    """
+    return isinstance(sf, ForeignKeyStoreField) and _func(
+        sf.full_value_from_object) is _func(
+            RelatedMixin.full_value_from_object) and _func(
+                sf.value2list) is _func(ComboStoreField.value2list) and _func(
+                    sf.value2dict) is _func(ComboStoreField.value2dict) and _func(
+                        sf.get_value_text) is _func(
+                            ForeignKeyStoreField.get_value_text)
+
+
+def compile_serializer(fields, as_dict=False):
+    """Return a function `serialize(ar, row, out, texts)` which calls
+    :meth:`value2list` (or :meth:`value2dict` if `as_dict` is True) for
+    every store field in `fields` and returns `out`.
+
+    Instead of calling the virtual methods of every store field for
+    every cell, the returned function uses a step which has been
+    chosen once per field: plain database fields are read directly
+    from the row, and the value and display text of plain foreign
+    keys are cached in the `dict` `texts`, which the caller can share
+    between the rows of a same response.
+
+    """
+    steps = []
+    for i, sf in enumerate(fields):
+        if is_plain_field(sf):
+            steps.append(_plain_step(sf, as_dict))
+        elif is_plain_fk(sf):
+            steps.append(_fk_step(i, sf, as_dict))
+        else:
+            steps.append(_dynamic_step(sf, as_dict))
+    steps = tuple(steps)
+
+    def serialize(ar, row, out, texts):
+        for step in steps:
+            step(ar, row, out, texts)
+        return out
+    return serialize
+
+
+def _plain_step(sf, as_dict):
+    attname = sf.field.attname
+    if as_dict:
+        name = str(sf.name)
+
+        def step(ar, row, d, texts):
+            d[name] = getattr(row, attname)
+    else:
+        def step(ar, row, l, texts):
+            l.append(getattr(row, attname))
+    return step
+
+
+def _fk_step(i, sf, as_dict):
+    attname = sf.field.attname
+
+    def get_value_text(ar, row, texts):
+        k = (i, getattr(row, attname, None))
+        vt = texts.get(k, None)
+        if vt is None:
+            vt = sf.get_value_text(ar, sf.full_value_from_object(row, ar), row)
+            if k[1] is not None:
+                texts[k] = vt
+        return vt
+
+    if as_dict:
+        name = str(sf.name)
+        hidden_name = str(sf.name + constants.CHOICES_HIDDEN_SUFFIX)
+
+        def step(ar, row, d, texts):
+            value, text = get_value_text(ar, row, texts)
+            d[name] = text
+            d[hidden_name] = value
+    else:
+        def step(ar, row, l, texts):
+            value, text = get_value_text(ar, row, texts)
+            l.append(text)
+            l.append(value)
+    return step
+
+
+def _dynamic_step(sf, as_dict):
+    get = sf.full_value_from_object
+    put = sf.value2dict if as_dict else sf.value2list
+
+    def step(ar, row, out, texts):
+        put(ar, get(row, ar), out, row)
+    return step
+
+
+def prefetch_foreign_keys(fields, rows):
+    """Load the objects pointed to by the plain foreign key fields among
+    the given store fields for all `rows` using one query per field.
+    Foreign keys which are already cached (e.g. because of
+    `select_related()`) are not loaded again.
+
+    """
+    if len(rows) < 2:
+        return
+    model = rows[0].__class__
+    if not issubclass(model, models.Model):
+        return
+    for row in rows:
+        if row.__class__ is not model:
+            return
+    names = [sf.field.name for sf in fields
+             if is_plain_fk(sf) and sf.field.name == sf.name
+             and issubclass(model, sf.field.model)]
+    if len(names):
+        prefetch_related_objects(rows, *names)
+
+
 class BaseStore(object):
     pass
 
@@ -993,6 +1129,8 @@ class Store(BaseStore):
 
         # temporary dict used by collect_fields and add_field_for
         self.df2sf = {}
+        self._serializers = {}
+        self._related_lookups = None
         self.all_fields = []
         self.list_fields = []
         self.detail_fields = []
@@ -1164,35 +1302,132 @@ class Store(BaseStore):
         # logger.info("20111214 column_names: %s",list(self.column_names()))
         return list(self.column_names()).index(name)
 
-    def row2list(self, ar, row):
-        # assert isinstance(ar, dbtables.AbstractTableRequest)
-        # if not isinstance(ar, dbtables.ListActionRequest):
-            # raise Exception()
+    def get_related_lookups(self):
+        """Return a tuple `(select, prefetch, only)` of lists of field
+        lookups for rendering the :attr:`list_fields` of this store:
+
+        - `select` : the forward relations to load using
+          `select_related()`, including the intermediate relations of
+          remote fields like ``partner__city__name``.
+
+        - `prefetch` : the many-to-many fields to load using
+          `prefetch_related()`.
+
+        - `only` : the names of the concrete fields of the model which
+          are needed by these columns.
+
+        The result is computed only once per store.
+
+        """
+        if self._related_lookups is None:
+            self._related_lookups = self.make_related_lookups()
+        return self._related_lookups
+
+    def make_related_lookups(self):
+        select = []
+        prefetch = []
+        only = []
+        model = self.actor.model
+        if not (isinstance(model, type) and issubclass(model, models.Model)):
+            return (select, prefetch, only)
+        only.append(model._meta.pk.name)
+        for sf in self.list_fields:
+            path = []
+            m = model
+            for name in sf.name.split('__'):
+                try:
+                    f = m._meta.get_field(name)
+                except exceptions.FieldDoesNotExist:
+                    break
+                if not f.concrete:
+                    break
+                if f.many_to_many:
+                    if not path and f.name not in prefetch:
+                        prefetch.append(f.name)
+                    break
+                if not path and f.name not in only:
+                    only.append(f.name)
+                if not (f.many_to_one or f.one_to_one):
+                    break
+                path.append(f.name)
+                m = f.remote_field.model
+            if path:
+                lookup = '__'.join(path)
+                if lookup not in select:
+                    select.append(lookup)
+        # select_related('a') is implied by select_related('a__b')
+        select = [x for x in select
+                  if not [y for y in select if y.startswith(x + '__')]]
+        wsf = getattr(self.actor, 'workflow_state_field', None)
+        if wsf is not None and wsf.name not in only:
+            only.append(wsf.name)
+        return (select, prefetch, only)
+
+    def get_serializer(self, fields, as_dict=False):
+        """Return the :func:`compiled serializer <compile_serializer>` for
+        the given sequence of store fields.  Serializers are compiled
+        only once per store and field set.
+
+        """
+        k = (tuple(fields), as_dict)
+        f = self._serializers.get(k, None)
+        if f is None:
+            f = compile_serializer(k[0], as_dict)
+            self._serializers[k] = f
+        return f
+
+    def row2list(self, ar, row, texts=None):
         # logger.info("20120107 Store %s row2list(%s)", self.report.model, dd.obj2str(row))
-        l = []
         if isinstance(row, PhantomRow):
+            l = []
             for fld in self.list_fields:
                 fld.value2list(ar, None, l, row)
-        else:
-            for fld in self.list_fields:
-                v = fld.full_value_from_object(row, ar)
-                fld.value2list(ar, v, l, row)
-        # logger.info("20130611 Store row2list() --> %r", l)
-        return l
+            return l
+        if texts is None:
+            texts = {}
+        return self.get_serializer(self.list_fields)(ar, row, [], texts)
+
+    def rows2list(self, ar, rows):
+        """Return a list with the result of :meth:`row2list` for each of
+        the given rows.
+
+        This first loads the objects pointed to by the foreign keys of
+        all rows at once, and then renders the display text of every
+        distinct foreign object only once.
+
+        """
+        rows = list(rows)
+        prefetch_foreign_keys(self.list_fields, rows)
+        texts = {}
+        return [self.row2list(ar, row, texts) for row in rows]
 
     def row2dict(self, ar, row, fields=None, **d):
-        # assert isinstance(ar,dbtables.AbstractTableRequest)
         # logger.info("20111209 Store.row2dict(%s)", dd.obj2str(row))
+        if fields is None:
+            fields = self.detail_fields
+        return self.get_serializer(fields, True)(ar, row, d, {})
+
+    def row2list_dynamic(self, ar, row):
+        """The non-compiled equivalent of :meth:`row2list`, used by
+        :manage:`benchstore`.
+
+        """
+        l = []
+        for fld in self.list_fields:
+            v = fld.full_value_from_object(row, ar)
+            fld.value2list(ar, v, l, row)
+        return l
+
+    def row2dict_dynamic(self, ar, row, fields=None, **d):
+        """The non-compiled equivalent of :meth:`row2dict`, used by
+        :manage:`benchstore`.
+
+        """
         if fields is None:
             fields = self.detail_fields
         for fld in fields:
-            # logger.info("20140429 Store.row2dict %s", fld)
             v = fld.full_value_from_object(row, ar)
             fld.value2dict(ar, v, d, row)
-            # logger.info("20140429 Store.row2dict %s -> %s", fld, v)
-        #     if "households_" in fld.name:
-        #         print("20181023 {}".format(fld))
-        # print("20181023 row2dict {}".format(fields))
         return d
 
     # def row2odt(self,request,fields,row,sums):
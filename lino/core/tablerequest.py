@@ -151,6 +151,23 @@ class TableRequest(ActionRequest):
     data_iterator = property(get_data_iterator_property)
     sliced_data_iterator = property(get_sliced_data_iterator_property)
 
+    def iter_data_rows(self, sliced=False, chunk_size=2000):
+        """Iterate over the rows of this request without caching them.
+
+        When the data iterator is a queryset, this uses a server-side
+        cursor which fetches the rows from the database in chunks of
+        `chunk_size`, so that the memory usage does not depend on
+        the number of rows.  Used for exporting large tables.
+
+        """
+        if sliced:
+            qs = self.sliced_data_iterator
+        else:
+            qs = self.data_iterator
+        if isinstance(qs, QuerySet):
+            return qs.iterator(chunk_size=chunk_size)
+        return iter(qs)
+
     def get_data_iterator(self):
         self.actor.check_params(self.param_values)
         if self.actor.get_data_rows is not None:
@@ -320,7 +337,10 @@ class TableRequest(ActionRequest):
             limit = rqdata.get(
                 constants.URL_PARAM_LIMIT, self.actor.preview_limit)
             if limit:
-                kw.update(limit=int(limit))
+                limit = int(limit)
+                # an explicit limit of 0 asks for all rows
+                if limit:
+                    kw.update(limit=limit)
         except ValueError:
             # Example: invalid literal for int() with base 10:
             # 'fdpkvcnrfdybhur'
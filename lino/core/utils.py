@@ -17,6 +17,7 @@ import datetime
 
 from django.db import models
 from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
 from django.db.models.fields import FieldDoesNotExist
 from django.utils.functional import lazy
 from importlib import import_module
@@ -156,6 +157,16 @@ def format_request(request):
 def model_class_path(model):
     return model.__module__ + '.' + model.__name__
 
+def is_overridden(cls, base, name):
+    """Return True if the method `name` of class `cls` is not the one
+    defined by `base` (of which `cls` is a subclass).
+
+    """
+    def func(m):
+        return getattr(m, '__func__', m)
+    return func(getattr(cls, name)) is not func(getattr(base, name))
+
+
 def full_model_name(model, sep='.'):
     """Returns the "full name" of the given model, e.g. "contacts.Person" etc.
     """
@@ -489,6 +500,123 @@ def resolve_field(name, app_label=None):
     # return UnresolvedField(name)
 
 
+def _keyset_ordering(qs):
+    """Return the ordering of the given queryset as a list of
+    `(fieldname, descending)` tuples which ends with the primary key,
+    or `None` if the ordering cannot be used for keyset navigation.
+
+    Keyset navigation is possible only when every ordering item is a
+    plain (possibly remote) field name pointing to a concrete
+    non-relational field.  Ordering by a relation would be translated
+    by Django to the ordering of the related model, and ordering by
+    expressions, annotations or random order cannot be expressed as
+    simple comparisons.
+
+    Keyset navigation is also not possible when an ordering field is
+    nullable or is reached through a nullable relation.  NULL values
+    don't compare, so the rows having them would be missing from the
+    comparisons, and their position in the ordering depends on the
+    database backend.
+
+    """
+    query = qs.query
+    if query.low_mark or query.high_mark is not None:
+        return None
+    if query.extra_order_by:
+        return None
+    if query.order_by:
+        ordering = query.order_by
+    elif query.default_ordering:
+        ordering = qs.model._meta.ordering
+    else:
+        ordering = []
+    pk = qs.model._meta.pk
+    rv = []
+    pk_seen = False
+    for item in ordering:
+        if not isinstance(item, six.string_types):
+            return None
+        if item == '?':
+            return None
+        desc = item.startswith('-')
+        name = item.lstrip('-+')
+        if name == 'pk':
+            name = pk.name
+        model = qs.model
+        fld = None
+        for part in name.split(LOOKUP_SEP):
+            if model is None:
+                return None
+            try:
+                fld = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                return None
+            if not fld.concrete or fld.many_to_many:
+                return None
+            if fld.null:
+                return None
+            model = fld.related_model if fld.is_relation else None
+        if fld.is_relation:
+            return None
+        if fld is pk and LOOKUP_SEP not in name:
+            pk_seen = True
+        rv.append((name, desc))
+        if pk_seen:
+            # everything after the primary key would be irrelevant
+            break
+    if not pk_seen:
+        rv.append((pk.name, False))
+    return rv
+
+
+def _keyset_filter(ordering, values, after):
+    """Return a :class:`Q` object which selects the rows that come
+    after (or before if `after` is False) the row whose ordering
+    values are given by `values`.
+
+    """
+    cond = None
+    eq = Q()
+    for (name, desc), value in zip(ordering, values):
+        op = 'lt' if desc == after else 'gt'
+        q = eq & Q(**{name + LOOKUP_SEP + op: value})
+        cond = q if cond is None else cond | q
+        eq &= Q(**{name: value})
+    return cond
+
+
+def _keyset_navinfo(qs, elem, ordering):
+    """The keyset implementation of :func:`navinfo`.  Returns `None`
+    when keyset navigation is not applicable to `elem`, in which case
+    the caller falls back to the list-based algorithm.
+
+    """
+    names = [name for name, desc in ordering]
+    values = qs.filter(pk=elem.pk).values_list(*names)[:1]
+    values = list(values)
+    if len(values) == 0:
+        # elem is not part of the queryset
+        return dict(first=None, prev=None, next=None, last=None,
+                    recno=0, LEN=0)
+    values = values[0]
+    asc = [('-' if desc else '') + name for name, desc in ordering]
+    rev = [('' if desc else '-') + name for name, desc in ordering]
+    before = qs.filter(_keyset_filter(ordering, values, False))
+    after = qs.filter(_keyset_filter(ordering, values, True))
+
+    def first_pk(qs, order_by):
+        for pk in qs.order_by(*order_by).values_list('pk', flat=True)[:1]:
+            return pk
+
+    prev = first_pk(before, rev)
+    next = first_pk(after, asc)
+    first = elem.pk if prev is None else first_pk(qs, asc)
+    last = elem.pk if next is None else first_pk(qs, rev)
+    recno = 1 if prev is None else before.count() + 1
+    return dict(first=first, prev=prev, next=next, last=last,
+                recno=recno, LEN=qs.count())
+
+
 def navinfo(qs, elem):
     """Return a dict with navigation information for the given model
     instance `elem` within the given queryset.  The dictionary
@@ -501,6 +629,13 @@ def navinfo(qs, elem):
     :last:    pk of the last element in qs (None if qs is empty)
     :message: text "Row x of y" or "No navigation"
 
+    When `qs` is a Django queryset whose ordering consists of plain
+    field names, the neighbours of `elem` are found using keyset
+    queries (``WHERE (order_key, pk) > (...) ORDER BY ... LIMIT 1``)
+    and the row number using a single ``COUNT``, so that the cost
+    does not depend on the size of the table.  Otherwise (for Python
+    lists or complex orderings) we load the list of all primary keys.
+
     """
     first = None
     prev = None
@@ -508,6 +643,20 @@ def navinfo(qs, elem):
     last = None
     recno = 0
     message = None
+    ni = None
+    if not isinstance(qs, (list, tuple)):
+        ordering = _keyset_ordering(qs)
+        if ordering is not None:
+            ni = _keyset_navinfo(qs, elem, ordering)
+    if ni is not None:
+        LEN = ni.pop('LEN')
+        if ni['recno']:
+            message = _("Row %(rowid)d of %(rowcount)d") % dict(
+                rowid=ni['recno'], rowcount=LEN)
+        else:
+            message = _("No navigation")
+        ni.update(message=message)
+        return ni
     #~ LEN = ar.get_total_count()
     if isinstance(qs, (list, tuple)):
         LEN = len(qs)
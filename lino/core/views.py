@@ -13,7 +13,7 @@ from django.core import exceptions
 
 from lino.core import constants
 from lino.core import actors
-from lino.utils.jsgen import py2js
+from lino.utils.jsgen import py2js, data2json
 
 
 def json_response_kw(**kw):
@@ -22,7 +22,7 @@ def json_response_kw(**kw):
 
 def json_response(x, content_type='application/json', status=200):
     if True:
-        s = py2js(x)
+        s = data2json(x)
     else:
         try:
             s = py2js(x)
@@ -39,6 +39,28 @@ Options:
     Don't complain if the TARGET directory already exists. This will
     potentially overwrite existing files.
 
+.. option:: --jobs <NUM>
+
+    Dump NUM models in parallel, each in a separate process with its
+    own database connection.
+
+.. option:: --reuse <BASE_DIR>
+
+    Don't store the files which are identical to those of the dump in
+    BASE_DIR.  The :xfile:`restore.py` of the new dump then loads
+    these files from BASE_DIR.  This saves disk space.
+
+    This is not an incremental dump and not a row-level delta.  The
+    unit of reuse is the file: when a single row of a model has
+    changed, all rows of that model (or of that part when the model
+    is split into several files) are written again.  The rows of
+    every model are still read from the database (except for models
+    with a :attr:`modified <lino.mixins.Modified.modified>`
+    timestamp when none of their rows changed since the base dump).
+    Rows are written ordered by primary key, so a file remains
+    identical as long as its rows don't change.  Every dump has a
+    :xfile:`manifest.json` file with the checksums of its files.
+
 .. option:: --max-row-count <NUM>
 
     Change the maximum number of rows per source file from its default
@@ -70,6 +92,22 @@ FILES
 
       $ python manage.py run mydump/restore.py
 
+    Add ``--bulk`` to restore large databases faster: rows are then
+    inserted using `bulk_create` in one transaction per batch.  Use
+    this only for dumps of a database which was valid when it was
+    dumped: a bulk restore doesn't call :meth:`full_clean` or
+    :meth:`save` on the objects, and it doesn't send the `pre_save`
+    and `post_save` signals (see
+    :attr:`lino.utils.dpy.LoaderBase.bulk`).  So application code
+    which runs in these methods or signal handlers doesn't run
+    during a bulk restore.
+
+.. xfile:: manifest.json
+
+    Describes the files of a dump created by :manage:`dump2py`: their
+    paths (relative to the dump directory), their SHA-256 checksum
+    and number of rows, and the time when the dump was started.
+
 SEE ALSO
 ========
 
@@ -85,24 +123,55 @@ import logging
 logger = logging.getLogger(__name__)
 
 import os
+import json
+import hashlib
+import multiprocessing
 from decimal import Decimal
 import argparse
 
 from clint.textui import progress
 
 from django.db import models
+from django.db import connections
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.db.utils import DatabaseError
 from django.utils.timezone import make_naive, is_aware, utc
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from lino.utils import puts
 from lino.core.utils import sorted_models_list, full_model_name
+from lino.core.utils import resolve_model
+from lino.mixins import Modified
 from lino.core.choicelists import ChoiceListField
 
 from lino.utils.mldbc.fields import BabelCharField, BabelTextField
 
 
+MANIFEST = 'manifest.json'
+
+
+def file_checksum(fn):
+    h = hashlib.sha256()
+    with open(fn, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_model_job(job):
+    # Runs in a worker process of the pool started by write_files().
+    model_name, output_dir, options, base_manifest = job
+    cmd = Command()
+    cmd.output_dir = output_dir
+    cmd.options = options
+    cmd.base_manifest = base_manifest
+    if base_manifest is not None:
+        cmd.base_dir = os.path.abspath(options['reuse'])
+    return cmd.write_model(resolve_model(model_name))
+
+
 def is_pointer_to_contenttype(f):
     if not settings.SITE.is_installed('contenttypes'):
         return False
@@ -201,6 +270,15 @@ class Command(BaseCommand):
         parser.add_argument('-m', '--max-row-count', type=int,
                             dest='max_row_count', default=50000,
                             help='Maximum number of rows per file.'),
+        parser.add_argument('-j', '--jobs', type=int,
+                            dest='jobs', default=1,
+                            help='Number of models to dump in parallel.'),
+        parser.add_argument('-r', '--reuse', dest='reuse',
+                            default=None, metavar='BASE_DIR',
+                            help="Don't store the files which are "
+                            "identical to those of the dump in BASE_DIR. "
+                            "This is not a row-level delta: a model "
+                            "having a changed row is dumped completely."),
 
     def write_files(self):
         puts("Writing {0}...".format(self.main_file))
@@ -300,7 +378,7 @@ def bv2kw(fieldname, values):
         self.stream.write("""
 
 def main(args):
-    loader = DpyLoader(globals(), quick=args.quick)
+    loader = DpyLoader(globals(), quick=args.quick, bulk=args.bulk)
     from django.core.management import call_command
     call_command('initdb', interactive=args.interactive)
     os.chdir(os.path.dirname(__file__))
@@ -309,72 +387,37 @@ def main(args):
 
 """)
 
-        max_row_count = self.options['max_row_count']
-        for model in progress.bar(self.models):
+        jobs = self.options['jobs']
+        if jobs > 1:
+            options = dict([(k, self.options[k]) for k in (
+                'tolerate', 'max_row_count', 'reuse')])
+            todo = [(full_model_name(m), self.output_dir, options,
+                     self.base_manifest) for m in self.models]
+            # the worker processes must not share our connection
+            connections.close_all()
+            pool = multiprocessing.Pool(jobs)
             try:
-                qs = model.objects.all()
-                total_count = qs.count()
-            except DatabaseError as e:
+                results = pool.map(_write_model_job, todo)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [self.write_model(m)
+                       for m in progress.bar(self.models)]
+
+        for model, res in zip(self.models, results):
+            if res['error'] is not None:
                 self.database_errors += 1
-                if not self.options['tolerate']:
-                    raise
                 self.stream.write('\n')
-                logger.warning("Tolerating database error %s in %s",
-                               e, model._meta.db_table)
                 msg = ("The data of table {0} has not been dumped"
                        "because an error {1} occured.").format(
-                           model._meta.db_table, e)
+                           model._meta.db_table, res['error'])
                 self.stream.write('raise Exception("{0}")\n'.format(msg))
                 continue
-
-            fields = [f for f in model._meta.get_fields()
-                      if f.concrete and f.model is model]
-            fields = [
-                f for f in fields
-                if not getattr(f, '_lino_babel_field', False)]
-
-            chunks = []  # list of tuples (i, filename, queryset)
-            if total_count > max_row_count:
-                num_files = (total_count // max_row_count) + 1
-                for i in range(num_files):
-                    o1 = max_row_count * i
-                    o2 = max_row_count * (i+1)
-                    t = (i+1,
-                         '%s_%d.py' % (model._meta.db_table, i+1),
-                         qs[o1:o2])
-                    chunks.append(t)
-            else:
-                chunks.append((1, '%s.py' % model._meta.db_table, qs))
-            for i, filename, qs in chunks:
-                self.stream.write('    execfile("%s", *args)\n' % filename)
-                filename = os.path.join(self.output_dir, filename)
-                # puts("Writing {0}...".format(filename))
-                # stream = file(filename, 'wt')
-                stream = open(filename, 'wt')
-                stream.write('# -*- coding: UTF-8 -*-\n')
-                txt = "%d objects" % total_count
-                if len(chunks) > 1:
-                    txt += " (part %d of %d)" % (i, len(chunks))
-                stream.write(
-                    'logger.info("Loading %s to table %s...")\n' % (
-                        txt, model._meta.db_table))
-
-                stream.write(
-                    "# fields: %s\n" % ', '.join(
-                        [f.name for f in fields]))
-                for obj in qs:
-                    self.count_objects += 1
-                    #~ used_models.add(model)
-                    stream.write('loader.save(create_%s(%s))\n' % (
-                        obj._meta.db_table,
-                        ','.join([self.value2string(obj, f) for f in fields])))
-                stream.write('\n')
-                if i == len(chunks):
-                    stream.write('loader.flush_deferred_objects()\n')
-
-                stream.close()
-
-            #~ self.stream.write('\nfilename = os.path.join(os.path.dirname(__file__),"%s.py")\n' % )
+            self.count_objects += res['rows']
+            for f in res['files']:
+                self.stream.write('    execfile("%s", *args)\n' % f['path'])
+            self.manifest['models'][full_model_name(model)] = res
 
         self.stream.write(
             '    loader.finalize()\n')
@@ -396,6 +439,11 @@ if __name__ == '__main__':
     parser.add_argument('--quick', dest='quick', 
         action='store_true',default=False,
         help='Do not call full_clean() on restored instances.')
+    parser.add_argument('--bulk', dest='bulk',
+        action='store_true',default=False,
+        help='Insert rows in bulk, one transaction per batch, '
+        'without calling full_clean() or save() and without sending '
+        'the pre_save and post_save signals.')
 
     args = parser.parse_args()
     main(args)
@@ -403,6 +451,115 @@ if __name__ == '__main__':
         #~ self.stream.write('\nsettings.SITE.load_from_file(globals())\n')
         self.stream.close()
 
+    def write_model(self, model):
+        """Write the file(s) for the given model and return a `dict` with
+        the manifest entry of this model.
+
+        When reusing a base dump (i.e. there is a :attr:`base_manifest`),
+        files which are identical to those of the base dump are not
+        written again.  Their entry in the manifest then points to
+        the file of the base dump.  For models having a
+        :attr:`modified <lino.mixins.Modified.modified>` timestamp we
+        don't even need to read the rows when no row has been
+        modified since the base dump and the number of rows didn't
+        change.
+
+        """
+        res = dict(rows=0, files=[], error=None)
+        try:
+            # order by primary key so that the files of two dumps are
+            # identical when their rows are
+            qs = model.objects.order_by('pk')
+            total_count = qs.count()
+        except DatabaseError as e:
+            if not self.options['tolerate']:
+                raise
+            logger.warning("Tolerating database error %s in %s",
+                           e, model._meta.db_table)
+            res.update(error=str(e))
+            return res
+        res.update(rows=total_count)
+
+        base = None
+        if self.base_manifest is not None:
+            base = self.base_manifest['models'].get(
+                full_model_name(model), None)
+            if base is not None and base['error'] is None:
+                base_files = dict([(f['name'], f) for f in base['files']])
+                if base['rows'] == total_count and issubclass(
+                        model, Modified) and not qs.filter(
+                            modified__gte=self.base_manifest['started']
+                        ).exists():
+                    res.update(files=[self.reuse_file(f)
+                                      for f in base['files']])
+                    return res
+            else:
+                base_files = dict()
+
+        fields = [f for f in model._meta.get_fields()
+                  if f.concrete and f.model is model]
+        fields = [
+            f for f in fields
+            if not getattr(f, '_lino_babel_field', False)]
+
+        max_row_count = self.options['max_row_count']
+        chunks = []  # list of tuples (i, filename, queryset)
+        if total_count > max_row_count:
+            num_files = (total_count // max_row_count) + 1
+            for i in range(num_files):
+                o1 = max_row_count * i
+                o2 = max_row_count * (i+1)
+                t = (i+1,
+                     '%s_%d.py' % (model._meta.db_table, i+1),
+                     qs[o1:o2])
+                chunks.append(t)
+        else:
+            chunks.append((1, '%s.py' % model._meta.db_table, qs))
+        for i, filename, qs in chunks:
+            path = os.path.join(self.output_dir, filename)
+            # puts("Writing {0}...".format(filename))
+            # stream = file(filename, 'wt')
+            stream = open(path, 'wt')
+            stream.write('# -*- coding: UTF-8 -*-\n')
+            txt = "%d objects" % total_count
+            if len(chunks) > 1:
+                txt += " (part %d of %d)" % (i, len(chunks))
+            stream.write(
+                'logger.info("Loading %s to table %s...")\n' % (
+                    txt, model._meta.db_table))
+
+            stream.write(
+                "# fields: %s\n" % ', '.join(
+                    [f.name for f in fields]))
+            for obj in qs:
+                #~ used_models.add(model)
+                stream.write('loader.save(create_%s(%s))\n' % (
+                    obj._meta.db_table,
+                    ','.join([self.value2string(obj, f) for f in fields])))
+            stream.write('\n')
+            if i == len(chunks):
+                stream.write('loader.flush_deferred_objects()\n')
+
+            stream.close()
+            f = dict(name=filename, path=filename, sha256=file_checksum(path))
+            if base is not None:
+                bf = base_files.get(filename, None)
+                if bf is not None and bf['sha256'] == f['sha256']:
+                    os.remove(path)
+                    f = self.reuse_file(bf)
+            res['files'].append(f)
+        return res
+
+    def reuse_file(self, f):
+        """Return a manifest entry for the given file entry of the base
+        dump.
+
+        """
+        f = dict(f)
+        path = os.path.join(self.base_dir, f['path'])
+        f.update(path=os.path.relpath(path, self.output_dir))
+        return f
+
     def sort_models(self, unsorted):
         sorted = []
         hope = True
@@ -499,6 +656,22 @@ if __name__ == '__main__':
             return str(value)
         return repr(field.value_to_string(obj))
 
+    def load_base_manifest(self):
+        self.base_manifest = None
+        self.base_dir = None
+        base = self.options['reuse']
+        if base is None:
+            return
+        self.base_dir = os.path.abspath(base)
+        fn = os.path.join(self.base_dir, MANIFEST)
+        if not os.path.exists(fn):
+            raise CommandError(
+                "Cannot reuse base dump: {} doesn't exist".format(fn))
+        with open(fn, 'rt') as f:
+            self.base_manifest = json.load(f)
+        self.base_manifest['started'] = parse_datetime(
+            self.base_manifest['started'])
+
     def handle(self, *args, **options):
         # if len(args) != 1:
         #     raise CommandError("No output_dir specified.")
@@ -524,9 +697,18 @@ if __name__ == '__main__':
             os.makedirs(self.output_dir)
 
         self.options = options
+        self.load_base_manifest()
+        self.manifest = dict(
+            started=timezone.now().isoformat(),
+            base=None, models=dict())
+        if self.base_manifest is not None:
+            self.manifest.update(
+                base=os.path.relpath(self.base_dir, self.output_dir))
 
         #~ logger.info("Running %s to %s.", self, self.output_dir)
         self.write_files()
+        with open(os.path.join(self.output_dir, MANIFEST), 'wt') as f:
+            f.write(str(json.dumps(self.manifest, indent=2)))
         logger.info("Wrote %s objects to %s and siblings." % (
             self.count_objects, self.main_file))
         if self.database_errors:
@@ -181,8 +181,18 @@ class About(EmptyTable):
 
     @dd.displayfield(_("Server status"))
     def server_status(cls, obj, ar):
-        return rt.html_text(
-            E.p(_("%s pending threads") %
-                len(settings.SITE.kernel.pending_threads)))
+        stats = settings.SITE.kernel.callback_store.get_stats()
+        if stats['pending'] is None:
+            msg = _("{stored} stored, {answered} answered, "
+                    "{expired} expired callbacks")
+        else:
+            msg = _("{pending} pending threads, {expired} expired")
+        items = [E.p(msg.format(**stats))]
+        if settings.SITE.is_installed('printing'):
+            from lino.modlib.printing.cache import stats
+            msg = _("Print cache: {hits} hits, {misses} misses, "
+                    "{stale} stale, {evicted} evicted files")
+            items.append(E.p(msg.format(**stats)))
+        return rt.html_text(E.div(*items))
 
 
@@ -0,0 +1,29 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Adds management commands for measuring the performance of some
+parts of Lino.  These are meant for developers.  Don't install this
+plugin on a production site.
+
+To use it, add the following line to the
+:meth:`get_installed_apps <lino.core.site.Site.get_installed_apps>`
+of your development site::
+
+    yield 'lino.modlib.bench'
+
+.. autosummary::
+   :toctree:
+
+    management.commands.benchstore
+    management.commands.benchjson
+
+"""
+
+from lino.api import ad, _
+
+
+class Plugin(ad.Plugin):
+    "See :doc:`/dev/plugins`."
+
+    verbose_name = _("Benchmarks")
@@ -0,0 +1,74 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+""".. management_command:: benchjson
+
+Measure the time needed to encode the JSON response of a paginated
+list request on a specified table, once using
+:func:`lino.utils.jsgen.py2js` and once using
+:func:`lino.utils.jsgen.data2json`.
+
+The payload is built like in :class:`ApiList
+<lino.modlib.extjs.views.ApiList>` and read from the database only
+once, so this measures only the encoding.
+
+This command is available only when :mod:`lino.modlib.bench` is
+installed.
+
+"""
+
+from __future__ import print_function
+
+import json
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lino.utils.jsgen import py2js, data2json
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('-u', '--username', action='store',
+                            dest='username', default=None,
+                            help='The username to act as. Default is `None`.')
+        parser.add_argument('-n', '--rows', action='store', type=int,
+                            dest='rows', default=1000,
+                            help="Maximum number of rows to encode.")
+        parser.add_argument('-r', '--repeat', action='store', type=int,
+                            dest='repeat', default=5,
+                            help="How many times to repeat each test.")
+        parser.add_argument('action_spec',
+                            help='The table to encode.')
+        parser.description = "Benchmark the JSON encoding of table rows."
+
+    def handle(self, *args, **options):
+        ses = settings.SITE.login(options['username'])
+        ar = ses.spawn(options['action_spec'], limit=options['rows'])
+        ar.renderer = settings.SITE.kernel.extjs_renderer
+        store = ar.ah.store
+        rows = store.rows2list(ar, ar.sliced_data_iterator)
+        payload = dict(count=ar.get_total_count(),
+                       rows=rows,
+                       success=True,
+                       no_data_text=ar.no_data_text,
+                       title=str(ar.get_title()))
+
+        # check that both encoders give the same data
+        if json.loads(py2js(payload)) != json.loads(data2json(payload)):
+            print("Warning: py2js() and data2json() give different results")
+
+        print("{} rows of {} ({} cells), best of {}:".format(
+            len(rows), ar.actor, sum([len(r) for r in rows]),
+            options['repeat']))
+        results = []
+        for name, func in (("py2js", py2js), ("data2json", data2json)):
+            t = min(timeit.repeat(
+                lambda: func(payload), number=1, repeat=options['repeat']))
+            results.append(t)
+            print("{:<20} {:>10.3f} ms".format(name, t * 1000))
+        if results[1]:
+            print("speedup: {:.1f}x".format(results[0] / results[1]))
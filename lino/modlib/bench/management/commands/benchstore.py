@@ -0,0 +1,74 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+""".. management_command:: benchstore
+
+Measure the time needed to serialize the rows of a specified table,
+once using the compiled serializers of its store
+(:meth:`lino.core.store.Store.row2list` and
+:meth:`lino.core.store.Store.rows2list`), and once using the dynamic
+way (:meth:`lino.core.store.Store.row2list_dynamic`).
+
+Both paths are run on the same list of rows, which is read from the
+database only once.  Except for :meth:`rows2list`, this measures
+only the serialization, not the database queries.
+
+This command is available only when :mod:`lino.modlib.bench` is
+installed.
+
+"""
+
+from __future__ import print_function
+
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('-u', '--username', action='store',
+                            dest='username', default=None,
+                            help='The username to act as. Default is `None`.')
+        parser.add_argument('-n', '--rows', action='store', type=int,
+                            dest='rows', default=1000,
+                            help="Maximum number of rows to serialize.")
+        parser.add_argument('-r', '--repeat', action='store', type=int,
+                            dest='repeat', default=5,
+                            help="How many times to repeat each test.")
+        parser.add_argument('action_spec',
+                            help='The table to serialize.')
+        parser.description = "Benchmark the serialization of table rows."
+
+    def handle(self, *args, **options):
+        ses = settings.SITE.login(options['username'])
+        ar = ses.spawn(options['action_spec'], limit=options['rows'])
+        store = ar.ah.store
+        rows = list(ar.sliced_data_iterator)
+        fields = store.detail_fields
+
+        tests = [
+            ("row2list_dynamic", lambda: [
+                store.row2list_dynamic(ar, row) for row in rows]),
+            ("row2list", lambda: [
+                store.row2list(ar, row) for row in rows]),
+            ("rows2list", lambda: store.rows2list(ar, rows)),
+            ("row2dict_dynamic", lambda: [
+                store.row2dict_dynamic(ar, row, fields) for row in rows]),
+            ("row2dict", lambda: [
+                store.row2dict(ar, row, fields) for row in rows]),
+        ]
+        # check that both paths give the same result
+        diffs = [row for row in rows
+                 if store.row2list(ar, row) != store.row2list_dynamic(ar, row)]
+        if diffs:
+            print("Warning: {} rows differ, e.g. {}".format(
+                len(diffs), diffs[0]))
+        print("{} rows of {}, best of {}:".format(
+            len(rows), ar.actor, options['repeat']))
+        for name, func in tests:
+            t = min(timeit.repeat(func, number=1, repeat=options['repeat']))
+            print("{:<20} {:>10.3f} ms".format(name, t * 1000))
@@ -65,6 +65,18 @@ class Plugin(ad.Plugin):
         <lino.core.site.Site.is_demo_site>` set to `True`) where it is
         ``"'robin'``.
 
+    .. attribute:: full_check_weekday
+
+        The day of the week (0 for Monday, 6 for Sunday) on which the
+        daily :func:`checkdata <lino.modlib.checkdata.models.checkdata>`
+        job checks all rows.  On the other days it checks only the
+        rows which changed since the last run.  Set this to `None` if
+        you want every daily run to check all rows.
+
+        A full run is needed from time to time because rows changed
+        by other means than the web interface don't always get
+        noticed, and because some checkers look at several rows.
+
     """
     verbose_name = _("Checkdata")
     needs_plugins = ['lino.modlib.users', 'lino.modlib.gfks']
@@ -72,6 +84,7 @@ class Plugin(ad.Plugin):
     # plugin settings
     responsible_user = None  # the username (a string)
     _responsible_user = None  # the cached User object
+    full_check_weekday = 6
 
     def get_responsible_user(self, checker, obj):
         if self.responsible_user is None:
@@ -106,6 +119,7 @@ class Plugin(ad.Plugin):
         m = m.add_menu(g.app_label, g.verbose_name)
         m.add_action('checkdata.Checkers')
         m.add_action('checkdata.AllProblems')
+        m.add_action('checkdata.Checkpoints')
         # m.add_action('checkdata.Severities')
         # m.add_action('checkdata.Feedbacks')
 
@@ -108,15 +108,33 @@ class Checker(dd.Choice):
         any existing objects.
 
         """
-        Problem = rt.models.checkdata.Problem
         if delete:
+            Problem = rt.models.checkdata.Problem
             gfk = Problem.owner
             qs = Problem.objects.filter(**gfk2lookup(gfk, obj, checker=self))
             qs.delete()
 
+        todo, done, prb = self.make_problem(
+            obj, self.get_checkdata_problems(obj, fix), fix)
+        if prb is not None:
+            prb.full_clean()
+            prb.save()
+        return (todo, done)
+
+    def make_problem(self, obj, problems, fix=False):
+        """Convert the given series of `(fixable, message)` tuples into
+        an unsaved :class:`Problem
+        <lino.modlib.checkdata.models.Problem>` instance.
+
+        Return a tuple `(todo, done, prb)` where `todo` and `done` are
+        the lists of messages and `prb` is `None` when there is
+        nothing left to do.
+
+        """
+        Problem = rt.models.checkdata.Problem
         done = []
         todo = []
-        for fixable, msg in self.get_checkdata_problems(obj, fix):
+        for fixable, msg in problems:
             if fixable:
                 # attn: do not yet translate
                 # msg = string_concat(u"(\u2605) ", msg)
@@ -125,19 +143,36 @@ class Checker(dd.Choice):
                 done.append(msg)
             else:
                 todo.append(msg)
-        if len(todo):
-            # dd.logger.info("%s : %s", obj, todo)
-            user = self.get_responsible_user(obj)
-            if user is None:
-                lang = dd.get_default_language()
-            else:
-                lang = user.language
-            with translation.override(lang):
-                msg = '\n'.join([str(s) for s in todo])
-            prb = Problem(owner=obj, message=msg, checker=self, user=user)
-            prb.full_clean()
-            prb.save()
-        return (todo, done)
+        if len(todo) == 0:
+            return (todo, done, None)
+        # dd.logger.info("%s : %s", obj, todo)
+        user = self.get_responsible_user(obj)
+        if user is None:
+            lang = dd.get_default_language()
+        else:
+            lang = user.language
+        with translation.override(lang):
+            msg = '\n'.join([str(s) for s in todo])
+        prb = Problem(owner=obj, message=msg, checker=self, user=user)
+        return (todo, done, prb)
+
+    def get_queryset_problems(self, qs, fix=False):
+        """Optional batch API used by the bulk engine of :manage:`checkdata`.
+
+        Checkers which can detect their problems more efficiently
+        on a whole queryset (e.g. using aggregates or a few joined
+        queries) may override this to yield a series of `(obj,
+        problems)` tuples, where `problems` is a list of `(fixable,
+        message)` tuples as returned by
+        :meth:`get_checkdata_problems`.  Objects without problems
+        need not be yielded.
+
+        The default implementation returns `None`, which means that
+        the engine will call :meth:`get_checkdata_problems` on every
+        object.
+
+        """
+        return None
 
     def get_checkdata_problems(self, obj, fix=False):
         """Return or yield a series of `(fixable, message)` tuples, each
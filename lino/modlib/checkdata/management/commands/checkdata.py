@@ -39,6 +39,13 @@ class Command(BaseCommand):
     the form `app_label.ModelName`, and only these models are being
     updated.
 
+    Rows are read in chunks and problems are written in bulk, one
+    transaction per model.  Use `--jobs` to check several models in
+    parallel.
+
+    Only the rows which changed since the last run are checked,
+    unless `--full` is given.
+
     """
 
     def add_arguments(self, parser):
@@ -51,6 +58,19 @@ class Command(BaseCommand):
             '-f', '--fix', action='store_true', dest='fix',
             default=False,
             help="Fix any repairable problems.")
+        parser.add_argument(
+            '--full', action='store_true', dest='full',
+            default=False,
+            help="Check all rows, including those which didn't "
+            "change since the last run.")
+        parser.add_argument(
+            '-j', '--jobs', action='store', dest='jobs', type=int,
+            default=1,
+            help="Number of worker processes to run in parallel.")
+        parser.add_argument(
+            '--chunk-size', action='store', dest='chunk_size', type=int,
+            default=1000,
+            help="Number of rows to fetch and write at once.")
 
     def handle(self, *args, **options):
         app = options.get('checkers', args)
@@ -60,4 +80,7 @@ class Command(BaseCommand):
             rt.show(Checkers, column_names="value text")
         else:
             rt.startup()
-            check_data(args=args, fix=options['fix'])
+            check_data(args=args, fix=options['fix'],
+                       jobs=options['jobs'],
+                       chunk_size=options['chunk_size'],
+                       full=options['full'])
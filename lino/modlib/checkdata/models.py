@@ -13,14 +13,20 @@ import six
 from builtins import object
 from builtins import str
 from collections import OrderedDict
+import multiprocessing
+import time
 
 from django.db import models
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
 from django.utils import translation
 
 from lino.core.gfks import gfk2lookup
 from lino.modlib.gfks.mixins import Controllable
 from lino.modlib.users.mixins import UserAuthored
 from lino.core.roles import SiteStaff
+from lino.mixins import Modified
 
 from lino.api import dd, rt, _
 
@@ -270,6 +276,66 @@ class MyProblems(Problems):
             yield ar.href_to_request(sar, msg)
 
 
+class Checkpoint(dd.Model):
+    """The high-water mark of a given checker on a given model.
+
+    This is used by the incremental mode of :manage:`checkdata`,
+    which checks only the rows that have changed since the last run.
+
+    .. attribute:: checker
+    .. attribute:: owner_type
+
+       The checked model.
+
+    .. attribute:: last_run
+
+       The time when the last run of this checker on this model
+       started.
+
+    """
+    class Meta(object):
+        app_label = 'checkdata'
+        verbose_name = _("Checkpoint")
+        verbose_name_plural = _("Checkpoints")
+        unique_together = ['checker', 'owner_type']
+
+    allow_merge_action = False
+
+    checker = Checkers.field(verbose_name=_("Checker"))
+    owner_type = dd.ForeignKey(
+        'contenttypes.ContentType', verbose_name=_("Model"))
+    last_run = models.DateTimeField(_("Last run"))
+
+
+class ChangedRow(dd.Model):
+    """A database row which has been created or modified via the user
+    interface since the last run of :manage:`checkdata`.
+
+    Used by the incremental mode for models which don't have a
+    reliable :attr:`modified <lino.mixins.Modified.modified>`
+    timestamp.  Only models with an integer primary key are tracked
+    here (see :func:`has_integer_pk`).
+
+    """
+    class Meta(object):
+        app_label = 'checkdata'
+        verbose_name = _("Changed row")
+        verbose_name_plural = _("Changed rows")
+
+    allow_merge_action = False
+
+    owner_type = dd.ForeignKey('contenttypes.ContentType')
+    owner_id = models.PositiveIntegerField()
+    time = models.DateTimeField()
+
+
+class Checkpoints(dd.Table):
+    model = 'checkdata.Checkpoint'
+    required_roles = dd.login_required(SiteStaff)
+    column_names = "checker owner_type last_run *"
+    editable = False
+
+
 @dd.receiver(dd.pre_analyze)
 def set_checkdata_actions(sender, **kw):
     """Installs the :class:`UpdateProblemsByController` action on every
@@ -288,6 +354,63 @@ def set_checkdata_actions(sender, **kw):
                 icon_name = 'bell', combo_group = "checkdata"))
 
 
+def has_timestamps(m):
+    """Whether the incremental mode can use the :attr:`modified
+    <lino.mixins.Modified.modified>` field for finding the changed
+    rows of model `m`.
+
+    """
+    return issubclass(m, Modified) and m.auto_touch
+
+
+def has_integer_pk(m):
+    """Whether the primary key of model `m` can be stored in the
+    :attr:`owner_id <ChangedRow.owner_id>` of a :class:`ChangedRow`.
+
+    """
+    return isinstance(m._meta.pk, (models.AutoField, models.IntegerField))
+
+
+def can_check_incrementally(m):
+    """Whether the incremental mode can find the changed rows of model
+    `m`.  Models which have neither a :attr:`modified
+    <lino.mixins.Modified.modified>` timestamp nor an integer primary
+    key are always checked completely.
+
+    """
+    return has_timestamps(m) or has_integer_pk(m)
+
+
+_tracked_models = None
+
+def note_changed_row(obj):
+    """Remember that the given database object has changed, so that the
+    next incremental run of :manage:`checkdata` will check it.
+
+    """
+    global _tracked_models
+    if _tracked_models is None:
+        _tracked_models = set([
+            m for m in get_checkable_models()
+            if not has_timestamps(m) and has_integer_pk(m)])
+    m = obj.__class__
+    if m not in _tracked_models:
+        return
+    ct = rt.models.contenttypes.ContentType.objects.get_for_model(m)
+    ChangedRow.objects.create(
+        owner_type=ct, owner_id=obj.pk, time=timezone.now())
+
+
+@dd.receiver(dd.on_ui_created)
+def on_checkable_created(sender=None, **kw):
+    note_changed_row(sender)
+
+
+@dd.receiver(dd.on_ui_updated)
+def on_checkable_updated(sender=None, watcher=None, **kw):
+    note_changed_row(watcher.watched)
+
+
 def get_checkers_for(model):
     return get_checkable_models()[model]
 
@@ -321,43 +444,189 @@ def get_checkable_models(*args):
     return checkable_models
 
 
-def check_data(args=[], fix=True):
-    """Called by :manage:`checkdata`. See there."""
+def check_model(m, checkers, fix=True, chunk_size=1000, full=True):
+    """Run the given checkers on the rows of model `m` using bulk
+    operations.
+
+    Rows are streamed from the database in chunks of `chunk_size`.
+    The problems are written using `bulk_create` without validation,
+    all within a single transaction.  Messages which are too long are
+    truncated, and a warning is logged.  Checkers having a
+    :meth:`get_queryset_problems
+    <lino.modlib.checkdata.choicelists.Checker.get_queryset_problems>`
+    batch API get the whole queryset, the others are called on every
+    row.
+
+    When `full` is False, check only the rows which changed since the
+    last run (see :class:`Checkpoint`).  Changed rows are detected
+    using their :attr:`modified <lino.mixins.Modified.modified>`
+    timestamp or the :class:`ChangedRow` entries written when they
+    were saved via the user interface.  This falls back to a full
+    check when some checker has not yet been run on this model, and
+    for models which cannot be checked incrementally (see
+    :func:`can_check_incrementally`).
+
+    Return a tuple `(name, rows, skipped, found, fixed, seconds)`.
+
+    """
     Problem = rt.models.checkdata.Problem
+    max_length = Problem._meta.get_field('message').max_length
+    t0 = time.time()
+    started = timezone.now()
+    name = str(m._meta.verbose_name_plural)
+    sums = [0, 0]
+    rows = 0
+    buffer = []
+
+    def collect(chk, obj, problems):
+        todo, done, prb = chk.make_problem(obj, problems, fix)
+        sums[0] += len(todo)
+        sums[1] += len(done)
+        if prb is not None:
+            if len(prb.message) > max_length:
+                # bulk_create() doesn't validate, and check_instance()
+                # would have failed
+                dd.logger.warning(
+                    "Truncated data problem message for %s (%s) : %s",
+                    obj, chk, prb.message)
+                prb.message = prb.message[:max_length]
+            buffer.append(prb)
+            if len(buffer) >= chunk_size:
+                Problem.objects.bulk_create(buffer)
+                del buffer[:]
+
+    with transaction.atomic():
+        ct = rt.models.contenttypes.ContentType.objects.get_for_model(m)
+        qs = m.objects.all()
+        total = None
+        problems = Problem.objects.filter(
+            owner_type=ct, checker__in=checkers)
+        changed = ChangedRow.objects.filter(owner_type=ct, time__lt=started)
+        since = None
+        if not full and can_check_incrementally(m):
+            marks = Checkpoint.objects.filter(
+                owner_type=ct, checker__in=checkers)
+            marks = [cp.last_run for cp in marks]
+            if len(marks) == len(checkers):
+                since = min(marks)
+        if since is None:
+            problems.delete()
+        else:
+            total = qs.count()
+            # problems of rows which have been deleted meanwhile
+            problems.exclude(owner_id__in=qs.values('pk')).delete()
+            flt = Q(pk__in=changed.values('owner_id'))
+            if has_timestamps(m):
+                flt |= Q(modified__gte=since)
+            qs = qs.filter(flt)
+            problems.filter(owner_id__in=qs.values('pk')).delete()
+        row_checkers = []
+        for chk in checkers:
+            lst = chk.get_queryset_problems(qs, fix)
+            if lst is None:
+                row_checkers.append(chk)
+            else:
+                for obj, prbs in lst:
+                    collect(chk, obj, prbs)
+        if len(row_checkers):
+            for obj in qs.iterator(chunk_size=chunk_size):
+                rows += 1
+                for chk in row_checkers:
+                    collect(chk, obj, chk.get_checkdata_problems(obj, fix))
+        else:
+            rows = qs.count()
+        if len(buffer):
+            Problem.objects.bulk_create(buffer)
+        if set(checkers) >= set(get_checkers_for(m)):
+            # when some checkers didn't run, they must see these rows
+            # in their next incremental run
+            changed.delete()
+        for chk in checkers:
+            Checkpoint.objects.update_or_create(
+                owner_type=ct, checker=chk,
+                defaults=dict(last_run=started))
+    if total is None:
+        skipped = 0
+    else:
+        skipped = total - rows
+    return (name, rows, skipped, sums[0], sums[1], time.time() - t0)
+
+
+def _check_model_job(job):
+    # Runs in a worker process of the pool started by check_data().
+    model_name, checker_values, fix, chunk_size, full = job
+    m = dd.resolve_model(model_name, strict=True)
+    checkers = [Checkers.get_by_value(v) for v in checker_values]
+    with translation.override('en'):
+        return check_model(m, checkers, fix, chunk_size, full)
+
+
+def check_data(args=[], fix=True, jobs=1, chunk_size=1000, full=True):
+    """Called by :manage:`checkdata`. See there.
+
+    When `jobs` is more than 1, the models are distributed to a pool
+    of that many worker processes, each of which uses its own
+    database connection.
+
+    When `full` is False, check only the rows which have changed
+    since the last run (see :func:`check_model`).
+
+    """
     mc = get_checkable_models(*args)
     if len(mc) == 0 and len(args) > 0:
         raise Exception("No checker matches {0}".format(args))
     final_sums = [0, 0, 0]
-    with translation.override('en'):
-        for m, checkers in mc.items():
-            ct = rt.models.contenttypes.ContentType.objects.get_for_model(m)
-            Problem.objects.filter(owner_type=ct).delete()
-            name = str(m._meta.verbose_name_plural)
-            qs = m.objects.all()
-            msg = "Running {0} data checkers on {1} {2}...".format(
-                len(checkers), qs.count(), name)
-            dd.logger.debug(msg)
-            sums = [0, 0, name]
-            for obj in qs:
-                for chk in checkers:
-                    todo, done = chk.update_problems(obj, False, fix)
-                    sums[0] += len(todo)
-                    sums[1] += len(done)
-            if sums[0] or sums[1]:
-                msg = "Found {0} and fixed {1} data problems in {2}."
-                dd.logger.info(msg.format(*sums))
-            else:
-                dd.logger.debug(
-                    "No data problems found in {0}.".format(name))
-            final_sums[0] += 1
-            final_sums[1] += sums[0]
-            final_sums[2] += sums[1]
+
+    if jobs > 1:
+        todo = [(str(m._meta.label), [chk.value for chk in checkers],
+                 fix, chunk_size, full) for m, checkers in mc.items()]
+        # the worker processes must not share our connection
+        connections.close_all()
+        pool = multiprocessing.Pool(jobs)
+        try:
+            results = pool.imap_unordered(_check_model_job, todo)
+            results = list(results)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = []
+        with translation.override('en'):
+            for m, checkers in mc.items():
+                dd.logger.debug("Running %d data checkers on %s...",
+                                len(checkers), m._meta.verbose_name_plural)
+                results.append(
+                    check_model(m, checkers, fix, chunk_size, full))
+
+    final_rows = [0, 0]
+    for name, rows, skipped, found, fixed, seconds in results:
+        if found or fixed:
+            msg = "Found {0} and fixed {1} data problems in {2}."
+            dd.logger.info(msg.format(found, fixed, name))
+        else:
+            dd.logger.debug(
+                "No data problems found in {0}.".format(name))
+        dd.logger.debug(
+            "Checked %d and skipped %d %s in %.2f seconds.",
+            rows, skipped, name, seconds)
+        final_rows[0] += rows
+        final_rows[1] += skipped
+        final_sums[0] += 1
+        final_sums[1] += found
+        final_sums[2] += fixed
     msg = "Done %d checkers, found %d and fixed %d problems."
     dd.logger.info(msg, *final_sums)
+    dd.logger.info("Checked %d rows, skipped %d unchanged rows.",
+                   *final_rows)
+    return results
 
 
 @dd.schedule_daily()
 def checkdata():
-    """Run all data checkers."""
-    check_data(fix=False)
+    """Run all data checkers on the rows which changed since the last
+    run, or on all rows if today is the :attr:`full_check_weekday
+    <lino.modlib.checkdata.Plugin.full_check_weekday>`."""
+    wd = dd.plugins.checkdata.full_check_weekday
+    full = wd is None or dd.today().weekday() == wd
+    check_data(fix=False, full=full)
     # rt.login().run(settings.SITE.site_config.run_checkdata)
@@ -19,3 +19,11 @@ class Plugin(ad.Plugin):
     "See :doc:`/dev/plugins`."
     verbose_name = _("Export to Excel xls format")
 
+    def get_patterns(self):
+        from django.conf.urls import url
+        from . import views
+        return [
+            url(r'^xlsx/(?P<app_label>\w+)/(?P<actor>\w+)$',
+                views.ExportExcel.as_view()),
+        ]
+
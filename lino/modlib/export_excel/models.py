@@ -7,11 +7,14 @@
 """
 from builtins import str
 import os
+import tempfile
 
 from django.conf import settings
 from django.db.models import Model
+from django.http import FileResponse
 from django.utils.functional import Promise
 from lino.core import actions
+from lino.core import constants
 from lino.core.tables import AbstractTable
 from lino.utils.media import TmpMediaFile
 from lino.utils import IncompleteDate
@@ -23,6 +26,10 @@ from lino.api import dd
 from django.utils.translation import ugettext_lazy as _
 
 
+XLSX_CONTENT_TYPE = (
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
 def sheet_name(s):
     s = s[:31]
     for c in u"[]:\\?/*\x00":
@@ -30,6 +37,75 @@ def sheet_name(s):
     return s
 
 
+def convert_text(value):
+    return str(value)
+
+
+def convert_bool(value):
+    return value and 1 or 0
+
+
+def convert_element(value):
+    return to_rst(value)
+    # dd.logger.info("20160716 %s", value)
+
+
+def convert_incomplete_date(value):
+    if value.is_complete():
+        return value.as_date()
+    return str(value)
+
+
+def get_converter(value):
+    """Return the function to use for converting the given value into
+    something openpyxl can store in a cell, or `None` if the value
+    can be stored as is.
+
+    """
+    if type(value) == bool:
+        return convert_bool
+    elif isinstance(value, (Duration, Choice)):
+        return convert_text
+    elif iselement(value):
+        return convert_element
+    elif isinstance(value, Promise):
+        return convert_text
+    elif isinstance(value, IncompleteDate):
+        return convert_incomplete_date
+    elif isinstance(value, Model):
+        return convert_text
+    return None
+
+
+CONVERTERS = dict()
+"""Caches the result of :func:`get_converter` per value type."""
+
+
+def convert_value(value):
+    t = type(value)
+    try:
+        cv = CONVERTERS[t]
+    except KeyError:
+        cv = CONVERTERS[t] = get_converter(value)
+    if cv is None:
+        return value
+    return cv(value)
+
+
+def ar2rows(ar, fields):
+    """Yield the rows of the given table request as lists of cell values
+    for the given fields.
+
+    The getters are computed once per column, and the conversion
+    function once per value type.
+
+    """
+    getters = [column.field._lino_atomizer.full_value_from_object
+               for column in fields]
+    for row in ar.iter_data_rows():
+        yield [convert_value(get(row, ar)) for get in getters]
+
+
 def ar2workbook(ar, column_names=None):
     from openpyxl import Workbook
     from openpyxl.styles import Font
@@ -43,49 +119,74 @@ def ar2workbook(ar, column_names=None):
     # TypeError: 'NoneType' object is not iterable
 
     # workbook = Workbook(guess_types=True)
-    
     # removed `guess_types=True` because it caused trouble in openpyxl
     # 3.4.0 and because I don't know whether it is needed.
-    
     workbook = Workbook()
     sheet = workbook.active
     sheet.title = sheet_name(ar.get_title())
 
     bold_font = Font(name='Calibri', size=11, bold=True, )
-
     fields, headers, widths = ar.get_field_info(column_names)
-
     for c, column in enumerate(fields):
         sheet.cell(row=1, column=c + 1).value = str(headers[c])
         sheet.cell(row=1, column=c + 1).font = bold_font
         # sheet.col(c).width = min(256 * widths[c] / 7, 65535)
         # 256 == 1 character width, max width=65535
 
-    for c, column in enumerate(fields):
-        for r, row in enumerate(ar.data_iterator, start=1):
-            sf = column.field._lino_atomizer
-            value = sf.full_value_from_object(row, ar)
-            if type(value) == bool:
-                value = value and 1 or 0
-            elif isinstance(value, (Duration, Choice)):
-                value = str(value)
-            elif iselement(value):
-                value = to_rst(value)
-                # dd.logger.info("20160716 %s", value)
-            elif isinstance(value, Promise):
-                value = str(value)
-            elif isinstance(value, IncompleteDate):
-                if value.is_complete():
-                    value = value.as_date()
-                else:
-                    value = str(value)
-            elif isinstance(value, Model):
-                value = str(value)
-            sheet.cell(row=r + 1, column=c + 1).value = value
+    for values in ar2rows(ar, fields):
+        sheet.append(values)
 
     return workbook
 
 
+def ar2xlsx(ar, file, column_names=None):
+    """Write the given table request to the given file (a filename or a
+    file-like object) using openpyxl's write-only mode.
+
+    Unlike :func:`ar2workbook`, this uses constant memory: the rows
+    are fetched from a server-side cursor and written one by one.
+
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name(ar.get_title()))
+
+    bold_font = Font(name='Calibri', size=11, bold=True, )
+    fields, headers, widths = ar.get_field_info(column_names)
+    row = []
+    for h in headers:
+        cell = WriteOnlyCell(sheet, value=str(h))
+        cell.font = bold_font
+        row.append(cell)
+    sheet.append(row)
+
+    for values in ar2rows(ar, fields):
+        sheet.append(values)
+
+    workbook.save(file)
+
+
+def ar2response(ar, column_names=None):
+    """Return an HTTP response with the given table request as an
+    `.xlsx` file.
+
+    The workbook is first written completely to an anonymous
+    temporary file, which is then sent to the client in chunks.  So
+    the response doesn't start before all rows have been read, but
+    neither the rows nor the file are held in memory.
+
+    """
+    f = tempfile.TemporaryFile()
+    ar2xlsx(ar, f, column_names)
+    f.seek(0)
+    response = FileResponse(f, content_type=XLSX_CONTENT_TYPE)
+    response['Content-Disposition'] = 'attachment; filename="{}.xlsx"'.format(
+        ar.actor)
+    return response
+
+
 class ExportExcelAction(actions.Action):
     label = _("Export to .xls")
     help_text = _('Export this table as an .xls document')
@@ -101,6 +202,21 @@ class ExportExcelAction(actions.Action):
     #     return isinstance(caller, actions.ShowTable)
 
     def run_from_ui(self, ar, **kw):
+        request = ar.request
+        if request is not None:
+            # Tell the client to open the view which writes the file
+            # for the same table request.
+            if request.method == 'GET':
+                rqdata = request.GET.copy()
+            else:
+                rqdata = request.POST.copy()
+            rqdata.pop(constants.URL_PARAM_ACTION_NAME, None)
+            rqdata.pop(constants.URL_PARAM_FORMAT, None)
+            url = dd.plugins.export_excel.build_plain_url(
+                'xlsx', ar.actor.app_label, ar.actor.__name__)
+            ar.success(open_url=url + '?' + rqdata.urlencode())
+            return
+
         # Prepare tmp file
         mf = TmpMediaFile(ar, 'xlsx')
         settings.SITE.makedirs_if_missing(os.path.dirname(mf.name))
@@ -113,8 +229,7 @@ class ExportExcelAction(actions.Action):
         ar.success(open_url=mf.get_url(ar.request))
 
     def render(self, ar, file):
-        workbook = ar2workbook(ar)
-        workbook.save(file)
+        ar2xlsx(ar, file)
 
 
 AbstractTable.export_excel = ExportExcelAction()
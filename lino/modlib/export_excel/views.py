@@ -0,0 +1,27 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2018 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+"""Views for `lino.modlib.export_excel`.
+
+"""
+
+from django.core.exceptions import PermissionDenied
+from django.views.generic import View
+
+from lino.core.views import action_request
+
+from .models import ar2response
+
+
+class ExportExcel(View):
+    """Stream the rows of a table as an `.xlsx` file.
+
+    Expects the same request parameters as the table's list view.
+
+    """
+    def get(self, request, app_label=None, actor=None):
+        ar = action_request(app_label, actor, request, request.GET, True)
+        if not ar.get_permission():
+            raise PermissionDenied(
+                "No permission to run {}".format(ar))
+        return ar2response(ar)
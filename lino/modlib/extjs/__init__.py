@@ -112,6 +112,35 @@ class Plugin(Plugin):
     directory.
     """
 
+    choices_index_size = 200
+    """The maximum number of indexes to keep for the choices of combo
+    boxes which are not database queries.  There is one index per
+    field, context, user type (or user for choosers declared with
+    ``index_choices=True``) and language.  See
+    :mod:`lino.core.choicesindex`."""
+
+    choices_index_ttl = 60
+    """The number of seconds after which an index of choices is rebuilt."""
+
+    _choices_indexes = None
+
+    lazy_actor_modules = False
+    """Whether to split the :xfile:`lino*.js` files into a core file and
+    one Javascript module per actor.
+
+    When this is `True`, the core file contains only what is needed
+    to start the client (the :xfile:`linoweb.js` template, the main
+    menu and the choicelists) and a stub for every action of every
+    actor.  When a stub is called for the first time, the client
+    fetches the module of its actor from the server.  The server
+    generates a module when it is first requested and caches it on
+    disk (see :meth:`build_actor_js
+    <lino.modlib.extjs.ext_renderer.ExtRenderer.build_actor_js>`).
+
+    This reduces the time needed to load the first page of large
+    applications.
+    """
+
     ui_handle_attr_name = 'extjs_handle'
 
     def on_ui_init(self, kernel):
@@ -157,6 +186,16 @@ class Plugin(Plugin):
                         "data['%s'] : undefined);" % (
                             e.as_ext(), f.name, form_field_name(f)))
 
+    def get_choices_indexes(self):
+        """Return the :class:`ChoiceIndexCache
+        <lino.core.choicesindex.ChoiceIndexCache>` which holds the
+        indexes of choices, creating it on first use."""
+        if self._choices_indexes is None:
+            from lino.core.choicesindex import ChoiceIndexCache
+            self._choices_indexes = ChoiceIndexCache(
+                self.choices_index_size, self.choices_index_ttl)
+        return self._choices_indexes
+
     def get_css_includes(self, site):
         yield self.build_lib_url('resources/css/ext-all.css')
 
@@ -208,6 +247,8 @@ class Plugin(Plugin):
             # url(rx + '/?$', views.AdminIndex.as_view()),
             url(rx + '$', views.AdminIndex.as_view()),
             url(rx + r'api/main_html$', views.MainHtml.as_view()),
+            url(rx + r'actorjs/(?P<app_label>\w+)/(?P<actor>\w+)$',
+                views.ActorModule.as_view()),
             # url(rx + r'auth$', views.Authenticate.as_view()),
             url(rx + r'grid_config/(?P<app_label>\w+)/(?P<actor>\w+)$',
                 views.GridConfig.as_view()),
@@ -16,8 +16,11 @@ import six
 
 logger = logging.getLogger(__name__)
 
+import os
+import re
 import cgi
 import time
+import shutil
 
 from django.conf import settings
 from django.db import models
@@ -68,6 +71,13 @@ from lino.core import elems as ext_elems
 # if settings.SITE.user_model:
 #     from lino.modlib.users import models as users
 
+# References to the panel classes of an actor in the generated
+# Javascript, e.g. "Lino.contacts.Persons.GridPanel".  Used to find the
+# dependencies of actor modules.
+ACTOR_PANEL_REF = re.compile(r"Lino\.(\w+\.\w+)\.\w*Panel\b")
+EXTENDED_PANEL_REF = re.compile(
+    r"Ext\.extend\(\s*Lino\.(\w+\.\w+)\.\w*Panel\b")
+
 # ONE_CHAR_LABEL = "\u00A0{}\u00A0"
 # ONE_CHAR_LABEL = "<font size=\"4\">\u00A0{}\u00A0</font>"
 ONE_CHAR_LABEL = " <font size=\"4\">{}</font>"
@@ -595,7 +605,7 @@ class ExtRenderer(JsRenderer, JsCacheRenderer):
                     f.write(jscompress('\n// from %s:%s\n' % (p, tplname)))
                     f.write(jscompress('\n' + tpl.render(**context) + '\n'))
 
-        menu = settings.SITE.get_site_menu(user_type)
+        menu = settings.SITE.build_site_menu(user_type)
         menu.add_item(
             'home', _("Home"), javascript="Lino.handle_home_button()")
         f.write("Lino.main_menu = %s;\n" % py2js(menu))
@@ -608,15 +618,7 @@ class ExtRenderer(JsRenderer, JsCacheRenderer):
         for a in self.actors_list:
             f.write("Ext.namespace('Lino.%s')\n" % a)
 
-        # actors with their own `get_handle_name` don't have a js
-        # implementation
-        actors_list = [
-            a for a in self.actors_list if a.get_handle_name is None]
-
-        # generate only actors whose default_action is visible
-        actors_list = [
-            a for a in actors_list
-            if a.default_action.get_view_permission(user_type)]
+        actors_list = self.get_js_actors(user_type)
 
         # Define every choicelist as a JS array:
         f.write("\n// ChoiceLists: \n")
@@ -630,30 +632,21 @@ class ExtRenderer(JsRenderer, JsCacheRenderer):
 
         assert user_type == get_user_profile()
 
-        def must_render(lh, user_type):
-            """
-            Return True if the given form layout `fl` is needed for
-            user_type.
-            """
-            if not lh.main.get_view_permission(user_type):
-                return False
-            if lh.layout._datasource.get_view_permission(user_type):
-                return True
-            for ds in lh.layout._other_datasources:
-                if ds.get_view_permission(user_type):
-                    return True
-            return False
+        if self.plugin.lazy_actor_modules:
+            for ln in self.js_render_actor_stubs(actors_list):
+                f.write(ln + '\n')
+            return 1
 
         #~ f.write('\n/* Application FormPanel subclasses */\n')
         for fl in self.param_panels:
             lh = fl.get_layout_handle(self.plugin)
-            if must_render(lh, user_type):
+            if self.must_render(lh, user_type):
                 for ln in self.js_render_ParamsPanelSubclass(lh):
                     f.write(ln + '\n')
 
         for fl in self.action_param_panels:
             lh = fl.get_layout_handle(self.plugin)
-            if must_render(lh, user_type):
+            if self.must_render(lh, user_type):
                 for ln in self.js_render_ActionFormPanelSubclass(lh):
                     f.write(ln + '\n')
 
@@ -661,73 +654,262 @@ class ExtRenderer(JsRenderer, JsCacheRenderer):
 
         for fl in self.form_panels:
             lh = fl.get_layout_handle(self.plugin)
-            if must_render(lh, user_type):
+            if self.must_render(lh, user_type):
                 for ln in self.js_render_FormPanelSubclass(lh):
                     f.write(ln + '\n')
 
+        for rpt, ba in self.get_params_window_actions(actors_list):
+            for ln in self.js_render_window_action(rpt.get_handle(), ba):
+                f.write(ln + '\n')
+
+        for rpt in actors_list:
+            for ln in self.js_render_actor_windows(rpt):
+                f.write(ln + '\n')
+
+        if user_type != get_user_profile():
+            logger.warning(
+                "Oops, user_type %s != get_user_profile() %s",
+                user_type, get_user_profile())
+
+        return 1
+
+    def get_js_actors(self, user_type):
+        """Return the list of actors for which to generate Javascript
+        for the given user type.
+
+        """
+        # actors with their own `get_handle_name` don't have a js
+        # implementation
+        actors_list = [
+            a for a in self.actors_list if a.get_handle_name is None]
+
+        # generate only actors whose default_action is visible
+        return [a for a in actors_list
+                if a.default_action.get_view_permission(user_type)]
+
+    def must_render(self, lh, user_type):
+        """
+        Return True if the given layout handle `lh` is needed for
+        user_type.
+        """
+        if not lh.main.get_view_permission(user_type):
+            return False
+        if lh.layout._datasource.get_view_permission(user_type):
+            return True
+        for ds in lh.layout._other_datasources:
+            if ds.get_view_permission(user_type):
+                return True
+        return False
+
+    def get_params_window_actions(self, actors_list):
+        """Yield a tuple `(actor, bound_action)` for every action with
+        parameters.  An action used by several actors is yielded only
+        for the first of them.
+
+        """
         actions_written = set()
         for rpt in actors_list:
-            rh = rpt.get_handle()
             for ba in rpt.get_actions():
                 if ba.action.parameters:
                     if ba.action not in actions_written:
                         actions_written.add(ba.action)
-                        for ln in self.js_render_window_action(rh, ba):
-                            f.write(ln + '\n')
+                        yield rpt, ba
 
-        for rpt in actors_list:
-            # x = str(rpt)
-            # if x == 'working.WorkedHours':
-            #     raise Exception("20180803 {0}".format(x))
-            
-            rh = rpt.get_handle()
-            if isinstance(rpt, type) and issubclass(rpt, (
-                    tables.AbstractTable, choicelists.ChoiceList)):
-                for ln in self.js_render_GridPanel_class(rh):
-                    f.write(ln + '\n')
+    def js_render_actor_windows(self, rpt):
+        """Yield the lines which define the grid panel, the detail and
+        insert panels, the window actions and the custom actions of
+        the given actor.
 
-                # 20180518 There is more useless JS code in the
-                # :file:`lino_XXX_yy.js` file : for example (in team)
-                # it generates a GridPanel and related functions for
-                # `Lino.countries.PlaceTypes`.  This table is never
-                # used because there is no menu item for it.  We might
-                # extend the code which decides whether
-                # :meth:`js_render_GridPanel_class` must be called or
-                # not.  The condition would be: if it is a master
-                # table but does not have any menu item.  But that
-                # might be dangerous (cause uncovered regressions), so
-                # I prefer to leave this for another time.
-
-            window_actions = [ba.action for ba in rpt.get_actions() if
-                              ba.action.opens_a_window]
+        """
+        # x = str(rpt)
+        # if x == 'working.WorkedHours':
+        #     raise Exception("20180803 {0}".format(x))
+
+        rh = rpt.get_handle()
+        if isinstance(rpt, type) and issubclass(rpt, (
+                tables.AbstractTable, choicelists.ChoiceList)):
+            for ln in self.js_render_GridPanel_class(rh):
+                yield ln
+
+            # 20180518 There is more useless JS code in the
+            # :file:`lino_XXX_yy.js` file : for example (in team)
+            # it generates a GridPanel and related functions for
+            # `Lino.countries.PlaceTypes`.  This table is never
+            # used because there is no menu item for it.  We might
+            # extend the code which decides whether
+            # :meth:`js_render_GridPanel_class` must be called or
+            # not.  The condition would be: if it is a master
+            # table but does not have any menu item.  But that
+            # might be dangerous (cause uncovered regressions), so
+            # I prefer to leave this for another time.
+
+        window_actions = [ba.action for ba in rpt.get_actions() if
+                          ba.action.opens_a_window]
+        for ba in rpt.get_actions():
+            if ba.action.parameters and not ba.action.no_params_window:
+                pass
+            elif ba.action.opens_a_window:
+                if isinstance(ba.action, (ShowDetail,
+                                          ShowInsert)):
+                    for ln in self.js_render_detail_action_FormPanel(
+                            rh, ba):
+                        yield ln
+                for ln in self.js_render_window_action(rh, ba):
+                    yield ln
+            # elif self.is_custom_action(ba.action):
+            elif ba.action.action_name:
+                is_custom = False
+                for parent in window_actions:
+                    if ba.action.is_callable_from(parent):
+                        is_custom = True
+                        break
+                if is_custom:
+                    for ln in self.js_render_custom_action(rh, ba):
+                        yield ln
+
+    def js_render_actor_stubs(self, actors_list):
+        """Yield the lines which define, in the core :xfile:`lino*.js`
+        file, the loader of the actor modules and a stub for every
+        action which is defined in an actor module.
+
+        A stub loads the module of its actor when it is called for the
+        first time.  The module then replaces the stub by the real
+        action.  See :attr:`lazy_actor_modules
+        <lino.modlib.extjs.Plugin.lazy_actor_modules>`.
+
+        """
+        yield "Lino.actor_modules_url = %s;" % py2js(
+            self.plugin.build_plain_url('actorjs') + '/')
+        yield "Lino.actor_modules_language = %s;" % py2js(
+            translation.get_language())
+        yield "Lino.loaded_modules = {};"
+        yield "Lino.require_modules = function(names) {"
+        yield "  for (var i = 0; i < names.length; i++) {"
+        yield "    var name = names[i];"
+        yield "    if (Lino.loaded_modules[name]) continue;"
+        yield "    Lino.loaded_modules[name] = true;"
+        yield "    var url = Lino.actor_modules_url + name.replace('.', '/')"
+        yield "      + '?{}=' + Lino.actor_modules_language;".format(
+            constants.URL_PARAM_USER_LANGUAGE)
+        yield "    if (Lino.subst_user) url += '&{}=' + Lino.subst_user;".format(
+            constants.URL_PARAM_SUBST_USER)
+        yield "    var xhr = new XMLHttpRequest();"
+        # The stubs must return the real action, so we load the
+        # module synchronously.
+        yield "    xhr.open('GET', url, false);"
+        yield "    xhr.send(null);"
+        yield "    if (xhr.status != 200) {"
+        yield "      Lino.loaded_modules[name] = false;"
+        yield "      throw new Error('Could not load ' + url + ' : ' + xhr.status);"
+        yield "    }"
+        yield "    (0, eval)(xhr.responseText);"
+        yield "  }"
+        yield "};"
+        yield "Lino.actor_stub = function(module, name) {"
+        yield "  var stub;"
+        yield "  var real = function() {"
+        yield "    Lino.require_modules([module]);"
+        yield "    var a = eval('Lino.' + name);"
+        yield "    if (a === stub) throw new Error('Lino.' + name + ' is not defined');"
+        yield "    return a;"
+        yield "  };"
+        yield "  stub = function() {"
+        yield "    var a = real(); return a.apply(this, arguments);"
+        yield "  };"
+        yield "  stub.run = function() {"
+        yield "    var a = real(); return a.run.apply(a, arguments);"
+        yield "  };"
+        yield "  stub.get_window = function() {"
+        yield "    var a = real(); return a.get_window.apply(a, arguments);"
+        yield "  };"
+        yield "  return stub;"
+        yield "};"
+        for rpt in actors_list:
             for ba in rpt.get_actions():
-                if ba.action.parameters and not ba.action.no_params_window:
-                    pass
-                elif ba.action.opens_a_window:
-                    if isinstance(ba.action, (ShowDetail,
-                                              ShowInsert)):
-                        for ln in self.js_render_detail_action_FormPanel(
-                                rh, ba):
-                            f.write(ln + '\n')
-                    for ln in self.js_render_window_action(rh, ba):
-                        f.write(ln + '\n')
-                # elif self.is_custom_action(ba.action):
-                elif ba.action.action_name:
-                    is_custom = False
-                    for parent in window_actions:
-                        if ba.action.is_callable_from(parent):
-                            is_custom = True
-                            break
-                    if is_custom:
-                        for ln in self.js_render_custom_action(rh, ba):
-                            f.write(ln + '\n')
+                if ba.action.action_name:
+                    yield "Lino.%s = Lino.actor_stub(%s, %s);" % (
+                        ba.full_name(), py2js(str(rpt)),
+                        py2js(ba.full_name()))
+
+    def write_actor_js(self, f, rpt):
+        """Write the Javascript module of the given actor for the
+        current user type and language.
+
+        The module contains the form panels owned by this actor (see
+        :meth:`prepare_layouts
+        <lino.core.renderer_mixins.JsCacheRenderer.prepare_layouts>`)
+        and everything yielded by :meth:`js_render_actor_windows`.  It
+        starts with a call to ``Lino.require_modules()`` for the
+        modules of the other actors whose panel classes it uses.
 
-        if user_type != get_user_profile():
-            logger.warning(
-                "Oops, user_type %s != get_user_profile() %s",
-                user_type, get_user_profile())
+        """
+        user_type = get_user_profile()
+        actor_id = str(rpt)
+        lines = []
+
+        def owned(fl):
+            return fl._formpanel_name.rsplit('.', 1)[0] == actor_id
+
+        for collector, func in (
+                (self.param_panels, self.js_render_ParamsPanelSubclass),
+                (self.action_param_panels,
+                 self.js_render_ActionFormPanelSubclass),
+                (self.form_panels, self.js_render_FormPanelSubclass)):
+            for fl in collector:
+                if owned(fl):
+                    lh = fl.get_layout_handle(self.plugin)
+                    if self.must_render(lh, user_type):
+                        lines.extend(func(lh))
+
+        actors_list = self.get_js_actors(user_type)
+        if rpt in actors_list:
+            for a, ba in self.get_params_window_actions(actors_list):
+                if a is rpt:
+                    lines.extend(
+                        self.js_render_window_action(rpt.get_handle(), ba))
+            lines.extend(self.js_render_actor_windows(rpt))
+
+        content = '\n'.join(lines)
+        modules = set([str(a) for a in self.actors_list])
+        modules.discard(actor_id)
+        # Panel classes extended by this module must be loaded before
+        # it, panel classes used only at runtime may be loaded after
+        # it.  This avoids problems with modules which need each
+        # other.
+        before = set(EXTENDED_PANEL_REF.findall(content)) & modules
+        after = set(ACTOR_PANEL_REF.findall(content)) & modules
+        after -= before
+        if before:
+            f.write("Lino.require_modules(%s);\n" % py2js(sorted(before)))
+        f.write(content + '\n')
+        if after:
+            f.write("Lino.require_modules(%s);\n" % py2js(sorted(after)))
+
+    def build_actor_js(self, rpt, force=False):
+        """Build the Javascript module of the given actor for the
+        current user type and language if needed, and return the name
+        of the file.
 
-        return 1
+        """
+        user_type = get_user_profile()
+        name = "{}_{}_{}.js".format(
+            rpt, user_type.value if user_type else 'anonymous',
+            translation.get_language())
+        fn = os.path.join(settings.MEDIA_ROOT, 'cache', 'js', 'modules', name)
+
+        def write(f):
+            self.write_actor_js(f, rpt)
+
+        self.build_js_file(fn, write, force)
+        return fn
+
+    def build_site_cache(self, force=False):
+        super(ExtRenderer, self).build_site_cache(force)
+        if force and self.plugin.lazy_actor_modules:
+            # modules are rebuilt when they are requested again
+            shutil.rmtree(
+                os.path.join(settings.MEDIA_ROOT, 'cache', 'js', 'modules'),
+                ignore_errors=True)
 
     def toolbar(self, action_list):
         """
@@ -1280,9 +1462,11 @@ class ExtRenderer(JsRenderer, JsCacheRenderer):
         extjs = self.plugin
 
         def fn():
-            yield "// lino.js --- generated %s by %s for %s." % (
-                time.ctime(), cgi.escape(settings.SITE.site_version()),
-                get_user_profile())
+            # Don't mention the time or the user type here because
+            # that would prevent identical files from being stored
+            # only once (see JsCacheRenderer.store_js_file()).
+            yield "// lino.js --- generated by %s." % (
+                cgi.escape(settings.SITE.site_version()))
             # lino.__version__)
             #~ // $site.title ($lino.welcome_text())
             if self.extjs_version == 3:
@@ -28,14 +28,16 @@ Summary from <http://en.wikipedia.org/wiki/Restful>:
 from builtins import str
 
 import json
+import hashlib
 
 from django import http
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.views.generic import View
 from django.views.decorators.cache import never_cache
 from django.utils.decorators import method_decorator
 
+from django.utils import translation
 from django.utils.translation import ugettext as _
 from django.utils.encoding import force_text
 from lino.core import auth
@@ -56,9 +58,13 @@ from lino.core import fields
 
 from lino.core.views import requested_actor, action_request
 from lino.core.views import json_response, json_response_kw
+from lino.utils.jsgen import data2json
+from lino.utils.sqllog import QueryCounter
 
 from lino.core import constants
 from lino.core.requests import BaseRequest, PhantomRow
+from lino.core.choicesindex import ChoiceIndex
+from lino.modlib.users.utils import with_user_profile
 
 MAX_ROW_COUNT = 300
 
@@ -131,6 +137,39 @@ class AdminIndex(View):
         return http.HttpResponse(renderer.html_page(request, **kw))
 
 
+class ActorModule(View):
+    """Return the Javascript module of an actor for the requesting user
+    type and language.  See :attr:`lazy_actor_modules
+    <lino.modlib.extjs.Plugin.lazy_actor_modules>`.
+
+    The ETag of the response is the hash of the module, so that
+    clients load a module again only when it has changed.
+
+    """
+
+    def get(self, request, app_label=None, actor=None):
+        renderer = settings.SITE.plugins.extjs.renderer
+        rpt = requested_actor(app_label, actor)
+        if str(rpt) != "{}.{}".format(app_label, actor) \
+           or rpt not in renderer.actors_list:
+            raise http.Http404("No module for {}.{}".format(app_label, actor))
+        user = request.subst_user or request.user
+        fn = with_user_profile(
+            user.user_type, renderer.build_actor_js, rpt)
+        with open(fn, 'rb') as f:
+            content = f.read()
+        # same hash as in the name of the file (lino.HASH.js)
+        etag = '"{}"'.format(hashlib.sha1(content).hexdigest()[:16])
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = http.HttpResponseNotModified()
+        else:
+            response = http.HttpResponse(
+                content, content_type='application/javascript')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
 class MainHtml(View):
     def get(self, request, *args, **kw):
         # ~ logger.info("20130719 MainHtml")
@@ -217,10 +256,54 @@ class Callbacks(View):
         return settings.SITE.kernel.run_callback(request, thread_id, button_id)
 
 
+# Choosers which returned a QuerySet.  We don't look for an index for
+# them.
+QUERYSET_CHOOSERS = set()
+
+# URL parameters which don't influence the choices
+NON_CONTEXT_PARAMS = set([
+    constants.URL_PARAM_FILTER, constants.URL_PARAM_START,
+    constants.URL_PARAM_LIMIT, '_dc'])
+
+
+def get_choices_index_key(request, holder, field, chooser):
+    context = tuple(sorted([
+        (k, v) for k, v in request.GET.items()
+        if k not in NON_CONTEXT_PARAMS]))
+    if chooser is None:
+        who = request.user.user_type
+    else:
+        # a chooser may return different choices for every user
+        who = request.user.pk
+    return (holder, field.name, who, translation.get_language(), context)
+
+
+def index_choices(request, holder, field, chooser, qs, row2dict):
+    """Return a :class:`ChoiceIndex
+    <lino.core.choicesindex.ChoiceIndex>` for the given list of
+    choices and store it in the :meth:`cache of indexes
+    <lino.modlib.extjs.Plugin.get_choices_indexes>`.
+
+    """
+    rows = [row2dict(row, {}) for row in qs]
+    cache = settings.SITE.plugins.extjs.get_choices_indexes()
+    return cache.put(
+        get_choices_index_key(request, holder, field, chooser), rows)
+
+
 def choices_for_field(request, holder, field):
     """
     Return the choices for the given field and the given HTTP request
     whose `holder` is either a Model, an Actor or an Action.
+
+    The static :attr:`choices` of a field (including those of a
+    choicelist) are returned as a :class:`ChoiceIndex
+    <lino.core.choicesindex.ChoiceIndex>`, which is reused for
+    subsequent requests with the same context.  In that case the
+    returned `row2dict` is `None`.  The same happens for a chooser
+    which returns a list and has been declared with
+    ``index_choices=True``.  Other choosers are called for every
+    request because their choices may come from the database.
     """
     if not holder.get_view_permission(request.user.user_type):
         raise Exception(
@@ -230,6 +313,18 @@ def choices_for_field(request, holder, field):
     chooser = holder.get_chooser_for_field(field.name)
     # logger.info('20140822 choices_for_field(%s.%s) --> %s',
     #             holder, field.name, chooser)
+    if chooser is None:
+        use_index = bool(field.choices)
+    else:
+        use_index = chooser.index_choices \
+            and chooser not in QUERYSET_CHOOSERS
+    if use_index:
+        cache = settings.SITE.plugins.extjs.get_choices_indexes()
+        index = cache.get(
+            get_choices_index_key(request, holder, field, chooser))
+        if index is not None:
+            return (index, None)
+
     if chooser:
         qs = chooser.get_request_choices(request, holder)
         if not isiterable(qs):
@@ -252,7 +347,14 @@ def choices_for_field(request, holder, field):
                 d[constants.CHOICES_TEXT_FIELD] = str(obj[1])
                 d[constants.CHOICES_VALUE_FIELD] = obj[0]
                 return d
-        return (qs, row2dict)
+        if isinstance(qs, models.QuerySet):
+            if use_index:
+                QUERYSET_CHOOSERS.add(chooser)
+            return (qs, row2dict)
+        if not use_index:
+            return (qs, row2dict)
+        return (index_choices(
+            request, holder, field, chooser, qs, row2dict), None)
 
     if field.choices:
         qs = field.choices
@@ -267,7 +369,8 @@ def choices_for_field(request, holder, field):
                 d[constants.CHOICES_VALUE_FIELD] = str(obj)
             return d
 
-        return (qs, row2dict)
+        return (index_choices(
+            request, holder, field, None, qs, row2dict), None)
 
     if isinstance(field, fields.VirtualField):
         field = field.return_type
@@ -306,23 +409,37 @@ def choices_response(actor, request, qs, row2dict, emptyValue):
     Calculates offset and limit
     Adds None value
     returns
+
+    If `qs` is a :class:`ChoiceIndex
+    <lino.core.choicesindex.ChoiceIndex>`, the search and pagination
+    is done by the index.  For a QuerySet we avoid a separate count
+    query when the requested page is the last one.
     """
     quick_search = request.GET.get(constants.URL_PARAM_FILTER, None)
     offset = request.GET.get(constants.URL_PARAM_START, None)
     limit = request.GET.get(constants.URL_PARAM_LIMIT, None)
-    if isinstance(qs, models.QuerySet):
-        qs = qs.filter(qs.model.quick_search_filter(quick_search)) if quick_search else qs
-        count = qs.count()
+    offset = int(offset) if offset else 0
+    limit = int(limit) if limit else None
+    if isinstance(qs, ChoiceIndex):
+        count, rows = qs.search(quick_search, offset, limit)
 
-        if offset:
-            qs = qs[int(offset):]
-            # ~ kw.update(offset=int(offset))
+    elif isinstance(qs, models.QuerySet):
+        qs = qs.filter(qs.model.quick_search_filter(quick_search)) if quick_search else qs
 
         if limit:
-            # ~ kw.update(limit=int(limit))
-            qs = qs[:int(limit)]
-
-        rows = [row2dict(row, {}) for row in qs]
+            # ask for one more row to see whether there are more
+            rows = [row2dict(row, {})
+                    for row in qs[offset:offset + limit + 1]]
+            if len(rows) > limit:
+                rows = rows[:limit]
+                count = qs.count()
+            elif rows or not offset:
+                count = offset + len(rows)
+            else:
+                count = qs.count()
+        else:
+            rows = [row2dict(row, {}) for row in qs[offset:]]
+            count = offset + len(rows)
 
     else:
         rows = [row2dict(row, {}) for row in qs]
@@ -332,8 +449,8 @@ def choices_response(actor, request, qs, row2dict, emptyValue):
             rows = [row for row in rows
                     if txt in row[constants.CHOICES_TEXT_FIELD].lower()]
         count = len(rows)
-        rows = rows[int(offset):] if offset else rows
-        rows = rows[:int(limit)] if limit else rows
+        rows = rows[offset:] if offset else rows
+        rows = rows[:limit] if limit else rows
 
     # Add None choice
     if emptyValue is not None and not quick_search:
@@ -588,6 +705,85 @@ class ApiElement(View):
         return delete_element(ar, elem)
 
 
+def stream_json_rows(ar, chunk_size=2000):
+    """Yield the JSON response of an unpaginated list request in
+    chunks, reading the rows from the database using a server-side
+    cursor.
+
+    The rows come first so that we can count them while sending them.
+    A separate `count()` query is needed only when the request has an
+    offset.
+
+    This generator runs after the view has returned, so it activates
+    the language of the request and runs in a transaction of its own.
+    When something goes wrong while sending the rows, the response
+    still ends with valid JSON, saying `success` false and giving the
+    message.
+
+    """
+    store = ar.ah.store
+    lang = translation.get_language()
+    qs = ar.data_iterator
+    db = qs.db if isinstance(qs, models.QuerySet) else None
+    yield '{ "rows": [ '
+    count = 0
+    try:
+        with translation.override(lang), transaction.atomic(using=db):
+            # the display texts of foreign keys are cached only per
+            # chunk so that memory usage stays flat
+            texts = {}
+            for row in ar.iter_data_rows(sliced=True, chunk_size=chunk_size):
+                if count:
+                    yield ', '
+                yield data2json(store.row2list(ar, row, texts))
+                count += 1
+                if count % chunk_size == 0:
+                    texts.clear()
+            phantoms = 0
+            for row in ar.create_phantom_rows():
+                if count or phantoms:
+                    yield ', '
+                yield data2json(store.row2list(ar, row))
+                phantoms += 1
+            if ar.offset:
+                # same as in the buffered response
+                count = ar.get_total_count()
+            count += phantoms
+            kw = dict(success=True,
+                      no_data_text=ar.no_data_text,
+                      title=str(ar.get_title()))
+            if ar.actor.parameters:
+                kw.update(
+                    param_values=ar.actor.params_layout.params_store.pv2dict(
+                        ar, ar.param_values))
+    except Exception as e:
+        dblogger.exception(e)
+        kw = dict(success=False, message=str(e))
+    kw.update(count=count)
+    yield ' ], ' + ', '.join([
+        data2json(k) + ': ' + data2json(v) for k, v in kw.items()]) + ' }'
+
+
+def stream_csv_rows(ar):
+    """Yield the lines of a CSV response for the given list request,
+    reading the rows from the database using a server-side cursor.
+
+    """
+    store = ar.ah.store
+
+    def rows():
+        yield store.column_names()
+        if True:  # 20130418 : also column headers, not only internal names
+            column_names = None
+            fields, headers, cellwidths = ar.get_field_info(column_names)
+            yield headers
+        texts = {}
+        for row in ar.iter_data_rows():
+            yield [str(v) for v in store.row2list(ar, row, texts)]
+
+    return ucsv.iter_csv(rows(), **settings.SITE.csv_params)
+
+
 class ApiList(View):
     def post(self, request, app_label=None, actor=None):
         ar = action_request(app_label, actor, request, request.POST, True)
@@ -605,8 +801,18 @@ class ApiList(View):
         # print(20170921, fmt)
 
         if fmt == constants.URL_FORMAT_JSON:
-            rows = [rh.store.row2list(ar, row)
-                    for row in ar.sliced_data_iterator]
+            if ar.limit is None:
+                # unpaginated requests (with an explicit limit of 0
+                # or on a table without preview_limit) can be huge,
+                # so we send the rows while reading them from the
+                # database
+                return http.StreamingHttpResponse(
+                    stream_json_rows(ar), content_type='application/json')
+            debug_queries = getattr(ar.actor, 'debug_queries', False)
+            with QueryCounter(debug_queries) as qc:
+                rows = rh.store.rows2list(ar, ar.sliced_data_iterator)
+            if debug_queries:
+                ar.actor.count_page_queries(ar, len(rows), qc.count)
             total_count = ar.get_total_count()
             # raise Exception("20171208 {}".format(ar.data_iterator.query))
             for row in ar.create_phantom_rows():
@@ -652,7 +858,8 @@ class ApiList(View):
         if fmt == 'csv':
             # ~ response = HttpResponse(mimetype='text/csv')
             charset = settings.SITE.csv_params.get('encoding', 'utf-8')
-            response = http.HttpResponse(
+            response = http.StreamingHttpResponse(
+                stream_csv_rows(ar),
                 content_type='text/csv;charset="%s"' % charset)
             if False:
                 response['Content-Disposition'] = \
@@ -663,15 +870,6 @@ class ApiList(View):
                     'inline; filename="%s.csv"' % ar.actor
 
             # ~ response['Content-Disposition'] = 'attachment; filename=%s.csv' % ar.get_base_filename()
-            w = ucsv.UnicodeWriter(response, **settings.SITE.csv_params)
-            w.writerow(ar.ah.store.column_names())
-            if True:  # 20130418 : also column headers, not only internal names
-                column_names = None
-                fields, headers, cellwidths = ar.get_field_info(column_names)
-                w.writerow(headers)
-
-            for row in ar.data_iterator:
-                w.writerow([str(v) for v in rh.store.row2list(ar, row)])
             return response
 
         if fmt == constants.URL_FORMAT_PRINTER:
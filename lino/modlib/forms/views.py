@@ -33,25 +33,11 @@ from etgen import html as xghtml
 
 PLAIN_PAGE_LENGTH = 15
 
-MENUS = dict()
-
 
 def http_response(ar, tplname, context):
     "Deserves a docstring"
-    u = ar.get_user()
-    lang = get_language()
-    k = (u.user_type, lang)
-    menu = MENUS.get(k, None)
-    if menu is None:
-        menu = settings.SITE.get_site_menu(u.user_type)
-        bs3 = settings.SITE.plugins.bootstrap3
-        if False:  # 20150803 home button now in base.html
-            assert bs3.renderer is not None
-            url = bs3.build_plain_url()
-            menu.add_url_button(url, label=_("Home"))
-        e = bs3.renderer.show_menu(ar, menu)
-        menu = tostring(e)
-        MENUS[k] = menu
+    menu = settings.SITE.get_site_menu_html(
+        ar, settings.SITE.plugins.bootstrap3.renderer)
     context.update(menu=menu)
     context = ar.get_printable_context(**context)
     context['ar'] = ar
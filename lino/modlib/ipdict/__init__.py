@@ -9,6 +9,7 @@
 
     models
     middleware
+    stores
 
 """
 
@@ -47,19 +48,42 @@ class Plugin(ad.Plugin):
     
     max_blacklist_time = timedelta(minutes=1)
     max_failed_auth_per_ip = 4 # Should be set in settings.SITE?
-    # blacklist = {}
-    ip_records = {}
-        
+
+    store_backend = None
+    """Where to store the IP records (see
+    :mod:`lino.modlib.ipdict.stores`).
+
+    The default value `None` (or ``'local'``) stores them in the
+    memory of the process.  ``'cache'`` stores them in the default
+    Django cache and ``'cache:name'`` in the cache with the given
+    alias.  Use a shared cache when your site runs on several worker
+    processes.
+    """
+
+    max_records = 10000
+    """The maximum number of IP records to keep in the memory of a
+    process.  The least recently used records are forgotten first."""
+
+    record_ttl = timedelta(days=1)
+    """How long to remember an IP record after its last activity."""
+
+    flush_interval = 10
+    """The maximum number of seconds during which the request times
+    collected by a process are not yet visible in a shared store."""
+
+    _store = None
+
+    def get_store(self):
+        """Return the record store of this site."""
+        if self._store is None:
+            from .stores import make_record_store
+            self._store = make_record_store(self)
+        return self._store
+
     def get_ip_record(self, request, username):
         addr = self.get_client_id(request)
-        k = (addr, username)
-        
-        ip = self.ip_records.get(k, None)
-        if ip is None:
-            ip = IPRecord(addr, username)
-            self.ip_records[k] = ip
-        return ip
-    
+        return self.get_store().get_record(addr, username)
+
     @staticmethod
     def get_client_id(request):
         # from http://stackoverflow.com/questions/4581789/how-do-i-get-user-ip-address-in-django
@@ -41,9 +41,9 @@ class Connections(dd.VirtualTable):
     @classmethod
     def get_data_rows(cls, ar):
         # return dd.plugins.ipdict.ip_records.values()
-        return reversed(sorted(
-            dd.plugins.ipdict.ip_records.values(),
-            key=lambda x: x.last_request))
+        return sorted(
+            dd.plugins.ipdict.get_store().get_records(),
+            key=lambda x: x.last_request or datetime.min, reverse=True)
     
     @dd.displayfield(_("IP address"))
     def ip_address(self, obj, ar):
@@ -76,29 +76,12 @@ class Connections(dd.VirtualTable):
 def on_login_failed(sender=None, credentials=None, request=None,
                     **kwargs):
     ipdict = settings.SITE.plugins.ipdict
-    rec = ipdict.get_ip_record(request, 'anonymous')
     # user failed to authenticate
-    rec.login_failures += 1
-    if rec.login_failures >= ipdict.max_failed_auth_per_ip:
-        # maybe a robot is trying to log in with brute force
-        # and waited patiently for max_blacklist_time to pass,
-        # and now continues to try. In that case we don't
-        # forget the blacklisted_since, so the robot must now
-        # wait a full minute for every attempt
-        if rec.blacklisted_since is None:
-            rec.blacklisted_since = datetime.now()
+    ipdict.get_store().login_failed(ipdict.get_client_id(request))
 
 
 @dd.receiver(user_logged_in)
 def on_logged_in(sender=None, request=None, user=None, **kwargs):
-    # when an IP was blacklisted, got unlocked after
-    # max_blacklist_time and then received a successful login,
-    # then all sins of anonymous are being erased:
     ipdict = settings.SITE.plugins.ipdict
-    rec = ipdict.get_ip_record(request, 'anonymous')
-    rec.blacklisted_since = None
-    rec.login_failures = 0
-
-    # record the login time for username
-    rec = ipdict.get_ip_record(request, user.username)
-    rec.last_login = datetime.now()
+    ipdict.get_store().logged_in(
+        ipdict.get_client_id(request), user.username)
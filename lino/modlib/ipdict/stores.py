@@ -0,0 +1,343 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2017-2018 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Defines the stores which hold the IP records of the
+:mod:`lino.modlib.ipdict` plugin.
+
+The store is selected by :attr:`store_backend
+<lino.modlib.ipdict.Plugin.store_backend>`.  The default
+:class:`LocalRecordStore` keeps the records in the memory of the
+process.  When your site runs on several worker processes, every
+process has its own records, and a brute-force attacker gets
+:attr:`max_failed_auth_per_ip
+<lino.modlib.ipdict.Plugin.max_failed_auth_per_ip>` attempts *per
+process*.  A :class:`CacheRecordStore` shares the records between all
+processes using the same Django cache.
+
+Login failures and logins are written to the shared cache
+immediately.  The time of the last request, which is updated by the
+middleware for every request, is collected in the memory of the
+process and written to the shared cache in batches, at most once every
+:attr:`flush_interval <lino.modlib.ipdict.Plugin.flush_interval>`
+seconds.  It is stored under a key of its own, so that writing it
+never overwrites a login failure registered by another process.
+
+"""
+
+from __future__ import unicode_literals
+from builtins import object
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from lino.modlib.ipdict import IPRecord
+
+FIELDS = ('login_failures', 'blacklisted_since', 'last_login',
+          'last_failure', 'last_request')
+
+
+def last_activity(rec):
+    """Return the most recent timestamp of the given record."""
+    times = [t for t in (rec.last_request, rec.last_login, rec.last_failure)
+             if t is not None]
+    if times:
+        return max(times)
+    return None
+
+
+class RecordStore(object):
+    """Base class for the stores of IP records.
+
+    .. attribute:: is_shared
+
+        Whether this store is shared between processes.
+
+    """
+    is_shared = False
+
+    def __init__(self, max_records=10000, ttl=86400, flush_interval=10,
+                 max_failures=4):
+        self.max_records = max_records
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.max_failures = max_failures
+        self.records = OrderedDict()
+        self.lock = threading.Lock()
+        self.evicted = 0
+
+    def get_local(self, addr, username):
+        """Return the in-process record for the given address and user
+        name, creating it if needed.  The caller must hold the
+        :attr:`lock`.
+
+        """
+        k = (addr, username)
+        rec = self.records.pop(k, None)
+        if rec is not None:
+            t = last_activity(rec)
+            if t is not None and self.is_expired(t):
+                rec = None
+                self.evicted += 1
+        if rec is None:
+            rec = IPRecord(addr, username)
+        # re-insert so that the records are ordered by last access
+        self.records[k] = rec
+        while len(self.records) > self.max_records:
+            self.records.popitem(last=False)
+            self.evicted += 1
+        return rec
+
+    def is_expired(self, t):
+        return (datetime.now() - t).total_seconds() > self.ttl
+
+    def purge(self):
+        """Remove expired records from the memory of this process."""
+        with self.lock:
+            for k, rec in list(self.records.items()):
+                t = last_activity(rec)
+                if t is None or self.is_expired(t):
+                    del self.records[k]
+                    self.evicted += 1
+
+    def get_record(self, addr, username):
+        """Return the :class:`IPRecord` for the given address and user
+        name.
+
+        """
+        with self.lock:
+            return self.get_local(addr, username)
+
+    def touch(self, addr, username):
+        """Register a request from the given address and user name."""
+        with self.lock:
+            rec = self.get_local(addr, username)
+            rec.last_request = datetime.now()
+
+    def login_failed(self, addr):
+        """Register a failed login attempt from the given address and
+        return the updated record of the anonymous user.
+
+        """
+        with self.lock:
+            rec = self.get_local(addr, 'anonymous')
+            rec.login_failures += 1
+            self.update_failure(rec)
+            return rec
+
+    def update_failure(self, rec):
+        rec.last_failure = datetime.now()
+        if rec.login_failures >= self.max_failures:
+            # maybe a robot is trying to log in with brute force
+            # and waited patiently for max_blacklist_time to pass,
+            # and now continues to try. In that case we don't
+            # forget the blacklisted_since, so the robot must now
+            # wait a full minute for every attempt
+            if rec.blacklisted_since is None:
+                rec.blacklisted_since = datetime.now()
+
+    def logged_in(self, addr, username):
+        """Register a successful login of the given user from the given
+        address.
+
+        """
+        with self.lock:
+            # when an IP was blacklisted, got unlocked after
+            # max_blacklist_time and then received a successful login,
+            # then all sins of anonymous are being erased:
+            rec = self.get_local(addr, 'anonymous')
+            rec.blacklisted_since = None
+            rec.login_failures = 0
+            # record the login time for username
+            rec = self.get_local(addr, username)
+            rec.last_login = datetime.now()
+
+    def get_records(self):
+        """Return a list of all known records."""
+        self.purge()
+        with self.lock:
+            return list(self.records.values())
+
+    def get_stats(self):
+        return dict(local=len(self.records), evicted=self.evicted)
+
+
+class LocalRecordStore(RecordStore):
+    """Keep the IP records in the memory of this process.  At most
+    :attr:`max_records` records are kept, the least recently used ones
+    are forgotten first.
+
+    """
+    pass
+
+
+class CacheRecordStore(RecordStore):
+    """Keep the IP records in a Django cache, so that they are shared
+    between all processes using this cache.
+
+    Use a `DatabaseCache
+    <https://docs.djangoproject.com/en/2.2/topics/cache/#database-caching>`__
+    if you want them stored in the database.
+
+    Every record is stored under its own key with a timeout of
+    :attr:`ttl` seconds, and the cache itself evicts them when it is
+    full.  There is no shared list of all records because a Django
+    cache cannot update it atomically.  So the :class:`Connections
+    <lino.modlib.ipdict.models.Connections>` table shows only the
+    records known to the process which serves the request (with their
+    shared values).
+
+    """
+    is_shared = True
+    key_prefix = 'lino.ipdict.'
+
+    def __init__(self, *args, **kwargs):
+        alias = kwargs.pop('alias', 'default')
+        super(CacheRecordStore, self).__init__(*args, **kwargs)
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.dirty = set()
+        self.last_flush = time.time()
+
+    def make_key(self, addr, username):
+        s = "{}|{}".format(addr, username)
+        return self.key_prefix + hashlib.md5(s.encode('utf-8')).hexdigest()
+
+    def load(self, rec, data):
+        for k in FIELDS:
+            setattr(rec, k, data.get(k))
+        rec.login_failures = rec.login_failures or 0
+
+    def dump(self, rec):
+        d = dict(addr=rec.addr, username=rec.username)
+        for k in FIELDS:
+            d[k] = getattr(rec, k)
+        return d
+
+    def save(self, rec):
+        self.cache.set(
+            self.make_key(rec.addr, rec.username), self.dump(rec), self.ttl)
+
+    def load_shared(self, rec, data, last_request):
+        # The caller must hold the lock.  Keep the most recent of the
+        # request times known locally and in the cache.
+        lr = rec.last_request
+        if data is not None:
+            self.load(rec, data)
+        for t in (lr, last_request):
+            if t is not None and (
+                    rec.last_request is None or t > rec.last_request):
+                rec.last_request = t
+
+    def get_record(self, addr, username):
+        k = self.make_key(addr, username)
+        found = self.cache.get_many([k, k + '.request'])
+        with self.lock:
+            rec = self.get_local(addr, username)
+            self.load_shared(rec, found.get(k), found.get(k + '.request'))
+            return rec
+
+    def touch(self, addr, username):
+        super(CacheRecordStore, self).touch(addr, username)
+        with self.lock:
+            self.dirty.add((addr, username))
+            if time.time() - self.last_flush < self.flush_interval:
+                return
+        self.flush()
+
+    def flush(self):
+        """Write the collected request times of this process to the
+        shared cache.
+
+        """
+        with self.lock:
+            self.last_flush = time.time()
+            recs = [self.records[k] for k in self.dirty if k in self.records]
+            self.dirty = set()
+        if not recs:
+            return
+        # Several processes may write the same key, but they all write
+        # a recent time, so it doesn't matter which one wins.
+        todo = dict()
+        for rec in recs:
+            if rec.last_request is not None:
+                k = self.make_key(rec.addr, rec.username)
+                todo[k + '.request'] = rec.last_request
+        self.cache.set_many(todo, self.ttl)
+
+    def login_failed(self, addr):
+        rec = self.get_record(addr, 'anonymous')
+        # count the failures using an atomic increment because several
+        # processes may receive attempts at the same time.
+        counter_key = self.make_key(addr, 'anonymous') + '.failures'
+        self.cache.add(counter_key, 0, self.ttl)
+        try:
+            n = self.cache.incr(counter_key)
+        except ValueError:
+            # the counter expired between add() and incr()
+            n = 1
+            self.cache.set(counter_key, n, self.ttl)
+        with self.lock:
+            rec.login_failures = n
+            self.update_failure(rec)
+        self.save(rec)
+        return rec
+
+    def logged_in(self, addr, username):
+        self.cache.delete(self.make_key(addr, 'anonymous') + '.failures')
+        rec = self.get_record(addr, 'anonymous')
+        with self.lock:
+            rec.blacklisted_since = None
+            rec.login_failures = 0
+        self.save(rec)
+        rec = self.get_record(addr, username)
+        with self.lock:
+            rec.last_login = datetime.now()
+        self.save(rec)
+
+    def get_records(self):
+        self.flush()
+        self.purge()
+        with self.lock:
+            keys = dict([(self.make_key(*k), k) for k in self.records])
+        names = []
+        for k in keys:
+            names += [k, k + '.request']
+        found = self.cache.get_many(names)
+        with self.lock:
+            recs = []
+            for k, rk in keys.items():
+                rec = self.records.get(rk)
+                if rec is None:
+                    continue
+                self.load_shared(rec, found.get(k), found.get(k + '.request'))
+                recs.append(rec)
+            return recs
+
+    def get_stats(self):
+        d = super(CacheRecordStore, self).get_stats()
+        d.update(dirty=len(self.dirty))
+        return d
+
+
+def make_record_store(plugin):
+    """Instantiate the record store specified by :attr:`store_backend
+    <lino.modlib.ipdict.Plugin.store_backend>`.
+
+    """
+    spec = plugin.store_backend
+    kwargs = dict(
+        max_records=plugin.max_records,
+        ttl=plugin.record_ttl.total_seconds(),
+        flush_interval=plugin.flush_interval,
+        max_failures=plugin.max_failed_auth_per_ip)
+    if spec is None or spec == 'local':
+        return LocalRecordStore(**kwargs)
+    if spec == 'cache':
+        return CacheRecordStore(**kwargs)
+    if spec.startswith('cache:'):
+        return CacheRecordStore(alias=spec[6:], **kwargs)
+    raise Exception("Invalid store_backend {!r}".format(spec))
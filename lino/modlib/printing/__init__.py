@@ -15,6 +15,51 @@ class Plugin(ad.Plugin):
 
     verbose_name = _("Printing")
 
+    build_processes = 1
+    """The number of worker processes used for building the documents
+    when printing several rows at once from a command-line context
+    (e.g. a script run using :manage:`run`).  See
+    :func:`lino.modlib.printing.jobs.build_and_merge`.
+
+    Printing from the web interface always builds the documents one
+    after the other, because forking a web server process is not
+    safe.  Leave this at 1 for build methods which cannot run in
+    parallel.
+
+    """
+
+    max_pending_builds = 8
+    """The maximum number of documents submitted to the worker processes
+    and not yet merged when printing several rows at once using
+    :attr:`build_processes`.
+
+    """
+
+    background_threshold = 20
+    """Print in a background job when printing more than this number of
+    rows at once.  The client then gets the URL of a page which shows
+    the progress and finally redirects to the result.  A background
+    job builds its documents one after the other, ignoring
+    :attr:`build_processes`.
+
+    """
+
+    cache_max_size = None
+    """The maximum total size (in bytes) of the documents in the print
+    store.  If this is not `None`, the least recently used documents
+    are removed from the store every hour.  See
+    :func:`lino.modlib.printing.cache.evict`.
+
+    """
+
+    def get_patterns(self):
+        from django.conf.urls import url
+        from . import views
+        return [
+            url(r'^printjobs/(?P<job_id>\w+)$',
+                views.PrintJobStatus.as_view()),
+        ]
+
     # needs_plugins = ['lino_xl.lib.appypod']
     # needs_plugins = ['lino.modlib.checkdata']
 
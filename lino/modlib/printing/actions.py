@@ -24,9 +24,9 @@ from lino.core import dbutils
 from lino.core.roles import SiteStaff
 from etgen.html import E
 from lino.utils.media import TmpMediaFile
-from lino.utils.pdf import merge_pdfs
 
 from .choicelists import BuildMethods
+from .jobs import build_and_merge, start_print_job
 
 # davlink = settings.SITE.plugins.get('davlink', None)
 # has_davlink = davlink is not None and settings.SITE.use_java
@@ -162,6 +162,11 @@ class CachedPrintAction(BasePrintAction):
                 ar.info("%s has been built.", leaf)
             else:
                 ar.info("Reused %s from cache.", leaf)
+                if not obj.is_print_cache_valid():
+                    # don't rebuild silently since the file may have
+                    # been edited by hand
+                    ar.info("%s may be outdated. "
+                            "Clear the cache to rebuild it.", leaf)
 
             url = mf.get_url(ar.request)
             self.notify_done(ar, bm, leaf, url, **kw)
@@ -170,6 +175,13 @@ class CachedPrintAction(BasePrintAction):
 
         def ok(ar2):
             # qs = [ar.actor.get_row_by_pk(pk) for pk in ar.selected_pks]
+            plugin = settings.SITE.plugins.printing
+            if ar.request is not None and \
+               len(ar.selected_rows) > plugin.background_threshold:
+                job_id = start_print_job(ar, ar.selected_rows)
+                ar2.success(
+                    open_url=plugin.build_plain_url('printjobs', job_id))
+                return
             mf = self.print_multiple(ar, ar.selected_rows)
             ar2.success(open_url=mf.get_url(ar.request))
             # kw.update(refresh_all=True)
@@ -178,18 +190,8 @@ class CachedPrintAction(BasePrintAction):
         ar.confirm(ok, msg, _("Are you sure?"))
 
     def print_multiple(self, ar, qs):
-        pdfs = []
-        for obj in qs:
-            # assert isinstance(obj,CachedPrintable)
-            if obj.printed_by_id is None:
-                obj.build_target(ar)
-            pdf = obj.get_target_name()
-            assert pdf is not None
-            pdfs.append(pdf)
-
         mf = TmpMediaFile(ar, 'pdf')
-        rt.makedirs_if_missing(os.path.dirname(mf.name))
-        merge_pdfs(pdfs, mf.name)
+        build_and_merge(ar, qs, mf.name)
         return mf
 
 
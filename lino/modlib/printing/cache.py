@@ -0,0 +1,190 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+"""The content-addressed store of built printable documents.
+
+This is used only for models which set :attr:`print_fingerprint_fields
+<lino.modlib.printing.mixins.CachedPrintable.print_fingerprint_fields>`.
+Every document built for such a :class:`CachedPrintable
+<lino.modlib.printing.mixins.CachedPrintable>` gets a *fingerprint*
+computed from the build method, the template file and the data of the
+database object (see :meth:`get_print_fingerprint
+<lino.modlib.printing.mixins.CachedPrintable.get_print_fingerprint>`).
+The fingerprint is written to a file next to the target file, and a
+copy of the built document is stored under its fingerprint in the
+:attr:`store directory <STORE_DIR>`.  When a document with the same
+fingerprint is requested again (for the same or another object), the
+stored copy is used instead of building it again.
+
+"""
+
+from __future__ import unicode_literals
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import shutil
+import hashlib
+
+from django.conf import settings
+
+from lino.api import rt
+
+STORE_DIR = 'fingerprints'
+"The name of the store directory below the media cache directory."
+
+stats = dict(hits=0, misses=0, stale=0, evicted=0)
+"""The numbers of cache hits, misses, stale documents and evicted files
+since the start of this process.
+
+"""
+
+
+def file_fingerprint(filename):
+    """Return a string which changes when the content of the given file
+    changes.  This uses the modification time and size rather than
+    the content for performance reasons.
+
+    """
+    if not filename:
+        return ''
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return ''
+    return "{}:{}:{}".format(filename, st.st_mtime, st.st_size)
+
+
+def make_fingerprint(*parts):
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(repr(p).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def get_cache_root():
+    return os.path.join(settings.MEDIA_ROOT, 'cache')
+
+
+def get_store_root():
+    return os.path.join(get_cache_root(), STORE_DIR)
+
+
+def get_stored_name(bm, fingerprint):
+    return os.path.join(
+        get_store_root(), bm.value, fingerprint + bm.target_ext)
+
+
+def fingerprint_file(target):
+    return target + '.fingerprint'
+
+
+def read_fingerprint(target):
+    """Return the fingerprint of the document which was last built to the
+    given target file, or `None`.
+
+    """
+    try:
+        with open(fingerprint_file(target)) as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def write_fingerprint(target, fingerprint):
+    with open(fingerprint_file(target), 'w') as f:
+        f.write(fingerprint)
+
+
+def _copy(src, dst):
+    # Don't use hard links: a target may get modified in place
+    # (e.g. via WebDAV), which must not change the stored copy.
+    if os.path.exists(dst):
+        os.remove(dst)
+    shutil.copy(src, dst)
+
+
+def reuse(bm, fingerprint, target):
+    """If there is a stored document with the given fingerprint, copy it
+    to the `target` and return its modification time.  Otherwise
+    return `None`.
+
+    """
+    fn = get_stored_name(bm, fingerprint)
+    if not os.path.exists(fn):
+        stats['misses'] += 1
+        return None
+    rt.makedirs_if_missing(os.path.dirname(target))
+    _copy(fn, target)
+    write_fingerprint(target, fingerprint)
+    stats['hits'] += 1
+    return os.path.getmtime(target)
+
+
+def store(bm, fingerprint, target):
+    """Store a copy of the document which has just been built to the
+    `target` file under the given fingerprint.
+
+    """
+    fn = get_stored_name(bm, fingerprint)
+    rt.makedirs_if_missing(os.path.dirname(fn))
+    _copy(target, fn)
+    write_fingerprint(target, fingerprint)
+
+
+def discard(bm, target):
+    """Forget the document which was last built to the given target
+    file, i.e. remove its fingerprint file and its stored copy, so
+    that the next build request really builds it.
+
+    """
+    fp = read_fingerprint(target)
+    if fp is None:
+        return
+    for fn in (get_stored_name(bm, fp), fingerprint_file(target)):
+        try:
+            os.remove(fn)
+        except OSError:
+            pass
+
+
+def evict(max_size):
+    """Remove the least recently used files from the store directory
+    until their total size is below `max_size` bytes.
+
+    Other files below the media cache directory are not touched.  The
+    targets of cached printables are separate copies, so evicting a
+    stored document only means that it will be built again when
+    needed.
+
+    """
+    files = []
+    total = 0
+    for root, dirs, names in os.walk(get_store_root()):
+        for name in names:
+            fn = os.path.join(root, name)
+            try:
+                st = os.stat(fn)
+            except OSError:
+                continue
+            files.append((max(st.st_atime, st.st_mtime), st.st_size, fn))
+            total += st.st_size
+    if total <= max_size:
+        return 0
+    files.sort()
+    count = 0
+    for t, size, fn in files:
+        if total <= max_size:
+            break
+        try:
+            os.remove(fn)
+        except OSError:
+            continue
+        total -= size
+        count += 1
+    stats['evicted'] += count
+    logger.info("Evicted %d files from print store (%d bytes remaining).",
+                count, total)
+    return count
@@ -35,6 +35,7 @@ from django.template.loader import select_template
 
 from lino.core.choicelists import ChoiceList, Choice
 from lino.utils.media import MediaFile
+from .cache import file_fingerprint
 from lino.api import rt, _
 
 try:
@@ -74,6 +75,15 @@ class BuildMethod(Choice):
     def build(self, ar, action, elem):
         raise NotImplementedError
 
+    def get_template_fingerprint(self, action, elem):
+        """Return a string which changes when the template used for
+        building the given object changes.  Used by
+        :meth:`get_print_fingerprint
+        <lino.modlib.printing.mixins.CachedPrintable.get_print_fingerprint>`.
+
+        """
+        return ''
+
 
 class TemplatedBuildMethod(BuildMethod):
 
@@ -120,6 +130,11 @@ class DjangoBuildMethod(TemplatedBuildMethod):
             raise Exception(
                 "Error while loading template for %s : %s" % (tpls2, e))
 
+    def get_template_fingerprint(self, action, elem):
+        tpl = self.get_template(action, elem)
+        origin = getattr(tpl, 'origin', None)
+        return file_fingerprint(getattr(origin, 'name', None))
+
     # ,MEDIA_URL=settings.MEDIA_URL):
     def render_template(self, elem, tpl, **context):
         context.update(
@@ -200,6 +215,9 @@ class SimpleBuildMethod(TemplatedBuildMethod):
             raise Warning("No file %s in %s" % (tpl_leaf, groups))
         return tplfile
 
+    def get_template_fingerprint(self, action, elem):
+        return file_fingerprint(self.get_template_file(None, action, elem))
+
     def build(self, ar, action, elem):
         # if elem is None:
             # return
@@ -0,0 +1,210 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+"""Building the printable documents of many database objects in parallel
+and merging them into a single PDF file, optionally as a background
+job.
+
+A background job runs in a thread of the web server process which
+received the request.  It builds the documents one after the other
+(never in a pool of worker processes, because forking a threaded web
+server process is not safe) and uses its own session, not the request
+which started it.
+
+The status of a background job is stored in the Django cache, so the
+view which shows the progress must be served by a process which
+uses the same cache (i.e. not the default local-memory cache when
+there are several server processes).  A background job gets lost
+when its server process is stopped or recycled.  The status of such
+a job reports an error after :data:`JOB_STALE_TIMEOUT` seconds
+without progress.
+
+"""
+
+from __future__ import unicode_literals
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import six
+import time
+import uuid
+import threading
+import multiprocessing
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import translation
+
+from lino.api import rt
+from lino.core.utils import full_model_name, resolve_model
+from lino.utils.media import MediaFile
+from lino.utils.pdf import PdfMerger
+
+CACHE_KEY = 'lino.printing.job.'
+
+JOB_TIMEOUT = 24 * 3600
+
+JOB_STALE_TIMEOUT = 15 * 60
+
+
+def _build_job(job):
+    # Runs in a worker process of the pool started by build_and_merge().
+    model_name, pk, username = job
+    obj = resolve_model(model_name).objects.get(pk=pk)
+    ar = settings.SITE.login(username)
+    obj.build_target(ar)
+    return obj.get_target_name()
+
+
+def build_and_merge(ar, objects, output_name, progress=None,
+                    processes=1):
+    """Build the cached printable documents of the given database
+    objects if necessary and merge them into the PDF file
+    `output_name`.
+
+    By default the documents are built in the calling process, one
+    after the other.  When `processes` is greater than 1, they are
+    built by a pool of that many worker processes, each using its own
+    database connection.  Specify `None` for using
+    :attr:`build_processes
+    <lino.modlib.printing.Plugin.build_processes>`.  At most
+    :attr:`max_pending_builds
+    <lino.modlib.printing.Plugin.max_pending_builds>` documents are
+    submitted to the pool at a time, and every document is merged as
+    soon as it and its predecessors are ready.
+
+    Use a pool only from a command-line context: it closes the
+    database connections of the calling process, and forking a web
+    server process is not safe.  So `processes` is ignored when `ar`
+    has a web request.
+
+    `progress` is an optional callable which gets called with the
+    number of merged documents and the total number of documents
+    after each document.
+
+    """
+    plugin = settings.SITE.plugins.printing
+    if processes is None:
+        processes = plugin.build_processes
+    if ar.request is not None:
+        processes = 1
+    objects = list(objects)
+    total = len(objects)
+    u = ar.get_user()
+    username = u.username if u.pk else None
+    todo = [obj for obj in objects if obj.printed_by_id is None]
+    pool = None
+    if processes > 1 and len(todo) > 1:
+        # the worker processes must not share our connection
+        connections.close_all()
+        pool = multiprocessing.Pool(processes)
+
+    merger = PdfMerger()
+    pending = deque()  # file names or AsyncResult instances
+    done = [0]
+
+    def merge(limit):
+        while len(pending) > limit:
+            r = pending.popleft()
+            if not isinstance(r, six.string_types):
+                r = r.get()
+            assert r is not None
+            merger.add(r)
+            done[0] += 1
+            if progress is not None:
+                progress(done[0], total)
+
+    try:
+        for obj in objects:
+            if obj.printed_by_id is None:
+                if pool is None:
+                    obj.build_target(ar)
+                    pending.append(obj.get_target_name())
+                else:
+                    pending.append(pool.apply_async(_build_job, ((
+                        full_model_name(obj.__class__), obj.pk, username),)))
+            else:
+                pending.append(obj.get_target_name())
+            merge(plugin.max_pending_builds)
+        merge(0)
+    except Exception:
+        if pool is not None:
+            pool.terminate()
+            pool = None
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    rt.makedirs_if_missing(os.path.dirname(output_name))
+    merger.write(output_name)
+    return total
+
+
+def get_job_status(job_id):
+    """Return the status of the given background job as a `dict` with the
+    keys `user_id`, `total`, `done`, `url` and `error`, or `None` if
+    there is no such job.
+
+    """
+    status = cache.get(CACHE_KEY + job_id)
+    if status is not None and status['url'] is None \
+       and status['error'] is None \
+       and time.time() - status['updated'] > JOB_STALE_TIMEOUT:
+        status.update(error="The print job has been interrupted.")
+    return status
+
+
+def set_job_status(job_id, status):
+    status.update(updated=time.time())
+    cache.set(CACHE_KEY + job_id, status, JOB_TIMEOUT)
+
+
+def start_print_job(ar, objects):
+    """Start a thread which runs :func:`build_and_merge` for the given
+    objects and return the id of this background job.
+
+    The thread doesn't use the given action request, which is done
+    when the response has been sent.  It opens its own session as the
+    same user and reads the objects again from the database.
+
+    """
+    jobs = [(full_model_name(obj.__class__), obj.pk) for obj in objects]
+    job_id = uuid.uuid4().hex
+    ip = ar.request.META.get('REMOTE_ADDR', 'unknown_ip')
+    mf = MediaFile(False, 'cache', 'appypdf', ip,
+                   "{}-{}.pdf".format(ar.actor, job_id))
+    u = ar.get_user()
+    username = u.username if u.pk else None
+    lang = translation.get_language()
+    status = dict(user_id=u.pk, total=len(jobs), done=0,
+                  url=None, error=None)
+    set_job_status(job_id, status)
+
+    def progress(done, total):
+        status.update(done=done)
+        set_job_status(job_id, status)
+
+    def run():
+        try:
+            with translation.override(lang):
+                ses = settings.SITE.login(username)
+                objs = [resolve_model(model_name).objects.get(pk=pk)
+                        for model_name, pk in jobs]
+                build_and_merge(ses, objs, mf.name, progress, processes=1)
+            status.update(url=mf.get_url(None))
+        except Exception as e:
+            logger.exception(e)
+            status.update(error=str(e))
+        finally:
+            set_job_status(job_id, status)
+            connections.close_all()
+
+    t = threading.Thread(target=run, name="print job " + job_id)
+    t.daemon = True
+    t.start()
+    return job_id
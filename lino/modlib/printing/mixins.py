@@ -24,6 +24,7 @@ from lino.mixins.duplicable import Duplicable
 
 
 from .choicelists import BuildMethods
+from . import cache
 from .actions import (DirectPrintAction, CachedPrintAction,
                       ClearCacheAction, EditTemplate)
 
@@ -151,6 +152,20 @@ class CachedPrintable(Duplicable, Printable):
 
     build_method = BuildMethods.field(blank=True, null=True)
 
+    print_fingerprint_fields = None
+    """The names of the fields which influence the content of the
+    printed document, or `None` (the default) to never reuse a
+    document built for another object.
+
+    When this is set, every built document is kept in the
+    :mod:`print store <lino.modlib.printing.cache>`, and an object
+    whose fingerprint (see :meth:`get_print_fingerprint`) equals that
+    of a stored document gets a copy of it instead of building it
+    again.  Don't list volatile fields like a modification timestamp
+    here.
+
+    """
+
     def full_clean(self, *args, **kwargs):
         if not self.build_method:
             self.build_method = self.get_default_build_method()
@@ -188,14 +203,96 @@ class CachedPrintable(Duplicable, Printable):
         return datetime.datetime.fromtimestamp(t)
 
     def clear_cache(self):
+        filename = self.get_target_name()
+        if filename:
+            cache.discard(self.get_build_method(), filename)
         self.build_time = None
         self.save()
 
+    def get_print_fingerprint_data(self):
+        """Return the data of this object which influences the content of
+        its printed document.  Used by :meth:`get_print_fingerprint`.
+
+        The default returns the values of the fields named in
+        :attr:`print_fingerprint_fields`.  Models whose documents show
+        data of related objects must override this and add that data,
+        otherwise a document would be reused after a related object
+        has changed.
+
+        """
+        return [(name, getattr(self, name))
+                for name in self.print_fingerprint_fields]
+
+    def get_print_fingerprint(self, bm=None):
+        """Return a hash of everything which influences the content of the
+        document built for this object: the build method, the
+        template file, the print language and the data returned by
+        :meth:`get_print_fingerprint_data`.
+
+        Note that other templates included by the main template are
+        not part of the fingerprint.  Use the :class:`ClearCacheAction
+        <lino.modlib.printing.actions.ClearCacheAction>` after changing
+        them.
+
+        """
+        if bm is None:
+            bm = self.get_build_method()
+        action = self.__class__.do_print
+        return cache.make_fingerprint(
+            self._meta.label, bm.value,
+            bm.get_template_fingerprint(action, self),
+            self.get_print_language(),
+            self.get_print_fingerprint_data())
+
+    def is_print_cache_valid(self):
+        """Return False if the document of this object has been built but
+        its fingerprint changed since then.
+
+        Returns True when there is no fingerprint to compare with,
+        i.e. when :attr:`print_fingerprint_fields` is `None` or when
+        the document has been built before the fingerprint was
+        recorded.
+
+        """
+        if self.print_fingerprint_fields is None:
+            return True
+        filename = self.get_target_name()
+        if not filename:
+            return True
+        fp = cache.read_fingerprint(filename)
+        if fp is None:
+            return True
+        if fp != self.get_print_fingerprint():
+            cache.stats['stale'] += 1
+            return False
+        return True
+
     def build_target(elem, ar):
+        """Build the document of this object.
+
+        When :attr:`print_fingerprint_fields` is set, reuse a
+        document with the same fingerprint if there is one in the
+        :mod:`print store <lino.modlib.printing.cache>`.
+
+        """
         bm = elem.get_build_method()
-        t = bm.build(ar, elem.__class__.do_print, elem)
-        if t is None:
-            raise Exception("%s : build() returned None?!")
+        action = elem.__class__.do_print
+        # CachedPrintAction.before_build() doesn't build when there is
+        # a build_time.
+        elem.build_time = None
+        target = bm.get_target_name(action, elem)
+        if elem.print_fingerprint_fields is None:
+            t = bm.build(ar, action, elem)
+            if t is None:
+                raise Exception("%s : build() returned None?!")
+        else:
+            fp = elem.get_print_fingerprint(bm)
+            t = cache.reuse(bm, fp, target)
+            if t is None:
+                t = bm.build(ar, action, elem)
+                if t is None:
+                    raise Exception("%s : build() returned None?!")
+                cache.store(bm, fp, target)
         # t is a file timestamp as returned by os.path.getmtime()
         # expressend as the number of seconds since the epoch.
         t = datetime.datetime.fromtimestamp(t)
@@ -249,7 +346,14 @@ class TypedPrintable(CachedPrintable):
 class CachedPrintableChecker(Checker):
     model = CachedPrintable
     verbose_name = _("Check for missing target files")
-    
+
+    def get_queryset_problems(self, qs, fix=False):
+        # only printables which have been built can have a problem
+        for obj in qs.filter(build_time__isnull=False).iterator():
+            problems = list(self.get_checkdata_problems(obj, fix))
+            if len(problems):
+                yield (obj, problems)
+
     def get_checkdata_problems(self, obj, fix=False):
         if obj.build_time is not None:
             t = obj.get_cache_mtime()
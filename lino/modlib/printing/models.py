@@ -4,3 +4,13 @@
 
 from .mixins import *
 from .choicelists import *
+
+from lino.api import dd
+from . import cache
+
+
+@dd.schedule_often(every=3600)
+def evict_print_cache():
+    max_size = dd.plugins.printing.cache_max_size
+    if max_size is not None:
+        cache.evict(max_size)
@@ -0,0 +1,46 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+"""Views for `lino.modlib.printing`.
+
+"""
+
+from __future__ import unicode_literals
+
+from django import http
+from django.core.exceptions import PermissionDenied
+from django.utils.html import escape
+from django.utils.translation import ugettext as _
+from django.views.generic import View
+
+from .jobs import get_job_status
+
+
+class PrintJobStatus(View):
+    """Show the progress of a background print job.
+
+    Returns the status as JSON if the request has a parameter
+    ``fmt=json``.  Otherwise returns a page which reloads itself until
+    the job is done, and then redirects to the resulting PDF file.
+
+    """
+    def get(self, request, job_id=None):
+        status = get_job_status(job_id)
+        if status is None:
+            raise http.Http404("No print job {}".format(job_id))
+        if status['user_id'] != getattr(request.user, 'pk', None):
+            raise PermissionDenied("Not your print job")
+        if request.GET.get('fmt') == 'json':
+            return http.JsonResponse(status)
+        if status['url'] is not None:
+            return http.HttpResponseRedirect(status['url'])
+        if status['error'] is not None:
+            msg = escape(status['error'])
+            refresh = ""
+        else:
+            msg = _("Built {0} of {1} documents...").format(
+                status['done'], status['total'])
+            refresh = '<meta http-equiv="refresh" content="2">'
+        return http.HttpResponse(
+            "<html><head>{0}</head><body><p>{1}</p></body></html>".format(
+                refresh, msg))
@@ -0,0 +1,81 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Adds a search index for the quick search of selected models.
+
+The quick search of a model having :attr:`use_search_index
+<lino.core.model.Model.use_search_index>` set to `True` is answered
+by the index instead of looking into every one of its
+:attr:`quick_search_fields
+<lino.core.model.Model.quick_search_fields>`.  The index is updated
+when a row is created, modified or deleted via the web interface.
+Run :manage:`buildsearchindex` after changing data by other means.
+
+The index is used also by the string filters of grid columns showing
+a foreign key to such a model.  The string filter of a column showing
+a character field still looks into that field using a `LIKE`
+condition (see :func:`lino.core.dbtables.add_gridfilters`).
+
+.. autosummary::
+   :toctree:
+
+    models
+    indexes
+
+"""
+
+from lino.api import ad, _
+
+
+class Plugin(ad.Plugin):
+    "See :doc:`/dev/plugins`."
+
+    verbose_name = _("Search index")
+
+    needs_plugins = ['lino.modlib.gfks']
+
+    backend = 'words'
+    """Which search index to use (see :mod:`lino.modlib.search.indexes`).
+
+    The default value ``'words'`` stores the words of every row in a
+    database table and works with every database.  ``'fts5'`` uses
+    SQLite FTS5 virtual tables and works only on SQLite.
+    """
+
+    chunk_size = 1000
+    """The number of rows to read and write at once when rebuilding
+    the index."""
+
+    _index = None
+
+    def get_index(self):
+        """Return the search index of this site."""
+        if self._index is None:
+            from .indexes import make_search_index
+            self._index = make_search_index(self)
+        return self._index
+
+    def get_indexed_models(self):
+        """Return a list of the models using the search index."""
+        from django.apps import apps
+        return [m for m in apps.get_models()
+                if getattr(m, '_search_index', None) is not None]
+
+    def post_site_startup(self, site):
+        from django.apps import apps
+        index = self.get_index()
+        for m in apps.get_models():
+            # set it explicitly on every model because it must not be
+            # inherited from an MTI parent
+            if getattr(m, 'use_search_index', False) \
+               and not m._meta.proxy:
+                m._search_index = index
+            else:
+                m._search_index = None
+
+    def setup_explorer_menu(self, site, user_type, m):
+        if self.backend == 'words':
+            g = site.plugins.system
+            m = m.add_menu(g.app_label, g.verbose_name)
+            m.add_action('search.SearchWords')
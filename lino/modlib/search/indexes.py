@@ -0,0 +1,266 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Defines the search indexes used by the :mod:`lino.modlib.search`
+plugin.
+
+The index is selected by :attr:`backend
+<lino.modlib.search.Plugin.backend>`.  Both indexes store the words
+of the :attr:`quick_search_fields
+<lino.core.model.Model.quick_search_fields>` of every row of a model
+having :attr:`use_search_index
+<lino.core.model.Model.use_search_index>` set to `True`.
+
+A :class:`WordsIndex` stores every word in a row of the
+:class:`SearchWord <lino.modlib.search.models.SearchWord>` table,
+which is indexed by model and word.  It works on every database.
+
+A :class:`FTS5Index` stores the text in one `FTS5
+<https://www.sqlite.org/fts5.html>`__ virtual table per model.  It
+works only when the default database is SQLite and your SQLite has
+been compiled with FTS5.
+
+Using a search index changes the meaning of a quick search: a row
+matches when each word of the search text is the *beginning* of some
+word of the row (instead of being contained anywhere in one of its
+fields).
+
+"""
+
+from __future__ import unicode_literals
+from builtins import object
+
+import re
+import six
+
+from django.db import connection, models, transaction
+from django.db.models.expressions import RawSQL
+
+from lino.api import rt
+from lino.core.choicelists import Choice
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def split_words(s):
+    """Return the list of lowercased words of the given text."""
+    return WORD_RE.findall(s.lower())
+
+
+def get_field_value(obj, name):
+    for n in name.split('__'):
+        obj = getattr(obj, n, None)
+        if obj is None:
+            return None
+    return obj
+
+
+def get_search_text(model, obj):
+    """Return the text to be indexed for the given object as a row of
+    the given model.
+
+    """
+    chunks = []
+    for fld in model.quick_search_fields:
+        v = get_field_value(obj, fld.name)
+        if v is None:
+            continue
+        if isinstance(v, Choice):
+            # the database value is what icontains would look at
+            v = v.value
+        chunks.append(six.text_type(v))
+    return ' '.join(chunks)
+
+
+def get_indexed_models(obj):
+    """Return the indexed models of which the given object is a row,
+    i.e. its own model and those of its MTI parents.
+
+    """
+    return [m for m in [obj.__class__] + obj._meta.get_parent_list()
+            if getattr(m, '_search_index', None) is not None]
+
+
+class SearchIndex(object):
+    """Base class for search indexes."""
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+
+    def setup(self, models_list):
+        """Create whatever database structures are needed for indexing
+        the given models.  Called after :manage:`initdb` and by
+        :manage:`buildsearchindex`.
+
+        """
+        pass
+
+    def get_owner_type(self, model):
+        return rt.models.contenttypes.ContentType.objects.get_for_model(
+            model)
+
+    def update(self, obj):
+        """Update the index for the given database object."""
+        for m in get_indexed_models(obj):
+            with transaction.atomic():
+                self.remove_row(m, obj.pk)
+                self.add_rows(m, [obj])
+
+    def remove(self, obj):
+        """Remove the given database object from the index."""
+        for m in get_indexed_models(obj):
+            self.remove_row(m, obj.pk)
+
+    def rebuild(self, model):
+        """Rebuild the index of the given model and return the number of
+        indexed rows.
+
+        """
+        n = 0
+        chunk = []
+        with transaction.atomic():
+            self.clear(model)
+            qs = model.objects.order_by('pk')
+            for obj in qs.iterator(chunk_size=self.chunk_size):
+                chunk.append(obj)
+                if len(chunk) >= self.chunk_size:
+                    self.add_rows(model, chunk)
+                    n += len(chunk)
+                    chunk = []
+            if chunk:
+                self.add_rows(model, chunk)
+                n += len(chunk)
+        return n
+
+    def get_filter(self, model, search_text, prefix=''):
+        """Return a filter expression which selects the rows of the given
+        model matching the given search text, or `None` if the search
+        text contains no words (e.g. only punctuation), in which case
+        the index cannot answer the query.
+
+        """
+        raise NotImplementedError()
+
+    def add_rows(self, model, objects):
+        raise NotImplementedError()
+
+    def remove_row(self, model, pk):
+        raise NotImplementedError()
+
+    def clear(self, model):
+        raise NotImplementedError()
+
+
+class WordsIndex(SearchIndex):
+    """Store the words of every row in the :class:`SearchWord
+    <lino.modlib.search.models.SearchWord>` table.
+
+    """
+
+    def add_rows(self, model, objects):
+        SearchWord = rt.models.search.SearchWord
+        max_length = SearchWord._meta.get_field('word').max_length
+        ct = self.get_owner_type(model)
+        words = []
+        for obj in objects:
+            seen = set()
+            for w in split_words(get_search_text(model, obj)):
+                w = w[:max_length]
+                if w not in seen:
+                    seen.add(w)
+                    words.append(SearchWord(
+                        owner_type=ct, owner_id=obj.pk, word=w))
+        SearchWord.objects.bulk_create(words, batch_size=self.chunk_size)
+
+    def remove_row(self, model, pk):
+        rt.models.search.SearchWord.objects.filter(
+            owner_type=self.get_owner_type(model), owner_id=pk).delete()
+
+    def clear(self, model):
+        rt.models.search.SearchWord.objects.filter(
+            owner_type=self.get_owner_type(model)).delete()
+
+    def get_filter(self, model, search_text, prefix=''):
+        words = split_words(search_text)
+        if len(words) == 0:
+            return None
+        SearchWord = rt.models.search.SearchWord
+        ct = self.get_owner_type(model)
+        flt = models.Q()
+        for w in words:
+            qs = SearchWord.objects.filter(owner_type=ct, word__startswith=w)
+            kw = {prefix + 'pk__in': qs.values('owner_id')}
+            flt &= models.Q(**kw)
+        return flt
+
+
+class FTS5Index(SearchIndex):
+    """Store the text of every row in a SQLite FTS5 virtual table.
+
+    Every indexed model has its own table, named after the table of
+    the model with a suffix ``_fts``.  The `rowid` of the virtual
+    table is the primary key of the row.
+
+    """
+
+    def setup(self, models_list):
+        """Create the virtual tables of the given models if they don't
+        exist.
+
+        """
+        if connection.vendor != 'sqlite':
+            raise Exception(
+                "The fts5 search index requires a SQLite database")
+        with connection.cursor() as cursor:
+            for m in models_list:
+                cursor.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS {} "
+                    "USING fts5(text)".format(self.get_table_name(m)))
+
+    def get_table_name(self, model):
+        """Return the name of the virtual table for the given model."""
+        return model._meta.db_table + '_fts'
+
+    def add_rows(self, model, objects):
+        sql = "INSERT INTO {} (rowid, text) VALUES (%s, %s)".format(
+            self.get_table_name(model))
+        rows = [(obj.pk, get_search_text(model, obj)) for obj in objects]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def remove_row(self, model, pk):
+        sql = "DELETE FROM {} WHERE rowid = %s".format(
+            self.get_table_name(model))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [pk])
+
+    def clear(self, model):
+        sql = "DELETE FROM {}".format(self.get_table_name(model))
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+
+    def get_filter(self, model, search_text, prefix=''):
+        words = split_words(search_text)
+        if len(words) == 0:
+            return None
+        name = self.get_table_name(model)
+        # every word is a quoted prefix query, and FTS5 combines them
+        # with an implicit AND.
+        match = ' '.join(['"{}"*'.format(w) for w in words])
+        sql = "SELECT rowid FROM {0} WHERE {0} MATCH %s".format(name)
+        kw = {prefix + 'pk__in': RawSQL(sql, (match,))}
+        return models.Q(**kw)
+
+
+def make_search_index(plugin):
+    """Instantiate the search index specified by :attr:`backend
+    <lino.modlib.search.Plugin.backend>`.
+
+    """
+    spec = plugin.backend
+    if spec == 'words':
+        return WordsIndex(plugin.chunk_size)
+    if spec == 'fts5':
+        return FTS5Index(plugin.chunk_size)
+    raise Exception("Invalid search backend {!r}".format(spec))
@@ -0,0 +1,65 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD, see LICENSE for more details.
+"""Defines the :manage:`buildsearchindex` management command:
+
+.. management_command:: buildsearchindex
+
+.. py2rst::
+
+  from lino.modlib.search.management.commands.buildsearchindex \
+      import Command
+  print(Command.help)
+
+"""
+
+from __future__ import unicode_literals, print_function
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lino.api import dd, rt
+
+
+class Command(BaseCommand):
+    args = "[app1.Model1] [app2.Model2] ..."
+    help = """
+
+    Rebuild the search index.
+
+    If no arguments are given, rebuild it for all models which use
+    the search index.  Otherwise every positional argument is
+    expected to be a model name in the form `app_label.ModelName`,
+    and only these models are being rebuilt.
+
+    Rows are read and written in chunks, one transaction per model.
+
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help='the models to index')
+
+    def handle(self, *args, **options):
+        rt.startup()
+        plugin = dd.plugins.search
+        indexed = plugin.get_indexed_models()
+        names = options.get('models') or args
+        if names:
+            models_list = []
+            for name in names:
+                m = dd.resolve_model(name, strict=True)
+                if m not in indexed:
+                    raise CommandError(
+                        "{} does not use the search index".format(name))
+                models_list.append(m)
+        else:
+            models_list = indexed
+        index = plugin.get_index()
+        index.setup(models_list)
+        for m in models_list:
+            t0 = time.time()
+            n = index.rebuild(m)
+            dd.logger.info(
+                "Indexed %d %s in %.2f seconds.", n,
+                m._meta.verbose_name_plural, time.time() - t0)
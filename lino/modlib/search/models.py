@@ -0,0 +1,82 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Database models for :mod:`lino.modlib.search`.
+
+"""
+
+from __future__ import unicode_literals
+from builtins import object
+
+from django.db import models
+from django.db.models.signals import post_migrate
+
+from lino.api import dd, rt, _
+from lino.modlib.gfks.mixins import Controllable
+
+from .indexes import get_indexed_models
+
+
+@dd.python_2_unicode_compatible
+class SearchWord(Controllable):
+    """A word of a database row in the search index.  Used only when
+    :attr:`backend <lino.modlib.search.Plugin.backend>` is
+    ``'words'``.
+
+    """
+    class Meta(object):
+        app_label = 'search'
+        verbose_name = _("Search word")
+        verbose_name_plural = _("Search words")
+        index_together = [('owner_type', 'word')]
+
+    allow_merge_action = False
+
+    word = models.CharField(_("Word"), max_length=100)
+
+    def __str__(self):
+        return self.word
+
+
+class SearchWords(dd.Table):
+    model = 'search.SearchWord'
+    required_roles = dd.login_required(dd.SiteAdmin)
+    column_names = "word owner_type owner_id"
+
+
+@dd.receiver(dd.on_ui_created)
+def on_row_created(sender=None, **kw):
+    if get_indexed_models(sender):
+        dd.plugins.search.get_index().update(sender)
+
+
+@dd.receiver(dd.on_ui_updated)
+def on_row_updated(sender=None, watcher=None, **kw):
+    obj = watcher.watched
+    models_list = get_indexed_models(obj)
+    if not models_list:
+        return
+    changed = set([k for k, old, new in watcher.get_updates()])
+    for m in models_list:
+        for fld in m.quick_search_fields:
+            # a remote field may have changed without a change here
+            if '__' in fld.name or fld.name in changed:
+                dd.plugins.search.get_index().update(obj)
+                return
+
+
+@dd.receiver(dd.pre_ui_delete)
+def on_row_deleted(sender=None, **kw):
+    if get_indexed_models(sender):
+        dd.plugins.search.get_index().remove(sender)
+
+
+@dd.receiver(post_migrate)
+def setup_search_index(sender=None, **kw):
+    # sent for every app, but we need to do it only once
+    if sender.label != 'search':
+        return
+    rt.startup()
+    plugin = dd.plugins.search
+    plugin.get_index().setup(plugin.get_indexed_models())
@@ -8,6 +8,7 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from lino.api import rt
+from lino.modlib.summaries.models import update_dirty_summaries
 
 
 class Command(BaseCommand):
@@ -24,7 +25,17 @@ class Command(BaseCommand):
 
     """
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dirty', action='store_true', dest='dirty',
+            default=False,
+            help="Update only the summary periods which have been "
+            "marked as dirty since the last run.")
+
     def handle(self, *args, **options):
+        if options['dirty']:
+            update_dirty_summaries()
+            return
         ses = rt.login()
         ses.run(settings.SITE.site_config.check_all_summaries)
         # checksummaries(args=args)
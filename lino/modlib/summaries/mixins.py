@@ -5,8 +5,10 @@
 from __future__ import unicode_literals
 from builtins import range
 from builtins import object
+import six
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import ExtractYear, ExtractMonth
 
 from lino.api import dd, _
 
@@ -14,6 +16,69 @@ from lino.api import dd, _
 # SUMMARY_PERIODS = ['yearly', 'monthly', 'timeless']
 SUMMARY_PERIODS = ['yearly', 'monthly']
 
+class SummaryAggregate(object):
+    """Declares a series of summary fields which can be computed using
+    SQL aggregates on a given source model.
+
+    Instances of this are yielded by the
+    :meth:`get_summary_aggregates
+    <MonthlySummarized.get_summary_aggregates>` method of a summary
+    model.
+
+    `model` is the source model (or its name as a string),
+    `date_field` the name of the date field which defines the period
+    of a source row, and `master_field` the lookup path from a source
+    row to the master of the summary (`None` if the summary model has
+    no master).  `filter` is an optional :class:`Q
+    <django.db.models.Q>` object to apply to the source rows.  The
+    keyword arguments map summary field names to aggregate
+    expressions, e.g. ``active_tickets=models.Count('id')``.
+
+    """
+    def __init__(self, model, date_field, master_field=None,
+                 filter=None, **aggregates):
+        self.model = model
+        self.date_field = date_field
+        self.master_field = master_field
+        self.filter = filter
+        self.aggregates = aggregates
+
+    def get_queryset(self):
+        if isinstance(self.model, six.string_types):
+            self.model = dd.resolve_model(self.model, strict=True)
+        qs = self.model.objects.all()
+        if self.filter is not None:
+            qs = qs.filter(self.filter)
+        return qs
+
+    def get_values(self, summary_period, master=None):
+        """Yield a tuple `((master_id, year, month), values)` for every
+        period of every master having source rows, where `values`
+        is a dict of summary field values.
+
+        """
+        config = dd.plugins.summaries
+        qs = self.get_queryset()
+        qs = qs.filter(**{
+            self.date_field + '__year__gte': config.start_year,
+            self.date_field + '__year__lte': config.end_year})
+        groups = []
+        if self.master_field is not None:
+            if master is not None:
+                qs = qs.filter(**{self.master_field: master})
+            groups.append(self.master_field)
+        qs = qs.annotate(_year=ExtractYear(self.date_field))
+        groups.append('_year')
+        if summary_period == 'monthly':
+            qs = qs.annotate(_month=ExtractMonth(self.date_field))
+            groups.append('_month')
+        qs = qs.values(*groups).annotate(**self.aggregates).order_by()
+        for row in qs:
+            key = (row.pop(self.master_field, None), row.pop('_year'),
+                   row.pop('_month', None))
+            yield key, row
+
+
 class ComputeResults(dd.Action):
     label = _("Update summary data")
     # icon_name = 'lightning'
@@ -62,6 +127,15 @@ class Summarized(dd.Model):
         for obj in cls.get_for_filter(**flt):
             obj.compute_summary_values()
 
+    @classmethod
+    def update_by_aggregates(cls, **flt):
+        """Update the summaries for the given filter using SQL aggregates.
+        Return `False` if this model doesn't support it, in which case
+        the caller must fall back to :meth:`compute_summary_values`.
+
+        """
+        return False
+
     # @classmethod
     # def get_summary_masters(cls):
     #     yield None
@@ -107,6 +181,8 @@ class SlaveSummarized(Summarized):
     def check_all_summaries(cls):
         if cls.delete_them_all:
             cls.objects.all().delete()
+        if cls.update_by_aggregates():
+            return
         for master in cls.get_summary_masters():
             cls.update_for_filter(master=master)
 
@@ -173,8 +249,116 @@ class MonthlySummarized(Summarized):
     #         options.update(hide_sum=True)
     #     return super(Summary, cls).get_widget_options(name, **options)
 
+    @classmethod
+    def get_summary_aggregates(cls):
+        """Yield a series of :class:`SummaryAggregate` instances which
+        together compute all summary fields of this model.
+
+        When this yields something, :meth:`update_for_filter`
+        computes all periods of all masters in a few SQL statements
+        instead of calling :meth:`compute_summary_values` on every
+        summary object.  The default implementation yields nothing,
+        so that :meth:`get_summary_collectors` is used.
+
+        """
+        return []
+
+    @classmethod
+    def get_summary_sources(cls):
+        """Yield a series of `(model, date_field, master_field)` tuples
+        describing the source rows of this summary.
+
+        This is used for marking summary periods as dirty when a
+        source row gets created, modified or deleted via the web
+        interface (see :func:`lino.modlib.summaries.models.update_dirty_summaries`).
+        The default implementation uses the declarations of
+        :meth:`get_summary_aggregates`.
+
+        A summary model which neither declares aggregates nor
+        overrides this method is never marked as dirty.  Its data is
+        then updated only by :manage:`checksummaries` and by the
+        daily run of :func:`checksummaries
+        <lino.modlib.summaries.models.checksummaries>`, as before.
+        Override this method in order to have it updated within a
+        few seconds after a change.  For example::
+
+            @classmethod
+            def get_summary_sources(cls):
+                yield (rt.models.cal.Event, 'start_date', 'user')
+
+        """
+        for agg in cls.get_summary_aggregates():
+            agg.get_queryset()  # resolve the model
+            yield (agg.model, agg.date_field, agg.master_field)
+
+    @classmethod
+    def update_by_aggregates(cls, **flt):
+        aggregates = list(cls.get_summary_aggregates())
+        if len(aggregates) == 0:
+            return False
+        master = flt.get('master', None)
+        is_slave = issubclass(cls, SlaveSummarized)
+        fields = set()
+        values = dict()
+        for agg in aggregates:
+            fields |= set(agg.aggregates.keys())
+            for key, row in agg.get_values(cls.summary_period, master):
+                if not is_slave:
+                    key = (None, ) + key[1:]
+                values.setdefault(key, {}).update(row)
+
+        def getkey(obj):
+            if is_slave:
+                return (obj.master_id, obj.year, obj.month)
+            return (None, obj.year, obj.month)
+
+        periods = set(cls.get_summary_periods())
+        existing = dict()
+        for obj in cls.objects.filter(**flt):
+            if (obj.year, obj.month) in periods:
+                existing[getkey(obj)] = obj
+        if cls.delete_them_all:
+            if is_slave:
+                if master is None:
+                    masters = cls.get_summary_masters().values_list(
+                        'pk', flat=True)
+                else:
+                    masters = [master.pk]
+            else:
+                masters = [None]
+            keys = [(m, year, month) for m in masters
+                    for year, month in cls.get_summary_periods()]
+        else:
+            keys = list(existing.keys())
+
+        to_create = []
+        to_update = []
+        for key in keys:
+            obj = existing.get(key, None)
+            if obj is None:
+                kw = dict(year=key[1], month=key[2])
+                if is_slave:
+                    kw.update(master_id=key[0])
+                obj = cls(**kw)
+                to_create.append(obj)
+            else:
+                to_update.append(obj)
+            obj.reset_summary_data()
+            for k, v in values.get(key, {}).items():
+                if v is not None:
+                    setattr(obj, k, v)
+        with transaction.atomic():
+            if len(to_create):
+                cls.objects.bulk_create(to_create, batch_size=1000)
+            if len(to_update):
+                cls.objects.bulk_update(
+                    to_update, list(fields), batch_size=1000)
+        return True
+
     @classmethod
     def update_for_filter(cls, **flt):
+        if cls.update_by_aggregates(**flt):
+            return
         for year, month in cls.get_summary_periods():
             flt.update(year=year, month=month)
             # obj = cls.get_for_period(**flt)
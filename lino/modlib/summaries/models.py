@@ -4,11 +4,36 @@
 
 from __future__ import unicode_literals, print_function
 
+from collections import OrderedDict
+
 from django.conf import settings
-# from django.db import models
+from django.db import models
 from lino.api import dd, rt, _
 
 from .mixins import UpdateSummariesByMaster, SlaveSummarized, Summarized
+from .mixins import MonthlySummarized
+
+
+class DirtyBucket(dd.Model):
+    """A summary period which needs to be recomputed because some of
+    its source rows have changed.
+
+    These are written when a source row is created, modified or
+    deleted via the web interface, and processed by
+    :func:`update_dirty_summaries`.
+
+    """
+    class Meta(object):
+        app_label = 'summaries'
+        verbose_name = _("Dirty summary period")
+        verbose_name_plural = _("Dirty summary periods")
+
+    allow_merge_action = False
+
+    summary_type = dd.ForeignKey('contenttypes.ContentType')
+    master_id = models.PositiveIntegerField(null=True)
+    year = models.IntegerField(null=True)
+    month = models.IntegerField(null=True)
 
 
 class CheckAllSummaries(dd.Action):
@@ -52,6 +77,135 @@ def masters_with_summaries():
     return summary_masters
 
 
+_summary_sources = None
+
+def get_summary_sources():
+    """Return a dict mapping each source model to a list of `(sm,
+    date_field, master_field)` tuples, where `sm` is a summary model.
+
+    """
+    global _summary_sources
+    if _summary_sources is None:
+        _summary_sources = dict()
+        for sm in rt.models_by_base(MonthlySummarized, toplevel_only=True):
+            for model, date_field, master_field in sm.get_summary_sources():
+                lst = _summary_sources.setdefault(model, [])
+                lst.append((sm, date_field, master_field))
+    return _summary_sources
+
+
+def resolve_path(obj, path):
+    for name in path.split('__'):
+        if obj is None:
+            return None
+        obj = getattr(obj, name, None)
+    return obj
+
+
+def mark_dirty(obj, original_state=None):
+    """Mark the summary periods affected by the given source row as
+    dirty.  `original_state` is the state before a modification (see
+    :class:`lino.core.diff.ChangeWatcher`).
+
+    """
+    sources = get_summary_sources().get(obj.__class__, None)
+    if not sources:
+        return
+    ContentType = rt.models.contenttypes.ContentType
+    buckets = set()
+    for sm, date_field, master_field in sources:
+        states = [(resolve_path(obj, date_field),
+                   resolve_path(obj, master_field) if master_field else None)]
+        if original_state is not None:
+            if master_field is None:
+                old_master = None
+            elif '__' in master_field:
+                old_master = states[0][1]
+            else:
+                old_master = original_state.get(master_field + '_id', None)
+            old_date = original_state.get(date_field, states[0][0])
+            states.append((old_date, old_master))
+        for date, master in states:
+            if date is None:
+                continue
+            if isinstance(master, models.Model):
+                master = master.pk
+            if sm.summary_period == 'monthly':
+                month = date.month
+            else:
+                month = None
+            buckets.add((sm, master, date.year, month))
+    DirtyBucket.objects.bulk_create([
+        DirtyBucket(
+            summary_type=ContentType.objects.get_for_model(sm),
+            master_id=master, year=year, month=month)
+        for sm, master, year, month in buckets])
+
+
+@dd.receiver(dd.on_ui_created)
+def on_source_created(sender=None, **kw):
+    mark_dirty(sender)
+
+
+@dd.receiver(dd.on_ui_updated)
+def on_source_updated(sender=None, watcher=None, **kw):
+    mark_dirty(watcher.watched, watcher.original_state)
+
+
+@dd.receiver(dd.pre_ui_delete)
+def on_source_deleted(sender=None, **kw):
+    mark_dirty(sender)
+
+
+def update_dirty_summaries():
+    """Recompute the summary periods which have been marked as dirty.
+
+    Multiple changes to the same period are coalesced.  Summary
+    models using :meth:`get_summary_aggregates
+    <lino.modlib.summaries.mixins.MonthlySummarized.get_summary_aggregates>`
+    get all their periods of a given master recomputed at once, the
+    others get only the dirty periods recomputed.
+
+    """
+    todo = OrderedDict()
+    last_id = None
+    for b in DirtyBucket.objects.order_by('id'):
+        lst = todo.setdefault((b.summary_type_id, b.master_id), set())
+        lst.add((b.year, b.month))
+        last_id = b.id
+    if last_id is None:
+        return
+    ContentType = rt.models.contenttypes.ContentType
+    for (ct_id, master_id), buckets in todo.items():
+        sm = ContentType.objects.get_for_id(ct_id).model_class()
+        flt = dict()
+        if issubclass(sm, SlaveSummarized):
+            mm = sm.get_summary_master_model()
+            try:
+                flt.update(master=mm.objects.get(pk=master_id))
+            except mm.DoesNotExist:
+                # the summaries have been deleted together with
+                # their master
+                continue
+        if sm.update_by_aggregates(**flt):
+            continue
+        periods = set(sm.get_summary_periods())
+        for year, month in buckets:
+            if (year, month) in periods:
+                flt.update(year=year, month=month)
+                for obj in sm.get_for_filter(**flt):
+                    obj.compute_summary_values()
+    DirtyBucket.objects.filter(id__lte=last_id).delete()
+
+
+@dd.schedule_often(every=30)
+def update_dirty_summaries_often():
+    # no need to look for dirty periods when no summary model declares
+    # its sources
+    if get_summary_sources():
+        update_dirty_summaries()
+
+
 @dd.schedule_daily()
 def checksummaries():
     rt.login().run(settings.SITE.site_config.check_all_summaries)
@@ -150,7 +150,7 @@ class SiteConfig(dd.Model):
     def save(self, *args, **kw):
         # print("20180502 save() {}".format(dd.obj2str(self, True)))
         super(SiteConfig, self).save(*args, **kw)
-        settings.SITE.clear_site_config()
+        settings.SITE.invalidate_site_config()
 
 
 def my_handler(sender, **kw):
@@ -135,6 +135,9 @@ lino.mixins
 lino.modlib
 lino.modlib.about
 lino.modlib.awesomeuploader
+lino.modlib.bench
+lino.modlib.bench.management
+lino.modlib.bench.management.commands
 lino.modlib.blacklist
 lino.modlib.bootstrap3
 lino.modlib.changes
@@ -173,6 +176,9 @@ lino.modlib.summaries
 lino.modlib.summaries.fixtures
 lino.modlib.summaries.management
 lino.modlib.summaries.management.commands
+lino.modlib.search
+lino.modlib.search.management
+lino.modlib.search.management.commands
 lino.modlib.system
 lino.modlib.tinymce
 lino.modlib.tinymce.fixtures
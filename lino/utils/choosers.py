@@ -51,6 +51,7 @@ class Chooser(FieldChooser):
     force_selection = True
     choice_display_method = None  # not yet used.
     can_create_choice = False
+    index_choices = False
 
     def __init__(self, model, field, meth):
         FieldChooser.__init__(self, field)
@@ -63,6 +64,8 @@ class Chooser(FieldChooser):
             self.instance_values = getattr(meth, 'instance_values', False)
             self.force_selection = getattr(
                 meth, 'force_selection', self.force_selection)
+            self.index_choices = getattr(
+                meth, 'index_choices', self.index_choices)
         #~ self.context_params = meth.func_code.co_varnames[1:meth.func_code.co_argcount]
         self.context_params = meth.context_params
         #~ self.multiple = meth.multiple
@@ -22,6 +22,7 @@ from pkg_resources import parse_version as PV
 
 #from io import StringIO
 import os
+import time
 #from os.path import dirname
 import imp
 #from decimal import Decimal
@@ -30,6 +31,7 @@ from unipath import Path
 
 from django.conf import settings
 from django.db import models
+from django.db import transaction
 
 from django.utils import translation
 from django.utils.module_loading import import_string
@@ -124,11 +126,26 @@ class FakeDeserializedObject(base.DeserializedObject):
 
     """
 
+    prepared = False
+
     def __init__(self, deserializer, object):
         self.object = object
         # self.name = name
         self.deserializer = deserializer
 
+    def prepare(self):
+        """Call the :meth:`before_dumpy_save` method of the object, if it
+        has one.  Does nothing when called a second time (e.g. when
+        the bulk restore mode falls back to :meth:`try_save`).
+
+        """
+        if self.prepared:
+            return
+        self.prepared = True
+        m = getattr(self.object, 'before_dumpy_save', None)
+        if m is not None:
+            m(self.deserializer)
+
     def save(self, *args, **kw):
         """
         """
@@ -150,9 +167,7 @@ class FakeDeserializedObject(base.DeserializedObject):
         try:
             """
             """
-            m = getattr(obj, 'before_dumpy_save', None)
-            if m is not None:
-                m(self.deserializer)
+            self.prepare()
             if not self.deserializer.quick:
                 try:
                     obj.full_clean()
@@ -215,13 +230,35 @@ class FlushDeferredObjects(object):
 
 
 class LoaderBase(object):
+    """
+
+    .. attribute:: bulk
+
+        Whether to use bulk restore mode.  In this mode the objects of
+        each model are inserted using `bulk_create` in batches of
+        :attr:`bulk_batch_size`, within one transaction per batch.
+        This bypasses :meth:`full_clean`, the :meth:`save` method and
+        the `pre_save` and `post_save` signals.  Models with MTI
+        parents and batches which fail (e.g. because they refer to
+        rows which have not yet been restored) are saved one by one
+        as usual.
+
+        Dumps created by :manage:`dump2py` already have their models
+        sorted by their foreign key dependencies.
+
+    """
 
     quick = False
+    bulk = False
+    bulk_batch_size = 1000
     source_version = None
     max_deferred_objects = 1000
 
     def __init__(self):
         # logger.info("20120225 DpyLoader.__init__()")
+        self._bulk_model = None
+        self._bulk_objects = []
+        self._bulk_failed = []
         self.save_later = {}
         self.reported_tracebacks = set()
         self.saved = 0
@@ -230,10 +267,74 @@ class LoaderBase(object):
         # populated by Migrator.after_load(), but remains empty in a DpyDeserializer
         self.before_load_handlers = []
 
+    def bulk_save(self, dobj):
+        """Save the given :class:`FakeDeserializedObject` in bulk restore
+        mode.
+
+        """
+        obj = dobj.object
+        model = obj.__class__
+        if model._meta.parents:
+            # bulk_create() doesn't support multi-table inheritance
+            self.end_bulk_model()
+            dobj.try_save()
+            return
+        if model is not self._bulk_model:
+            self.end_bulk_model()
+            self._bulk_model = model
+            self._bulk_count = 0
+            self._bulk_started = time.time()
+        dobj.prepare()
+        self._bulk_objects.append(dobj)
+        if len(self._bulk_objects) >= self.bulk_batch_size:
+            self.flush_bulk_objects()
+
+    def flush_bulk_objects(self):
+        dobjs = self._bulk_objects
+        if len(dobjs) == 0:
+            return
+        self._bulk_objects = []
+        try:
+            with transaction.atomic():
+                self._bulk_model.objects.bulk_create(
+                    [o.object for o in dobjs])
+        except Exception as e:
+            logger.info("Failed to insert %d %s in bulk (%s)",
+                        len(dobjs), full_model_name(self._bulk_model), e)
+            self._bulk_failed += dobjs
+            return
+        self.saved += len(dobjs)
+        self.count_objects += len(dobjs)
+        self._bulk_count += len(dobjs)
+
+    def end_bulk_model(self):
+        """Insert the remaining objects of the current model in bulk restore
+        mode and report throughput.
+
+        """
+        if self._bulk_model is None:
+            return
+        self.flush_bulk_objects()
+        model = self._bulk_model
+        self._bulk_model = None
+        duration = time.time() - self._bulk_started
+        logger.info(
+            "Inserted %d %s in %.1f seconds (%d rows per second).",
+            self._bulk_count, full_model_name(model), duration,
+            self._bulk_count / max(duration, 0.001))
+        failed = self._bulk_failed
+        self._bulk_failed = []
+        if len(failed):
+            logger.info("Saving %d %s one by one...",
+                        len(failed), full_model_name(model))
+            for dobj in failed:
+                dobj.try_save()
+
     def flush_deferred_objects(self):
         """
         Flush the list of deferred objects.
         """
+        self.end_bulk_model()
         while self.saved and self.save_later:
             try_again = []
             for msg_objlist in list(self.save_later.values()):
@@ -349,9 +450,17 @@ class DpyLoader(LoaderBase):
     """Instantiated by :xfile:`restore.py`.
 
     """
-    def __init__(self, globals_dict, quick=None):
+    def __init__(self, globals_dict, quick=None, bulk=None):
         if quick is not None:
             self.quick = quick
+        if bulk is not None:
+            self.bulk = bulk
+            if bulk:
+                self.quick = True
+                logger.info(
+                    "Bulk restore: objects are inserted without calling "
+                    "full_clean() or save() and without sending the "
+                    "pre_save and post_save signals.")
         self.globals_dict = globals_dict
         super(DpyLoader, self).__init__()
         self.source_version = globals_dict['SOURCE_VERSION']
@@ -361,7 +470,10 @@ class DpyLoader(LoaderBase):
 
     def save(self, obj):
         for o in self.expand(obj):
-            o.try_save()
+            if self.bulk:
+                self.bulk_save(o)
+            else:
+                o.try_save()
 
 
 class DpyDeserializer(LoaderBase):
@@ -511,6 +511,106 @@ def py2js(v, compact=True):
     # return json.dumps(v,cls=DjangoJSONEncoder) # http://code.djangoproject.com/ticket/3324
 
 
+class NotData(Exception):
+    """Raised by :class:`DataEncoder` when it encounters a value which
+    cannot be represented as plain JSON data (e.g. a :class:`js_code`
+    or a :class:`Value`).
+
+    """
+    pass
+
+
+def _date2js(v):
+    if v.year < 1900:
+        v = IncompleteDate.from_date(v)
+    return v.strftime(settings.SITE.date_format_strftime)
+
+
+DATA_HANDLERS = {
+    Promise: force_text,
+    Quantity: str,
+    decimal.Decimal: float,
+    fractions.Fraction: float,
+    IncompleteDate: lambda v: v.strftime(settings.SITE.date_format_strftime),
+    datetime.datetime: lambda v: v.strftime(
+        settings.SITE.datetime_format_strftime),
+    datetime.time: lambda v: v.strftime(settings.SITE.time_format_strftime),
+    datetime.date: _date2js,
+}
+"""Maps a Python type to a function which converts a value of this
+type into something the standard :mod:`json` encoder can handle.  Used
+by :func:`data2json`.  Subclasses are looked up using their MRO.
+
+"""
+
+_handlers_by_type = {}
+
+
+def get_data_handler(cls):
+    h = _handlers_by_type.get(cls, None)
+    if h is None:
+        h = False
+        for base in cls.__mro__:
+            if base in DATA_HANDLERS:
+                h = DATA_HANDLERS[base]
+                break
+        _handlers_by_type[cls] = h
+    return h
+
+
+class DataEncoder(json.JSONEncoder):
+    """A JSON encoder for the data of AJAX responses (rows, records,
+    counts).  Native types are handled by the (C accelerated)
+    standard encoder, other types are dispatched by their type using
+    :data:`DATA_HANDLERS` and then the registered converters.
+
+    """
+
+    def default(self, v):
+        h = get_data_handler(v.__class__)
+        if h:
+            return h(v)
+        if etree.iselement(v):
+            return force_text(etree.tostring(v))
+        for cv in CONVERTERS:
+            nv = cv(v)
+            if nv is not v:
+                return nv
+        raise NotData(v)
+
+
+_data_encoder = DataEncoder(
+    separators=(',', ':'), check_circular=False)
+
+
+def data2json(v):
+    """Convert the given Python data structure into a JSON string.
+
+    This gives the same result as :func:`py2js` for data (except that
+    dicts are not sorted and whitespace differs), but is much faster.
+    Structures which cannot be represented as plain data (e.g. when
+    they contain :class:`js_code`) are rendered using :func:`py2js`.
+
+    >>> import json
+    >>> import decimal
+    >>> d = dict(count=2, success=True, title="Élève",
+    ...          rows=[[1, "Ä", None, True],
+    ...                [2, "b", decimal.Decimal("1.50"), False]])
+    >>> json.loads(data2json(d)) == json.loads(py2js(d))
+    True
+    >>> print(data2json(dict(rows=[[1, None, True]])))
+    {"rows":[[1,null,true]]}
+    >>> print(data2json(dict(handler=js_code("foo"))))
+    { "handler": foo }
+
+    """
+    try:
+        return _data_encoder.encode(v)
+    except (NotData, TypeError) as e:
+        logger.debug("data2json() falls back to py2js() : %s", e)
+        return py2js(v)
+
+
 def _test():
     import doctest
     doctest.testmod()
@@ -155,6 +155,31 @@ The answer is 42.
 >>> print(p.parse('''<ul>[="".join(['<li>%s</li>' % (i+1) for i in range(5)])]</ul>'''))
 <ul><li>1</li><li>2</li><li>3</li><li>4</li><li>5</li></ul>
 
+
+References to database objects
+------------------------------
+
+Commands registered using :meth:`Parser.register_django_model` refer
+to a database object by its primary key.  Before expanding the
+commands of a text, :meth:`Parser.parse` collects the primary keys of
+all references to a same model and loads them using a single
+`in_bulk()` query per model.
+
+When :meth:`Parser.parse` gets an action request as its only context
+(which is the case when called via
+:meth:`lino.core.requests.BaseRequest.parse_memo`), it stores the
+rendered result in a cache whose key is the hash of the source text,
+the current language, the renderer and the user (because the
+rendered links depend on the permissions of the user).  A cached
+result is removed when one of the objects it refers to is saved or
+deleted, or after :attr:`Parser.cache_timeout` seconds.
+
+The cache lives in the memory of the process, and only the process
+which saved or deleted an object removes the results referring to it.
+Other processes may show an outdated text for at most
+:attr:`Parser.cache_timeout` seconds, which is why this timeout is
+short.
+
 """
 from __future__ import unicode_literals
 
@@ -164,6 +189,12 @@ import logging ; logger = logging.getLogger(__name__)
 # from inspect import getsourcefile
 import re
 import inspect
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.db.models.signals import post_save, post_delete
 
 from etgen import etree
 
@@ -174,14 +205,36 @@ COMMAND_REGEX = re.compile(r"\[(\w+)\s*((?:[^[\]]|\[.*?\])*?)\]")
 EVAL_REGEX = re.compile(r"\[=((?:[^[\]]|\[.*?\])*?)\]")
 
 class Parser(object):
-    """The memo parser. """
+    """The memo parser.
+
+    .. attribute:: cache_size
+
+        The maximum number of rendered texts to keep in the cache.
+        Set this to 0 to disable the cache.
+
+    .. attribute:: cache_timeout
+
+        The number of seconds after which a cached result is
+        rendered again.  This limits the time during which other
+        processes show an outdated text after an object has been
+        modified.
+
+    """
 
     safe_mode = False
+    cache_size = 1000
+    cache_timeout = 30
 
     def __init__(self, **context):
         self.commands = dict()
         self.context = context
         self.renderers = dict()
+        self.models = dict()  # command name -> model
+        # the objects prefetched by the parse() running in this thread
+        self._local = threading.local()
+        self._cache = OrderedDict()  # key -> (expires, text, refs)
+        self._refs = dict()  # (model, pk) -> set of cache keys
+        self._lock = threading.Lock()
 
     def register_command(self, cmd, func):
         # print("20170210 register_command {} {}".format(cmd, func))
@@ -242,7 +295,7 @@ All remaining arguments are used as the text of the link.
                 kw = dict()
                 # dd.logger.info("20161019 %s", ar.renderer)
                 pk = int(pk)
-                obj = model.objects.get(pk=pk)
+                obj = parser.get_object(model, pk)
                 # try:
                 # except model.DoesNotExist:
                 #     return "[{} {}]".format(name, s)
@@ -255,8 +308,114 @@ All remaining arguments are used as the text of the link.
 
         self.register_command(name, cmd)
         self.register_renderer(model, rnd)
-            
-        
+        self.models[name] = model
+        post_save.connect(self.on_object_changed, sender=model, weak=False)
+        post_delete.connect(self.on_object_changed, sender=model, weak=False)
+
+    def get_object(self, model, pk):
+        """Return the database object of the given `model` with the given
+        primary key `pk`, preferably from those loaded by
+        :meth:`prefetch_references`.
+
+        """
+        prefetched = getattr(self._local, 'prefetched', None)
+        if prefetched is not None:
+            obj = prefetched.get(model, {}).get(pk, None)
+            if obj is not None:
+                return obj
+        return model.objects.get(pk=pk)
+
+    def collect_references(self, s):
+        """Return a `dict` which maps each model to the set of primary keys
+        referred to by the commands of the given text.
+
+        """
+        pks = dict()
+        for mo in COMMAND_REGEX.finditer(s):
+            model = self.models.get(mo.group(1), None)
+            if model is None:
+                continue
+            args = self.clean_params(mo.group(2)).split(None, 1)
+            if len(args) == 0:
+                continue
+            try:
+                pk = int(args[0])
+            except ValueError:
+                continue
+            pks.setdefault(model, set()).add(pk)
+        return pks
+
+    def prefetch_references(self, pks):
+        """Load the database objects specified by the given `dict` (as
+        returned by :meth:`collect_references`), using one `in_bulk()`
+        query per model.  Return a `dict` which maps each model to a
+        `dict` of the found objects by their primary key.
+
+        """
+        return dict([(model, model.objects.in_bulk(list(v)))
+                     for model, v in pks.items()])
+
+    def get_cache_key(self, s, context):
+        """Return the key for caching the result of parsing `s` with the
+        given `context`, or `None` if it must not be cached.
+
+        """
+        if self.cache_size == 0:
+            return None
+        ar = context.get('ar', None)
+        if ar is None or len(context) > 1:
+            return None
+        if not self.safe_mode and EVAL_REGEX.search(s):
+            return None
+        from django.utils.translation import get_language
+        h = hashlib.sha1(s.encode('utf-8')).hexdigest()
+        u = ar.get_user()
+        return (h, get_language(), getattr(ar, 'renderer', None).__class__,
+                getattr(u, 'pk', None), getattr(ar.user, 'pk', None))
+
+    def cache_get(self, key):
+        with self._lock:
+            v = self._cache.get(key, None)
+            if v is None:
+                return None
+            if v[0] < time.time():
+                self.cache_remove(key)
+                return None
+            # mark as recently used
+            del self._cache[key]
+            self._cache[key] = v
+            return v[1]
+
+    def cache_put(self, key, text, refs):
+        with self._lock:
+            if key in self._cache:
+                self.cache_remove(key)
+            self._cache[key] = (time.time() + self.cache_timeout, text, refs)
+            for ref in refs:
+                self._refs.setdefault(ref, set()).add(key)
+            while len(self._cache) > self.cache_size:
+                self.cache_remove(next(iter(self._cache)))
+
+    def cache_remove(self, key):
+        # must be called while holding the lock
+        v = self._cache.pop(key, None)
+        if v is None:
+            return
+        for ref in v[2]:
+            keys = self._refs.get(ref, None)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._refs[ref]
+
+    def on_object_changed(self, sender, instance=None, **kwargs):
+        """Remove every cached result which refers to the given object."""
+        with self._lock:
+            keys = self._refs.pop((sender, instance.pk), None)
+            if keys:
+                for key in list(keys):
+                    self.cache_remove(key)
+
     def eval_match(self, matchobj):
         expr = matchobj.group(1)
         try:
@@ -278,12 +437,7 @@ All remaining arguments are used as the text of the link.
         if cmdh is None:
             return matchobj.group(0)
         
-        params = matchobj.group(2)
-        params = params.replace('\\\n', ' ')
-        params = params.replace(u'\xa0', ' ')
-        params = params.replace(u'\u200b', ' ')
-        params = params.replace('&nbsp;', ' ')
-        params = str(params.strip())
+        params = self.clean_params(matchobj.group(2))
         try:
             return self.format_value(cmdh(self, params))
         except Exception as e:
@@ -292,6 +446,13 @@ All remaining arguments are used as the text of the link.
             # emails to the admins.
             return self.handle_error(matchobj, e)
 
+    def clean_params(self, params):
+        params = params.replace('\\\n', ' ')
+        params = params.replace(u'\xa0', ' ')
+        params = params.replace(u'\u200b', ' ')
+        params = params.replace('&nbsp;', ' ')
+        return str(params.strip())
+
     def handle_error(self, mo, e):
         #~ return mo.group(0)
         msg = "[ERROR %s in %r at position %d-%d]" % (
@@ -304,11 +465,27 @@ All remaining arguments are used as the text of the link.
         Parse the given string `s`, replacing memo commands by their
         result.
         """
+        key = self.get_cache_key(s, context)
+        if key is not None:
+            text = self.cache_get(key)
+            if text is not None:
+                return text
         #~ self.context = context
         self.context.update(context)
-        s = COMMAND_REGEX.sub(self.cmd_match, s)
-        if not self.safe_mode:
-            s = EVAL_REGEX.sub(self.eval_match, s)
+        pks = self.collect_references(s)
+        # the parser is shared by all threads of the process, so the
+        # prefetched objects must be local to this thread
+        old = getattr(self._local, 'prefetched', None)
+        self._local.prefetched = self.prefetch_references(pks)
+        try:
+            s = COMMAND_REGEX.sub(self.cmd_match, s)
+            if not self.safe_mode:
+                s = EVAL_REGEX.sub(self.eval_match, s)
+        finally:
+            self._local.prefetched = old
+        if key is not None:
+            refs = [(model, pk) for model, v in pks.items() for pk in v]
+            self.cache_put(key, s, refs)
         return s
 
     def obj2memo(self, obj, **options):
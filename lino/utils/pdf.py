@@ -1,7 +1,9 @@
 # -*- coding: UTF-8 -*-
-# Copyright 2013 Luc Saffre
+# Copyright 2013-2019 Rumma & Ko Ltd
 # License: BSD (see file COPYING for details)
 
+from builtins import object
+
 try:
     #~ needs pyPdf, see http://pybrary.net/pyPdf
     import pyPdf
@@ -10,15 +12,36 @@ except ImportError:
     pass
 
 
-def merge_pdfs(pdfs, output_name):
-    output = pyPdf.PdfFileWriter()
+class PdfMerger(object):
+    """Merge PDF files into a single file, one input file at a time.
+
+    The input files remain open until :meth:`write` is called because
+    the pages are read lazily.
+
+    """
+
+    def __init__(self):
+        self.output = pyPdf.PdfFileWriter()
+        self.inputs = []
 
+    def add(self, input_name):
+        input = open(input_name, "rb")
+        self.inputs.append(input)
+        for page in pyPdf.PdfFileReader(input).pages:
+            self.output.addPage(page)
+
+    def write(self, output_name):
+        try:
+            with open(output_name, "wb") as outputStream:
+                self.output.write(outputStream)
+        finally:
+            for input in self.inputs:
+                input.close()
+            self.inputs = []
+
+
+def merge_pdfs(pdfs, output_name):
+    merger = PdfMerger()
     for input_name in pdfs:
-        input = pyPdf.PdfFileReader(file(input_name, "rb"))
-        #~ print "%s has %s pages." % (input_name, input.getNumPages())
-        for page in input.pages:
-            output.addPage(page)
-
-    outputStream = file(output_name, "wb")
-    output.write(outputStream)
-    outputStream.close()
+        merger.add(input_name)
+    merger.write(output_name)
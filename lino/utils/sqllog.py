@@ -80,3 +80,39 @@ class ShortSQLLogToConsoleMiddleware(object):
                 "{{count}} quer{{count|pluralize:\"y,ies\"}} in {{time}} seconds")
             print(t.render(Context({'count': len(connection.queries), 'time': time})))
         return response
+
+
+class QueryCounter(object):
+    """A context manager which counts the database queries executed on
+    the default database connection while it is active.
+
+    Usage::
+
+        with QueryCounter() as qc:
+            do_something()
+        print(qc.count)
+
+    If `enabled` is False, it does nothing and :attr:`count` remains
+    0.
+
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.count = 0
+        self._cm = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        if self.enabled:
+            self._cm = connection.execute_wrapper(self)
+            self._cm.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        if self._cm is not None:
+            self._cm.__exit__(*args)
+            self._cm = None
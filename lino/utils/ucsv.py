@@ -83,3 +83,36 @@ class UnicodeWriter(object):
     def writerows(self, rows):
         for row in rows:
             self.writerow(row)
+
+
+class Echo(object):
+
+    """
+    A pseudo stream which just collects what has been written to it,
+    used by :func:`iter_csv`.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    def pop(self):
+        chunks = self.chunks
+        self.chunks = []
+        return chunks
+
+
+def iter_csv(rows, **kwds):
+    """
+    Yield the encoded CSV lines for the given rows, which must be
+    sequences of strings.  This is meant to be used in a streaming
+    HTTP response.
+    """
+    echo = Echo()
+    w = UnicodeWriter(echo, **kwds)
+    for row in rows:
+        w.writerow(row)
+        for chunk in echo.pop():
+            yield chunk
@@ -15,3 +15,6 @@ class PackagesTests(LinoTestCase):
         self.run_packages_test(SETUP_INFO['packages'])
 
 
+class ProjectsTests(LinoTestCase):
+    def test_min1(self):
+        self.run_django_manage_test("tests/projects/min1")
@@ -0,0 +1,7 @@
+#!/usr/bin/env python
+if __name__ == "__main__":
+    import sys
+    import os
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
+    from django.core.management import execute_from_command_line
+    execute_from_command_line(sys.argv)
@@ -0,0 +1,37 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Settings of the test project used by :mod:`tests`.
+
+Some tests of this project answer dialog callbacks more than once,
+so it uses a shared callback store.
+
+"""
+
+from lino.projects.std.settings import *
+
+
+class Site(Site):
+
+    title = "Lino test project min1"
+    callbacks_backend = 'cache'
+
+    def get_installed_apps(self):
+        yield super(Site, self).get_installed_apps()
+        yield 'lino.modlib.users'
+        yield 'lino.modlib.office'
+        yield 'lino.modlib.checkdata'
+        yield 'lino.modlib.search'
+        yield 'shop'
+
+
+SITE = Site(globals())
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+DEBUG = True
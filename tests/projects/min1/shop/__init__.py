@@ -0,0 +1,20 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""A minimal shop used by the tests of the :mod:`min1` test project.
+
+"""
+
+from lino.api import ad, _
+
+
+class Plugin(ad.Plugin):
+    "See :doc:`/dev/plugins`."
+
+    verbose_name = _("Shop")
+
+    def setup_main_menu(self, site, user_type, m):
+        m = m.add_menu(self.app_label, self.verbose_name)
+        m.add_action('shop.Categories')
+        m.add_action('shop.Products')
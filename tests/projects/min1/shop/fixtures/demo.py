@@ -0,0 +1,51 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Demo data of the :mod:`shop` test app.
+
+"""
+
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+from lino.api import rt
+
+
+def objects():
+    Category = rt.models.shop.Category
+    Product = rt.models.shop.Product
+    Order = rt.models.shop.Order
+    Review = rt.models.shop.Review
+    Tag = rt.models.shop.Tag
+    Code = rt.models.shop.Code
+
+    food = Category(name="Food")
+    yield food
+    clothes = Category(name="Clothes")
+    yield clothes
+
+    def product(name, cat, price=None, description=""):
+        if price is not None:
+            price = Decimal(price)
+        return Product(name=name, category=cat, price=price,
+                       description=description)
+
+    shoes = product("Red shoes", clothes, "49.90", "Leather shoes")
+    yield shoes
+    yield product("Blue shoes", clothes, "39.90", "Canvas shoes")
+    yield product("Red hat", clothes, None, "A hat for red days")
+    yield product("Shoe polish", clothes, "4.50", "Keeps red shoes shiny")
+    apple = product("Apple", food, "0.50")
+    yield apple
+    yield product("Apple", food, "0.45", "Another apple")
+    yield product("Bread", food, None, "Brown bread")
+    yield product("Cheese", food, "3.20", "Old cheese")
+
+    yield Order(product=shoes, quantity=2)
+    yield Review(product=shoes, text="Very red")
+    yield Review(product=apple, text="Tasty")
+    yield Tag(product=apple, name="fruit")
+    yield Code(code="A1", name="First")
+    yield Code(code="B2", name="Second")
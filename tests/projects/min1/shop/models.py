@@ -0,0 +1,173 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Database models of the :mod:`shop` test app.
+
+The relations to :class:`Product` cover the different kinds of
+delete vetos: an :class:`Order` prevents deleting its product, the
+product of a :class:`Review` is set to `None`, and the
+:class:`Tag` objects of a product are deleted together with it.
+
+"""
+
+from __future__ import unicode_literals
+from builtins import object
+
+from django.db import models
+
+from lino.api import dd, rt, _
+from lino.modlib.checkdata.choicelists import Checker
+
+
+class TouchCategory(dd.Action):
+    """Increment the :attr:`Category.touched` counter after asking for
+    confirmation.
+
+    """
+    label = _("Touch")
+    readonly = False
+
+    def run_from_ui(self, ar, **kw):
+        obj = ar.selected_rows[0]
+
+        def ok(ar):
+            Category.objects.filter(pk=obj.pk).update(
+                touched=models.F('touched') + 1)
+            ar.success(refresh=True)
+
+        ar.confirm(ok, _("Touch {}?").format(obj))
+
+
+@dd.python_2_unicode_compatible
+class Category(dd.Model):
+    class Meta(object):
+        app_label = 'shop'
+        verbose_name = _("Category")
+        verbose_name_plural = _("Categories")
+        ordering = ['name']
+
+    name = models.CharField(_("Name"), max_length=50)
+    touched = models.IntegerField(_("Touched"), default=0)
+
+    touch = TouchCategory()
+
+    def __str__(self):
+        return self.name
+
+
+@dd.python_2_unicode_compatible
+class Product(dd.Model):
+    class Meta(object):
+        app_label = 'shop'
+        verbose_name = _("Product")
+        verbose_name_plural = _("Products")
+
+    quick_search_fields = 'name description'
+    use_search_index = True
+
+    name = models.CharField(_("Name"), max_length=50)
+    category = dd.ForeignKey('shop.Category')
+    price = dd.PriceField(_("Price"), blank=True, null=True)
+    description = models.CharField(
+        _("Description"), max_length=200, blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Order(dd.Model):
+    class Meta(object):
+        app_label = 'shop'
+        verbose_name = _("Order")
+        verbose_name_plural = _("Orders")
+
+    product = dd.ForeignKey('shop.Product')
+    quantity = models.IntegerField(_("Quantity"), default=1)
+
+
+class Review(dd.Model):
+    class Meta(object):
+        app_label = 'shop'
+        verbose_name = _("Review")
+        verbose_name_plural = _("Reviews")
+
+    product = dd.ForeignKey(
+        'shop.Product', blank=True, null=True, on_delete=models.SET_NULL)
+    text = models.CharField(_("Text"), max_length=200, blank=True)
+
+
+class Tag(dd.Model):
+    class Meta(object):
+        app_label = 'shop'
+        verbose_name = _("Tag")
+        verbose_name_plural = _("Tags")
+
+    allow_cascaded_delete = ['product']
+
+    product = dd.ForeignKey('shop.Product')
+    name = models.CharField(_("Name"), max_length=20)
+
+
+@dd.python_2_unicode_compatible
+class Code(dd.Model):
+    """A model whose primary key is not an integer."""
+    class Meta(object):
+        app_label = 'shop'
+        verbose_name = _("Code")
+        verbose_name_plural = _("Codes")
+
+    code = models.CharField(_("Code"), max_length=10, primary_key=True)
+    name = models.CharField(_("Name"), max_length=50, blank=True)
+
+    def __str__(self):
+        return self.code
+
+
+class Categories(dd.Table):
+    model = 'shop.Category'
+    column_names = "name touched *"
+
+
+class Products(dd.Table):
+    model = 'shop.Product'
+    column_names = "name category price description *"
+    order_by = ['name']
+
+
+class ProductsByCategory(Products):
+    master_key = 'category'
+
+
+class Codes(dd.Table):
+    model = 'shop.Code'
+
+
+class ProductChecker(Checker):
+    """A product must have a description."""
+    verbose_name = _("Check for products without description")
+    model = Product
+
+    def get_checkdata_problems(self, obj, fix=False):
+        if not obj.description:
+            yield (False, _("Product has no description."))
+
+ProductChecker.activate()
+
+
+class CodeChecker(Checker):
+    """A code must be uppercase.
+
+    The tests never create a lowercase code because the
+    :class:`Problem <lino.modlib.checkdata.models.Problem>` table
+    cannot point to a row whose primary key is not an integer.
+
+    """
+    verbose_name = _("Check for lowercase codes")
+    model = Code
+
+    def get_checkdata_problems(self, obj, fix=False):
+        if obj.code != obj.code.upper():
+            yield (False, _("Code is not uppercase."))
+
+CodeChecker.activate()
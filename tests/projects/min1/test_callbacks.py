@@ -0,0 +1,51 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Test the shared callback store (:attr:`callbacks_backend
+<lino.core.site.Site.callbacks_backend>` is ``'cache'`` in this
+project).
+
+"""
+
+from __future__ import unicode_literals
+
+from django.conf import settings
+
+from lino.api import rt
+from lino.core.callbacks import make_callback_store
+from lino.utils.djangotest import TestCase
+
+
+class CallbackTests(TestCase):
+
+    fixtures = ['demo']
+
+    def test_answer_twice(self):
+        Category = rt.models.shop.Category
+        kernel = settings.SITE.kernel
+        obj = Category.objects.get(name="Food")
+        url = '/api/shop/Categories/{}?an=touch'.format(obj.pk)
+        res = self.client_json_dict(self.client.get, 'robin', url)
+        self.assertEquivalent("Touch Food?", res.message)
+        self.assertEqual(Category.objects.get(pk=obj.pk).touched, 0)
+        url = '/callbacks/{}/yes'.format(res.xcallback['id'])
+
+        res = self.client_json_dict(self.client.get, 'robin', url)
+        self.assertEqual(res.success, True)
+        self.assertEqual(Category.objects.get(pk=obj.pk).touched, 1)
+
+        # the same answer arrives at another process
+        store = kernel.callback_store
+        kernel.callback_store = make_callback_store(settings.SITE)
+        try:
+            res = self.client_json_dict(self.client.get, 'robin', url)
+        finally:
+            kernel.callback_store = store
+        self.assertEqual(res.success, False)
+        self.assertEqual(Category.objects.get(pk=obj.pk).touched, 1)
+
+        # and again at the first one
+        res = self.client_json_dict(self.client.get, 'robin', url)
+        self.assertEqual(res.success, False)
+        self.assertEqual(Category.objects.get(pk=obj.pk).touched, 1)
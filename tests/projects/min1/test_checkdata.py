@@ -0,0 +1,86 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Test the incremental mode of :manage:`checkdata`.
+
+"""
+
+from __future__ import unicode_literals
+
+from lino.api import dd, rt
+from lino.modlib.checkdata.models import check_data, checkdata
+from lino.utils.djangotest import TestCase
+
+
+class CheckdataTests(TestCase):
+
+    fixtures = ['demo']
+
+    def run_checkers(self, full):
+        rv = dict()
+        for name, rows, skipped, found, fixed, seconds in check_data(
+                ['shop.'], fix=False, full=full):
+            rv[name] = (rows, skipped, found)
+        return rv
+
+    def get_problems(self, model):
+        Problem = rt.models.checkdata.Problem
+        ct = rt.models.contenttypes.ContentType.objects.get_for_model(model)
+        return sorted([
+            str(p.owner) for p in Problem.objects.filter(owner_type=ct)])
+
+    def test_incremental(self):
+        Product = rt.models.shop.Product
+        Code = rt.models.shop.Code
+        ChangedRow = rt.models.checkdata.ChangedRow
+
+        # the first incremental run is a full run because there is no
+        # checkpoint yet
+        self.assertEqual(self.run_checkers(False), {
+            'Products': (8, 0, 1), 'Codes': (2, 0, 0)})
+        self.assertEqual(self.get_problems(Product), ["Apple"])
+
+        # a change via the web interface is noted
+        obj = Product.objects.get(name="Bread")
+        obj.description = ""
+        obj.save()
+        dd.on_ui_created.send(sender=obj, request=None)
+        self.assertEqual(ChangedRow.objects.count(), 1)
+
+        # a model without integer primary key is not tracked
+        obj = Code(code="C3")
+        obj.save()
+        dd.on_ui_created.send(sender=obj, request=None)
+        self.assertEqual(ChangedRow.objects.count(), 1)
+
+        # a change behind the back of the web interface is not noted
+        Product.objects.filter(name="Cheese").update(description="")
+
+        # the incremental run revisits only the noted row, but it
+        # checks every code
+        self.assertEqual(self.run_checkers(False), {
+            'Products': (1, 7, 1), 'Codes': (3, 0, 0)})
+        self.assertEqual(self.get_problems(Product), ["Apple", "Bread"])
+        self.assertEqual(ChangedRow.objects.count(), 0)
+
+        # another incremental run has nothing to do
+        self.assertEqual(self.run_checkers(False), {
+            'Products': (0, 8, 0), 'Codes': (3, 0, 0)})
+        self.assertEqual(self.get_problems(Product), ["Apple", "Bread"])
+
+        # the daily run is incremental except on the weekday of the
+        # full check, which catches also the unnoted change
+        plugin = dd.plugins.checkdata
+        wd = plugin.full_check_weekday
+        try:
+            plugin.full_check_weekday = (dd.today().weekday() + 1) % 7
+            checkdata()
+            self.assertEqual(
+                self.get_problems(Product), ["Apple", "Bread"])
+            plugin.full_check_weekday = dd.today().weekday()
+            checkdata()
+            self.assertEqual(
+                self.get_problems(Product), ["Apple", "Bread", "Cheese"])
+        finally:
+            plugin.full_check_weekday = wd
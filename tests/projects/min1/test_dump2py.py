@@ -0,0 +1,125 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Test the :manage:`dump2py` command and the restore of its dumps.
+
+"""
+
+from __future__ import unicode_literals
+
+import os
+import json
+import shutil
+import tempfile
+
+import six
+
+from django.core.management import call_command
+from django.db.models.signals import post_save
+
+from lino.api import rt
+from lino.core.utils import resolve_model
+from lino.utils.djangotest import TestCase
+
+SHOP_MODELS = ['shop.Category', 'shop.Product', 'shop.Order',
+               'shop.Review', 'shop.Tag', 'shop.Code']
+
+
+class DumpTests(TestCase):
+
+    fixtures = ['demo']
+
+    def setUp(self):
+        super(DumpTests, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        super(DumpTests, self).tearDown()
+
+    def dump(self, name, **options):
+        path = os.path.join(self.tmpdir, name)
+        call_command('dump2py', path, interactive=False, **options)
+        with open(os.path.join(path, 'manifest.json')) as f:
+            return path, json.load(f)
+
+    def snapshot(self):
+        return dict([
+            (name, list(resolve_model(name).objects.order_by('pk').values()))
+            for name in SHOP_MODELS])
+
+    def restore(self, path, manifest, bulk):
+        """Restore the shop tables from the given dump like the
+        :xfile:`restore.py` script does, but without running
+        :manage:`initdb`.
+
+        """
+        for name in reversed(SHOP_MODELS):
+            resolve_model(name).objects.all().delete()
+        self.assertEqual(rt.models.shop.Product.objects.count(), 0)
+        fn = os.path.join(path, 'restore.py')
+        g = dict(__name__='restore', __file__=fn)
+        with open(fn) as f:
+            six.exec_(compile(f.read(), fn, 'exec'), g)
+        loader = g['DpyLoader'](g, bulk=bulk)
+        loader.initialize()
+        cwd = os.getcwd()
+        os.chdir(path)
+        try:
+            for name in SHOP_MODELS:
+                for f in manifest['models'][name]['files']:
+                    g['execfile'](f['path'], g, dict(loader=loader))
+            loader.finalize()
+        finally:
+            os.chdir(cwd)
+
+    def test_bulk_restore(self):
+        expected = self.snapshot()
+        path, manifest = self.dump('a')
+        self.assertEqual(manifest['models']['shop.Product']['rows'], 8)
+
+        saved = []
+
+        def on_save(sender, instance=None, **kw):
+            saved.append(instance)
+
+        post_save.connect(on_save, sender=rt.models.shop.Product)
+        try:
+            self.restore(path, manifest, False)
+            self.assertEqual(self.snapshot(), expected)
+            self.assertEqual(len(saved), 8)
+
+            # a bulk restore gives the same rows, but it doesn't call
+            # save() and doesn't send the save signals.
+            del saved[:]
+            self.restore(path, manifest, True)
+            self.assertEqual(self.snapshot(), expected)
+            self.assertEqual(len(saved), 0)
+        finally:
+            post_save.disconnect(on_save, sender=rt.models.shop.Product)
+
+    def test_reuse(self):
+        path_a, manifest_a = self.dump('a')
+        obj = rt.models.shop.Product.objects.get(name="Cheese")
+        obj.description = "Very old cheese"
+        obj.save()
+        expected = self.snapshot()
+
+        # changing one row rewrites the file of its model, and only
+        # this one
+        path_b, manifest_b = self.dump('b', reuse=path_a)
+        self.assertEqual(
+            sorted(os.listdir(path_b)),
+            ['manifest.json', 'restore.py', 'shop_product.py'])
+        for name, res in manifest_b['models'].items():
+            for f in res['files']:
+                if name == 'shop.Product':
+                    self.assertEqual(f['path'], 'shop_product.py')
+                else:
+                    self.assertEqual(
+                        f['path'], os.path.join('..', 'a', f['name']))
+
+        # the new dump restores the changed row
+        self.restore(path_b, manifest_b, False)
+        self.assertEqual(self.snapshot(), expected)
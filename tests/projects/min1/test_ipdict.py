@@ -0,0 +1,92 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Test the record stores of :mod:`lino.modlib.ipdict`.
+
+"""
+
+from __future__ import unicode_literals
+
+from django.core.cache import cache
+
+from lino.modlib.ipdict.stores import LocalRecordStore, CacheRecordStore
+from lino.utils.djangotest import TestCase
+
+ADDR = '10.0.0.1'
+
+
+class RecordStoreTests(TestCase):
+
+    def setUp(self):
+        super(RecordStoreTests, self).setUp()
+        cache.clear()
+
+    def check_blacklist(self, store):
+        for i in range(2):
+            rec = store.login_failed(ADDR)
+            self.assertEqual(rec.login_failures, i + 1)
+            self.assertIsNone(rec.blacklisted_since)
+        rec = store.login_failed(ADDR)
+        self.assertEqual(rec.login_failures, 3)
+        self.assertIsNotNone(rec.blacklisted_since)
+        # other addresses are not affected
+        rec = store.get_record('10.0.0.2', 'anonymous')
+        self.assertEqual(rec.login_failures, 0)
+        self.assertIsNone(rec.blacklisted_since)
+        # a successful login forgets the failures
+        store.logged_in(ADDR, 'robin')
+        rec = store.get_record(ADDR, 'anonymous')
+        self.assertEqual(rec.login_failures, 0)
+        self.assertIsNone(rec.blacklisted_since)
+        self.assertIsNotNone(store.get_record(ADDR, 'robin').last_login)
+
+    def check_eviction(self, store):
+        store.login_failed(ADDR)
+        for i in range(2, 6):
+            store.touch('10.0.0.{}'.format(i), 'anonymous')
+        self.assertEqual(len(store.records), 3)
+        self.assertEqual(store.evicted, 2)
+        self.assertEqual(
+            sorted([k[0] for k in store.records.keys()]),
+            ['10.0.0.3', '10.0.0.4', '10.0.0.5'])
+        # accessing a record makes it the most recently used one
+        store.get_record('10.0.0.3', 'anonymous')
+        store.touch('10.0.0.6', 'anonymous')
+        self.assertEqual(
+            sorted([k[0] for k in store.records.keys()]),
+            ['10.0.0.3', '10.0.0.5', '10.0.0.6'])
+        self.assertEqual(store.evicted, 3)
+
+    def test_local_blacklist(self):
+        self.check_blacklist(LocalRecordStore(max_failures=3))
+
+    def test_cache_blacklist(self):
+        self.check_blacklist(CacheRecordStore(max_failures=3))
+
+    def test_cache_shared(self):
+        # two processes using the same cache count the failures together
+        s1 = CacheRecordStore(max_failures=3)
+        s2 = CacheRecordStore(max_failures=3)
+        s1.login_failed(ADDR)
+        s2.login_failed(ADDR)
+        rec = s1.login_failed(ADDR)
+        self.assertEqual(rec.login_failures, 3)
+        self.assertIsNotNone(rec.blacklisted_since)
+        rec = s2.get_record(ADDR, 'anonymous')
+        self.assertEqual(rec.login_failures, 3)
+        self.assertIsNotNone(rec.blacklisted_since)
+
+    def test_local_eviction(self):
+        store = LocalRecordStore(max_records=3)
+        self.check_eviction(store)
+        # an evicted record is forgotten
+        rec = store.get_record(ADDR, 'anonymous')
+        self.assertEqual(rec.login_failures, 0)
+
+    def test_cache_eviction(self):
+        store = CacheRecordStore(max_records=3)
+        self.check_eviction(store)
+        # the shared values of an evicted record are still in the cache
+        rec = store.get_record(ADDR, 'anonymous')
+        self.assertEqual(rec.login_failures, 1)
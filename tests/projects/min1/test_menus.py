@@ -0,0 +1,49 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Test the cache of main menus.
+
+"""
+
+from __future__ import unicode_literals
+
+from django.conf import settings
+
+from lino.api import rt
+from lino.utils.djangotest import TestCase
+
+
+def menu_labels(mnu):
+    return [str(mi.label) for mi in mnu.walk_items()]
+
+
+class MenuTests(TestCase):
+
+    fixtures = ['demo']
+
+    def test_menu_cache(self):
+        site = settings.SITE
+        ar = rt.login('robin', renderer=site.kernel.text_renderer)
+        user_type = ar.get_user().user_type
+
+        mnu = site.get_site_menu(user_type)
+        self.assertIs(site.get_site_menu(user_type), mnu)
+        labels = menu_labels(mnu)
+        self.assertIn("Products", labels)
+
+        # rendering the shared menu doesn't modify it
+        text = ar.renderer.menu2rst(ar, mnu)
+        self.assertEqual(ar.renderer.menu2rst(ar, mnu), text)
+        self.assertEqual(menu_labels(mnu), labels)
+        self.assertEqual(
+            menu_labels(site.build_site_menu(user_type)), labels)
+
+        # the menus are built again when the SiteConfig changes
+        site.site_config.save()
+        mnu2 = site.get_site_menu(user_type)
+        self.assertIsNot(mnu2, mnu)
+        self.assertEqual(menu_labels(mnu2), labels)
+
+        site.clear_menu_cache()
+        self.assertIsNot(site.get_site_menu(user_type), mnu2)
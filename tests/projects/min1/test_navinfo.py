@@ -0,0 +1,68 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Test whether the keyset implementation of :func:`navinfo
+<lino.core.utils.navinfo>` gives the same results as walking through
+the list of all primary keys.
+
+"""
+
+from __future__ import unicode_literals
+
+from lino.api import rt
+from lino.core.utils import navinfo, _keyset_ordering
+from lino.utils.djangotest import TestCase
+
+
+def expected_navinfo(pks, pk):
+    i = pks.index(pk)
+    return dict(
+        first=pks[0], last=pks[-1], recno=i + 1,
+        prev=pks[i - 1] if i > 0 else None,
+        next=pks[i + 1] if i < len(pks) - 1 else None)
+
+
+class NavinfoTests(TestCase):
+
+    fixtures = ['demo']
+
+    def check_navinfo(self, qs, pks):
+        self.assertEqual(len(pks), qs.count())
+        for obj in qs:
+            ni = navinfo(qs, obj)
+            ni.pop('message')
+            self.assertEqual(ni, expected_navinfo(pks, obj.pk),
+                             "navinfo of {} in {}".format(obj, qs.query))
+
+    def test_navinfo(self):
+        Product = rt.models.shop.Product
+
+        # descending ordering
+        qs = Product.objects.order_by('-name', '-pk')
+        self.assertIsNotNone(_keyset_ordering(qs))
+        self.check_navinfo(qs, list(qs.values_list('pk', flat=True)))
+
+        # non-unique ordering (there are two apples), navinfo adds
+        # the primary key as tiebreak
+        qs = Product.objects.order_by('name')
+        self.assertIsNotNone(_keyset_ordering(qs))
+        pks = Product.objects.order_by('name', 'pk')
+        self.check_navinfo(qs, list(pks.values_list('pk', flat=True)))
+
+        # ordering by a field of a related model, mixing directions
+        qs = Product.objects.order_by('-category__name', 'name')
+        self.assertIsNotNone(_keyset_ordering(qs))
+        pks = Product.objects.order_by('-category__name', 'name', 'pk')
+        self.check_navinfo(qs, list(pks.values_list('pk', flat=True)))
+
+        # a nullable ordering field falls back to the list of all
+        # primary keys
+        qs = Product.objects.order_by('price')
+        self.assertIsNone(_keyset_ordering(qs))
+        self.check_navinfo(qs, list(qs.values_list('pk', flat=True)))
+
+        # a filtered queryset
+        qs = Product.objects.filter(category__name="Food").order_by('name')
+        pks = qs.order_by('name', 'pk')
+        self.check_navinfo(qs, list(pks.values_list('pk', flat=True)))
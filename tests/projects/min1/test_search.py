@@ -0,0 +1,64 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Test whether the search indexes of :mod:`lino.modlib.search` give
+the same results as a `LIKE` search.
+
+"""
+
+from __future__ import unicode_literals
+
+from django.db import OperationalError
+
+from lino.api import rt
+from lino.core.dbtables import add_gridfilters
+from lino.modlib.search.indexes import WordsIndex, FTS5Index
+from lino.utils.djangotest import TestCase
+
+QUERIES = ["red shoe", "shoe red", "old cheese", "apple", "blue red"]
+
+
+class SearchTests(TestCase):
+
+    fixtures = ['demo']
+
+    def search(self, index, text):
+        Product = rt.models.shop.Product
+        Order = rt.models.shop.Order
+        old = Product._search_index
+        Product._search_index = index
+        try:
+            products = Product.objects.filter(
+                Product.quick_search_filter(text))
+            orders = add_gridfilters(Order.objects.all(), [
+                dict(field='product', type='string', value=text)])
+            return (sorted([obj.pk for obj in products]),
+                    sorted([obj.pk for obj in orders]))
+        finally:
+            Product._search_index = old
+
+    def check_index(self, index):
+        Product = rt.models.shop.Product
+        index.rebuild(Product)
+        for text in QUERIES:
+            self.assertEqual(
+                self.search(index, text), self.search(None, text),
+                "search for {!r}".format(text))
+        # a multi-word query finds the rows having all words
+        self.assertEqual(
+            self.search(index, "red shoe")[0],
+            sorted(Product.objects.filter(
+                name__in=["Red shoes", "Shoe polish"]).values_list(
+                    'pk', flat=True)))
+
+    def test_words(self):
+        self.check_index(WordsIndex())
+
+    def test_fts5(self):
+        index = FTS5Index()
+        try:
+            index.setup([rt.models.shop.Product])
+        except OperationalError as e:
+            self.skipTest("SQLite has no FTS5 ({})".format(e))
+        self.check_index(index)
@@ -0,0 +1,53 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Test the streamed JSON responses of unpaginated list requests.
+
+"""
+
+from __future__ import unicode_literals
+
+import json
+
+from django.conf import settings
+
+from lino.utils.djangotest import TestCase
+
+
+class StreamingTests(TestCase):
+
+    fixtures = ['demo']
+
+    def get_rows(self, url):
+        ar = settings.SITE.login('robin')
+        self.client.force_login(ar.user)
+        res = self.client.get(url, REMOTE_USER='robin')
+        self.assertEqual(res.status_code, 200)
+        if res.streaming:
+            content = b''.join(res.streaming_content)
+        else:
+            content = res.content
+        return res, json.loads(content.decode())
+
+    def test_streaming(self):
+        url = '/api/shop/Products?fmt=json'
+
+        # a paginated request gets a buffered response
+        res, d = self.get_rows(url + '&limit=100')
+        self.assertFalse(res.streaming)
+        total = d['count']
+        self.assertEqual(len(d['rows']), total)
+
+        # an explicit limit of 0 asks for all rows, which are streamed
+        res, d = self.get_rows(url + '&limit=0')
+        self.assertTrue(res.streaming)
+        self.assertEqual(d['success'], True)
+        self.assertEqual(d['count'], total)
+        self.assertEqual(len(d['rows']), total)
+
+        # with an offset the count is still the total number of rows
+        res, d = self.get_rows(url + '&limit=0&start=2')
+        self.assertTrue(res.streaming)
+        self.assertEqual(d['count'], total)
+        self.assertEqual(len(d['rows']), total - 2)
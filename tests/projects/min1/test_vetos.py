@@ -0,0 +1,107 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2019 Rumma & Ko Ltd
+# License: BSD (see file COPYING for details)
+
+"""Test whether the delete vetos computed using `EXISTS` subqueries
+give the same messages as counting the rows of every relation.
+
+"""
+
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import models
+
+from lino.api import rt
+from lino.core.ddh import prefetch_delete_vetos, clear_delete_vetos
+from lino.utils.djangotest import TestCase
+
+
+def counted_veto(obj):
+    """Return the veto message of the given object as it was computed
+    before vetos used `EXISTS` subqueries: count the rows of every
+    relation and stop at the first one having rows.
+
+    """
+    for m, fk in obj._lino_ddh.fklist:
+        if fk.name in m.allow_cascaded_delete:
+            continue
+        if fk.null and fk.remote_field.on_delete == models.SET_NULL:
+            continue
+        n = m.objects.filter(**{fk.name: obj}).count()
+        if n:
+            return obj.delete_veto_message(m, n)
+    kernel = settings.SITE.kernel
+    for gfk, fk_field, qs in kernel.get_generic_related(obj):
+        if gfk.name in qs.model.allow_cascaded_delete:
+            continue
+        if fk_field.null:
+            continue
+        n = qs.count()
+        if n:
+            return obj.delete_veto_message(qs.model, n)
+    return None
+
+
+def as_text(msg):
+    if msg is None:
+        return None
+    return str(msg)
+
+
+class VetoTests(TestCase):
+
+    fixtures = ['demo']
+
+    def check_vetos(self, model):
+        objects = list(model.objects.order_by('pk'))
+        expected = [as_text(counted_veto(obj)) for obj in objects]
+
+        # one object at a time, as when deleting a single row
+        single = [as_text(obj.disable_delete()) for obj in objects]
+        self.assertEqual(single, expected)
+
+        # prefetched for all objects, as when deleting selected rows
+        objects = list(model.objects.order_by('pk'))
+        prefetch_delete_vetos(objects)
+        try:
+            selected = [as_text(obj.disable_delete()) for obj in objects]
+        finally:
+            clear_delete_vetos(objects)
+        self.assertEqual(selected, expected)
+        return dict([(str(obj), msg) for obj, msg in zip(objects, expected)])
+
+    def test_vetos(self):
+        Product = rt.models.shop.Product
+        Order = rt.models.shop.Order
+        Review = rt.models.shop.Review
+        Tag = rt.models.shop.Tag
+
+        # a product with orders in the message of a second relation
+        blue = Product.objects.get(name="Blue shoes")
+        Order(product=blue).save()
+        Order(product=blue).save()
+        # a product referred to only by a nullable relation and by a
+        # relation which allows cascaded delete
+        hat = Product.objects.get(name="Red hat")
+        Review(product=hat).save()
+        Tag(product=hat, name="red").save()
+
+        vetos = self.check_vetos(Product)
+        self.assertEqual(
+            vetos["Red shoes"],
+            "Cannot delete Product Red shoes because 1 Orders refer to it.")
+        self.assertEqual(
+            vetos["Blue shoes"],
+            "Cannot delete Product Blue shoes because 2 Orders refer to it.")
+        self.assertEqual(vetos["Red hat"], None)
+
+        vetos = self.check_vetos(rt.models.shop.Category)
+        self.assertEqual(
+            vetos["Food"],
+            "Cannot delete Category Food because 4 Products refer to it.")
+
+        # after removing the blocking rows, nothing prevents deletion
+        Order.objects.all().delete()
+        vetos = self.check_vetos(Product)
+        self.assertEqual(set(vetos.values()), set([None]))